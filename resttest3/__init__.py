@@ -1,7 +1,8 @@
 __version__ = '1.0.0-dev'
 __author__ = 'Abhilash Joseph C'
 
-from resttest3.utils import register_extensions
+from resttest3.validators import register_lazy_extension
 
-register_extensions('resttest3.ext.validator_jsonschema')
-register_extensions('resttest3.ext.extractor_jmespath')
+# Bundled extensions are imported (with jsonschema and jmespath) the first time a test uses them
+register_lazy_extension('resttest3.ext.validator_jsonschema', validators=['json_schema'])
+register_lazy_extension('resttest3.ext.extractor_jmespath', extractors=['jmespath'])
@@ -0,0 +1,204 @@
+""" Online aggregates for benchmark metrics, computed one value at a time in constant memory """
+import math
+import re
+
+PERCENTILE_PATTERN = re.compile(r'^p(\d+(?:\.\d+)?)$')  # p50, p99, p99.9 ...
+REPORT_PERCENTILES = (50, 75, 90, 95, 99, 99.9, 100)  # Percentiles written with every histogram
+
+
+class RunningStats:
+    """ Count, sum, mean, variance (Welford) and harmonic mean, updated for each value """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.__m2 = 0.0
+        self.__total = 0.0
+        self.__compensation = 0.0  # Neumaier compensation, keeps the sum as exact as math.fsum in practice
+        self.__reciprocal_total = 0.0
+        self.__non_positive = False
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.__m2 += delta * (value - self.mean)
+
+        total = self.__total + value
+        if abs(self.__total) >= abs(value):
+            self.__compensation += (self.__total - total) + value
+        else:
+            self.__compensation += (value - total) + self.__total
+        self.__total = total
+
+        if value <= 0:
+            self.__non_positive = True
+        else:
+            self.__reciprocal_total += 1.0 / value
+
+    @property
+    def total(self):
+        return self.__total + self.__compensation
+
+    @property
+    def variance(self):
+        """ Population variance, zero for fewer than two values """
+        if self.count < 2:
+            return 0.0
+        return self.__m2 / self.count
+
+    @property
+    def std_deviation(self):
+        return math.sqrt(self.variance)
+
+    @property
+    def mean_harmonic(self):
+        """ Harmonic mean, zero if any value is zero """
+        if not self.count or self.__non_positive:
+            return 0.0
+        return self.count / self.__reciprocal_total
+
+
+def percentile_of(aggregate_name):
+    """ Percent asked for by a percentile aggregate name like p99.9, None for other names """
+    match = PERCENTILE_PATTERN.match(str(aggregate_name))
+    if match is None:
+        return None
+    percent = float(match.group(1))
+    return percent if percent <= 100 else None
+
+
+def histogram_percent(aggregate_name):
+    """ Percent of the histogram an aggregate reads: 50 for the median, NN.N for pNN.N, None for the others """
+    return 50.0 if aggregate_name == 'median' else percentile_of(aggregate_name)
+
+
+class LogLinearHistogram:
+    """ Compact, mergeable histogram answering percentile queries, in the manner of HdrHistogram
+
+    Values are recorded as integer multiples of `unit` (1e-6 records seconds with microsecond resolution).
+    Buckets are exact below 2 ** significant_bits units; above that every power of two is split into
+    2 ** (significant_bits - 1) linear sub-buckets, so a value is reported within 2 ** (1 - significant_bits)
+    of itself (0.8% with the default 8 bits). Only buckets that were hit are stored.
+    """
+
+    def __init__(self, unit=1.0, significant_bits=8):
+        if significant_bits < 2:
+            raise ValueError("Histogram needs at least 2 significant bits, not {0}".format(significant_bits))
+        self.unit = unit
+        self.significant_bits = significant_bits
+        self.count = 0
+        self.min = None
+        self.max = None
+        self.counts = {}  # Bucket index to number of values recorded in it
+
+    def __bucket_index(self, scaled):
+        shift = max(0, scaled.bit_length() - self.significant_bits)
+        return (shift << (self.significant_bits - 1)) + (scaled >> shift)
+
+    def __bucket_value(self, index):
+        """ Middle of the range of integer values that fall into the bucket """
+        half_count = 1 << (self.significant_bits - 1)
+        if index < 2 * half_count:
+            return index
+        shift = (index >> (self.significant_bits - 1)) - 1
+        lowest = (index - (shift << (self.significant_bits - 1))) << shift
+        return lowest + ((1 << shift) - 1) / 2.0
+
+    def record(self, value, count=1):
+        if value < 0:
+            raise ValueError("Histogram values must not be negative: {0}".format(value))
+        index = self.__bucket_index(int(round(value / self.unit)))
+        self.counts[index] = self.counts.get(index, 0) + count
+        self.count += count
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        """ Add the values of another histogram with the same unit and precision into this one """
+        if other.unit != self.unit or other.significant_bits != self.significant_bits:
+            raise ValueError("Cannot merge histograms with a different unit or precision")
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        if other.count:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+
+    def percentile(self, percent):
+        """ Value below or at which `percent` percent of the recorded values fall, zero when empty """
+        if not self.count:
+            return 0.0
+        if percent <= 0:
+            return self.min
+        rank = max(1, int(math.ceil(float(percent) / 100.0 * self.count)))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                value = self.__bucket_value(index) * self.unit
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def percentiles(self, percent_list=REPORT_PERCENTILES):
+        return [(percent, self.percentile(percent)) for percent in percent_list]
+
+    def to_dict(self):
+        return {
+            'unit': self.unit,
+            'significant_bits': self.significant_bits,
+            'count': self.count,
+            'min': self.min,
+            'max': self.max,
+            'counts': {str(index): count for index, count in sorted(self.counts.items())}
+        }
+
+
+class MetricAggregate:
+    """ The aggregates requested for one metric, fed value by value during a benchmark """
+
+    def __init__(self, aggregate_names, histogram=None):
+        self.aggregate_names = list(aggregate_names)
+        self.stats = RunningStats()
+        # The median and percentile aggregates read the histogram, approximate to its precision,
+        # a histogram handed in is recorded into by its owner
+        self.histogram = histogram
+        self.__owns_histogram = False
+        if histogram is None and any(histogram_percent(name) is not None for name in self.aggregate_names):
+            self.histogram = LogLinearHistogram()
+            self.__owns_histogram = True
+
+    def add(self, value):
+        self.stats.add(value)
+        if self.__owns_histogram:
+            self.histogram.record(value)
+
+    def value(self, aggregate_name):
+        if not self.stats.count:
+            return 0.0
+        percent = histogram_percent(aggregate_name)
+        if percent is not None:
+            return self.histogram.percentile(percent)
+        return STREAM_AGGREGATES[aggregate_name](self.stats)
+
+    def values(self):
+        """ List of (aggregate name, value) in the order the aggregates were requested """
+        return [(name, self.value(name)) for name in self.aggregate_names]
+
+
+# Aggregates read from the running statistics
+STREAM_AGGREGATES = {
+    'mean_arithmetic': lambda stats: stats.mean,
+    'mean': lambda stats: stats.mean,
+    'mean_harmonic': lambda stats: stats.mean_harmonic,
+    'std_deviation': lambda stats: stats.std_deviation,
+    'std_dev': lambda stats: stats.std_deviation,
+    'sum': lambda stats: stats.total,
+    'total': lambda stats: stats.total
+}
+
+# Aggregate names a benchmark metric accepts, besides any pNN.N percentile
+AGGREGATES = frozenset(STREAM_AGGREGATES) | {'median'}
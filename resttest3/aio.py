@@ -0,0 +1,151 @@
+""" asyncio integration: libcurl multi sockets driven by the running event loop, and an async test runner """
+import asyncio
+import logging
+
+import pycurl
+
+from resttest3.constants import DEFAULT_TIMEOUT
+
+logger = logging.getLogger('resttest3.aio')
+
+
+class AsyncCurlMulti:
+    """ pycurl CurlMulti whose sockets and timer are watched by an asyncio event loop
+
+    libcurl tells which sockets to wait on (M_SOCKETFUNCTION) and when to call back (M_TIMERFUNCTION),
+    the loop calls socket_action when one is ready, so any number of transfers share the loop without
+    a thread or a blocking perform(). Each transfer is awaited with perform(curl_handler).
+    """
+
+    def __init__(self, loop=None):
+        self.loop = loop if loop is not None else asyncio.get_running_loop()
+        self.__multi = pycurl.CurlMulti()
+        self.__multi.setopt(pycurl.M_SOCKETFUNCTION, self.__socket_function)
+        self.__multi.setopt(pycurl.M_TIMERFUNCTION, self.__timer_function)
+        self.__futures = {}  # curl handle to the future of its transfer
+        self.__readers = set()
+        self.__writers = set()
+        self.__timer = None
+
+    @property
+    def in_flight(self):
+        return len(self.__futures)
+
+    async def perform(self, curl_handler):
+        """ Perform the transfer of a configured handle, raises pycurl.error when it fails """
+        future = self.loop.create_future()
+        self.__futures[curl_handler] = future
+        self.__multi.add_handle(curl_handler)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if self.__futures.pop(curl_handler, None) is not None:
+                self.__multi.remove_handle(curl_handler)
+            raise
+
+    def close(self):
+        for curl_handler, future in list(self.__futures.items()):
+            self.__multi.remove_handle(curl_handler)
+            future.cancel()
+        self.__futures.clear()
+        for fd in self.__readers:
+            self.loop.remove_reader(fd)
+        for fd in self.__writers:
+            self.loop.remove_writer(fd)
+        self.__readers.clear()
+        self.__writers.clear()
+        if self.__timer is not None:
+            self.__timer.cancel()
+            self.__timer = None
+        self.__multi.close()
+
+    def __socket_function(self, what, fd, multi, socketp):
+        """ libcurl asks to watch a socket for reading, writing, both, or to stop watching it """
+        if what in (pycurl.POLL_IN, pycurl.POLL_INOUT):
+            if fd not in self.__readers:
+                self.loop.add_reader(fd, self.__socket_action, fd, pycurl.CSELECT_IN)
+                self.__readers.add(fd)
+        elif fd in self.__readers:
+            self.loop.remove_reader(fd)
+            self.__readers.discard(fd)
+        if what in (pycurl.POLL_OUT, pycurl.POLL_INOUT):
+            if fd not in self.__writers:
+                self.loop.add_writer(fd, self.__socket_action, fd, pycurl.CSELECT_OUT)
+                self.__writers.add(fd)
+        elif fd in self.__writers:
+            self.loop.remove_writer(fd)
+            self.__writers.discard(fd)
+
+    def __timer_function(self, timeout_ms):
+        """ libcurl asks to be called back after timeout_ms, -1 cancels the timer """
+        if self.__timer is not None:
+            self.__timer.cancel()
+            self.__timer = None
+        if timeout_ms >= 0:
+            self.__timer = self.loop.call_later(timeout_ms / 1000.0, self.__socket_action, pycurl.SOCKET_TIMEOUT, 0)
+
+    def __socket_action(self, fd, event):
+        if fd == pycurl.SOCKET_TIMEOUT:
+            self.__timer = None
+        try:
+            self.__multi.socket_action(fd, event)
+        except pycurl.error:
+            logger.debug("socket_action failed on %s" % fd, exc_info=True)
+        self.__read_info()
+
+    def __read_info(self):
+        while True:
+            queued, ok_list, error_list = self.__multi.info_read()
+            for curl_handler in ok_list:
+                self.__finish(curl_handler, None)
+            for curl_handler, errno, message in error_list:
+                self.__finish(curl_handler, pycurl.error(errno, message))
+            if not queued:
+                break
+
+    def __finish(self, curl_handler, error):
+        self.__multi.remove_handle(curl_handler)
+        future = self.__futures.pop(curl_handler, None)
+        if future is None or future.done():
+            return
+        if error is None:
+            future.set_result(None)
+        else:
+            future.set_exception(error)
+
+
+class AsyncRunner:
+    """ Runs test groups as coroutines on the running event loop, all requests on one AsyncCurlMulti
+
+    Tests inside a group run in order on the group's Context, up to `concurrency` groups run at once
+    (every group when None). Test delays are awaited with asyncio.sleep.
+    """
+
+    def __init__(self, concurrency=None, timeout=None, pool=None):
+        if concurrency is not None and int(concurrency) < 1:
+            raise ValueError("Async concurrency must be at least 1, not {0}".format(concurrency))
+        self.concurrency = int(concurrency) if concurrency is not None else None
+        self.timeout = timeout if timeout else DEFAULT_TIMEOUT
+        self.pool = pool
+
+    async def run(self, test_group_dict, callback=None):
+        """ Run every test of every group, callback(group_name, testcase) is invoked as each test finishes """
+        multi = AsyncCurlMulti()
+        semaphore = asyncio.Semaphore(self.concurrency) if self.concurrency else None
+
+        async def run_group(group_name, group):
+            for testcase in group.testcase_list:
+                await testcase.run_async(timeout=self.timeout, pool=self.pool, multi=multi)
+                if callback:
+                    callback(group_name, testcase)
+
+        async def run_limited(group_name, group):
+            async with semaphore:
+                await run_group(group_name, group)
+
+        group_runner = run_limited if semaphore is not None else run_group
+        try:
+            await asyncio.gather(*[group_runner(group_name, group) for group_name, group in test_group_dict.items()
+                                   if group.testcase_list])
+        finally:
+            multi.close()
@@ -0,0 +1,566 @@
+""" Benchmark support: runs a test repeatedly and collects libcurl metrics for it """
+import csv
+import json
+import logging
+import time
+import traceback
+from abc import ABCMeta, abstractmethod
+from array import array
+from io import BytesIO
+
+import pycurl
+
+from resttest3.aggregates import AGGREGATES, LogLinearHistogram, MetricAggregate, REPORT_PERCENTILES, percentile_of
+from resttest3.constants import BenchmarkKeywords, DEFAULT_TIMEOUT
+from resttest3.testcase import TestCase
+from resttest3.utils import Parser
+
+logger = logging.getLogger('resttest3.benchmarks')
+
+# Metric name to the libcurl getinfo() value it reads, in order from start to finish of a request
+METRICS = {
+    'namelookup_time': pycurl.NAMELOOKUP_TIME,
+    'connect_time': pycurl.CONNECT_TIME,
+    'appconnect_time': pycurl.APPCONNECT_TIME,
+    'pretransfer_time': pycurl.PRETRANSFER_TIME,
+    'starttransfer_time': pycurl.STARTTRANSFER_TIME,
+    'redirect_time': pycurl.REDIRECT_TIME,
+    'total_time': pycurl.TOTAL_TIME,
+
+    'size_download': pycurl.SIZE_DOWNLOAD,
+    'size_upload': pycurl.SIZE_UPLOAD,
+    'request_size': pycurl.REQUEST_SIZE,
+    'speed_download': pycurl.SPEED_DOWNLOAD,
+    'speed_upload': pycurl.SPEED_UPLOAD,
+
+    'redirect_count': pycurl.REDIRECT_COUNT,
+    'num_connects': pycurl.NUM_CONNECTS
+}
+
+# Wall clock seconds from the time a request was due to be sent until its response was complete,
+# unlike total_time it includes any time the request waited to be sent
+LATENCY_METRIC = 'latency'
+
+# Histogram resolution of each metric, times are recorded to the microsecond, sizes, speeds and counts as integers
+METRIC_UNITS = {name: 1e-6 if name.endswith('_time') else 1.0 for name in METRICS}
+METRIC_UNITS[LATENCY_METRIC] = 1e-6
+
+
+class BenchmarkResult:
+    """ Condensed output of a benchmark run """
+
+    def __init__(self, name=None, group=None):
+        self.name = name
+        self.group = group
+        self.failures = 0
+        self.results = {}  # Metric name to array of raw values, empty when they were streamed to the output file
+        self.aggregates = []  # List of (metric name, aggregate name, value)
+        self.histograms = {}  # Metric name to LogLinearHistogram of all its values
+        self.requests = 0  # Measured requests, successful or not
+        self.elapsed = 0.0  # Seconds spent on the measured requests
+        self.target_rate = None  # Requests per second asked for by an open loop benchmark
+        self.stages = []  # BenchmarkResult of each load profile stage, named after the stage
+
+    @property
+    def achieved_rate(self):
+        """ Measured requests per second """
+        return self.requests / self.elapsed if self.elapsed > 0 else 0.0
+
+    def percentile_table(self):
+        """ Rows of metric name, count and report percentiles of each histogram, for the HTML report """
+        return [
+            {'metric': name, 'count': histogram.count,
+             'percentiles': [{'percent': percent, 'value': value} for percent, value in histogram.percentiles()]}
+            for name, histogram in sorted(self.histograms.items())
+        ]
+
+    def __str__(self):
+        return json.dumps(self, default=Parser.safe_to_json)
+
+
+class MetricCollector:
+    """ Gathers the metrics of each measured request into a BenchmarkResult: histograms and online
+    aggregates for every metric, raw values streamed to the output writer or else kept in memory
+    """
+
+    def __init__(self, benchmark, result, writer=None, parent=None, keep_raw=True):
+        self.result = result
+        self.writer = writer
+        self.parent = parent  # Collector of the whole benchmark, when this one only covers a load profile stage
+        self.keep_raw = keep_raw
+        self.metric_names = sorted(benchmark.metrics)
+        self.metric_options = [METRICS.get(name) for name in self.metric_names]  # None for latency
+        raw_names = sorted(benchmark.raw_metrics)
+        self.raw_names = raw_names
+        self.raw_indexes = [self.metric_names.index(name) for name in raw_names]
+        self.raw_values = [array('d') for _ in raw_names]
+        self.histogram_list = [LogLinearHistogram(unit=METRIC_UNITS[name]) for name in self.metric_names]
+        self.aggregate_list = [
+            (index, MetricAggregate(benchmark.aggregated_metrics[name], histogram=self.histogram_list[index]))
+            for index, name in enumerate(self.metric_names) if name in benchmark.aggregated_metrics
+        ]
+        result.histograms = dict(zip(self.metric_names, self.histogram_list))
+
+    def add(self, curl_handler, latency):
+        """ Record the metrics of a successful request """
+        self.add_row([latency if option is None else curl_handler.getinfo(option) for option in self.metric_options])
+
+    def add_row(self, row, record_histograms=True):
+        """ Record one value per metric, in the order of metric_names """
+        if self.parent is not None:
+            self.parent.add_row(row, record_histograms=False)  # The stage histograms are merged into it on close
+        self.result.requests += 1
+        if record_histograms:
+            for histogram, value in zip(self.histogram_list, row):
+                histogram.record(value)
+        for index, aggregate in self.aggregate_list:
+            aggregate.add(row[index])
+        if self.writer is not None:
+            self.writer.write_row([row[index] for index in self.raw_indexes])
+        elif self.keep_raw:
+            for values, index in zip(self.raw_values, self.raw_indexes):
+                values.append(row[index])
+
+    def add_failure(self):
+        if self.parent is not None:
+            self.parent.add_failure()
+        self.result.requests += 1
+        self.result.failures += 1
+
+    def close(self):
+        """ Fill in the aggregates, and the raw values unless they were streamed """
+        if self.parent is not None:
+            for histogram, parent_histogram in zip(self.histogram_list, self.parent.histogram_list):
+                parent_histogram.merge(histogram)
+        for index, aggregate in self.aggregate_list:
+            for aggregate_name, value in aggregate.values():
+                self.result.aggregates.append((self.metric_names[index], aggregate_name, value))
+        if self.writer is not None:
+            self.writer.close()
+        elif self.keep_raw:
+            self.result.results = dict(zip(self.raw_names, self.raw_values))
+        return self.result
+
+
+class Benchmark(TestCase):
+    """ A test run many times over, where libcurl metrics are gathered instead of validating responses
+
+    Benchmarks do as little as possible per iteration: validators and extractors are not run,
+    response bodies are discarded and a single curl handle is reused for the whole run.
+    Aggregates are computed online and, with an output_file, raw values are streamed to it,
+    so memory use does not grow with benchmark_runs.
+
+    By default requests are sent back to back (closed loop). With a rate, requests are sent on a fixed
+    timetable for the duration (open loop) and latency is measured from the time each one was due.
+    """
+
+    def __init__(self, base_url, extract_binds, variable_binds, context=None, config=None):
+        super(Benchmark, self).__init__(base_url, extract_binds, variable_binds, context=context, config=config)
+        self.__base_url = base_url
+        self.warmup_runs = 10
+        self.benchmark_runs = 100
+        self.output_format = 'csv'
+        self.output_file = None
+        self.metrics = set()
+        self.raw_metrics = set()  # Metrics reported with every value
+        self.aggregated_metrics = {}  # Metric name to list of aggregate names applied to it
+        self.rate = None  # Requests per second for an open loop run
+        self.duration = None  # Seconds an open loop run lasts, defaults to benchmark_runs / rate
+        self.concurrency = None  # Open loop: maximum requests in flight
+        self.load_profile = []  # LoadStage list, run in order instead of benchmark_runs
+
+    @property
+    def pool_url(self):
+        """ URL picking the pooled handles: the base URL while a templated URL has nothing to render yet """
+        url = self.url
+        return url if isinstance(url, (str, bytes)) else self.__base_url
+
+    def add_metric(self, metric_name, aggregate=None):
+        """ Add a metric to collect, optionally with an aggregate to condense it to a single value """
+        metric_name = Parser.coerce_to_string(metric_name).lower()
+        if metric_name not in METRIC_UNITS:
+            raise ValueError("Invalid metric name: {0}, available metrics are {1}".format(
+                metric_name, sorted(METRIC_UNITS.keys())))
+        self.metrics.add(metric_name)
+        if aggregate is None:
+            self.raw_metrics.add(metric_name)
+            return self
+
+        aggregate = Parser.coerce_to_string(aggregate).lower()
+        if aggregate not in AGGREGATES and percentile_of(aggregate) is None:
+            raise ValueError("Invalid aggregate function: {0}, available aggregates are {1} or any pNN.N "
+                             "percentile".format(aggregate, sorted(AGGREGATES)))
+        aggregate_list = self.aggregated_metrics.setdefault(metric_name, [])
+        if aggregate not in aggregate_list:
+            aggregate_list.append(aggregate)
+        return self
+
+    def __parse_metrics(self, value):
+        if isinstance(value, str):
+            self.add_metric(value)
+        elif isinstance(value, dict):
+            for metric_name, aggregate in value.items():
+                self.__add_aggregates(metric_name, aggregate)
+        elif isinstance(value, (list, set)):
+            for metric in value:
+                if isinstance(metric, dict):
+                    for metric_name, aggregate in metric.items():
+                        self.__add_aggregates(metric_name, aggregate)
+                elif isinstance(metric, str):
+                    self.add_metric(metric)
+                else:
+                    raise TypeError("Invalid metric definition: {0}".format(metric))
+        else:
+            raise TypeError("Invalid benchmark metrics section: {0}".format(value))
+
+    def __add_aggregates(self, metric_name, aggregate):
+        if isinstance(aggregate, list):
+            for aggregate_name in aggregate:
+                self.add_metric(metric_name, aggregate_name)
+        else:
+            self.add_metric(metric_name, aggregate)
+
+    def parse(self, testcase_dict):
+        super(Benchmark, self).parse(testcase_dict)
+        testcase_dict = Parser.flatten_lowercase_keys_dict(testcase_dict)
+
+        for key, value in testcase_dict.items():
+            if key == BenchmarkKeywords.warmup_runs:
+                self.warmup_runs = int(value)
+            elif key == BenchmarkKeywords.benchmark_runs:
+                self.benchmark_runs = int(value)
+            elif key == BenchmarkKeywords.output_format:
+                output_format = Parser.coerce_to_string(value).lower()
+                if output_format not in OUTPUT_WRITERS:
+                    raise ValueError("Invalid benchmark output format: {0}, available formats are {1}".format(
+                        output_format, sorted(OUTPUT_WRITERS.keys())))
+                self.output_format = output_format
+            elif key == BenchmarkKeywords.output_file:
+                self.output_file = Parser.coerce_to_string(value)
+            elif key == BenchmarkKeywords.metrics:
+                self.__parse_metrics(value)
+            elif key == BenchmarkKeywords.rate:
+                self.rate = float(value)
+                if self.rate <= 0:
+                    raise ValueError("Benchmark rate must be positive, not {0}".format(value))
+            elif key == BenchmarkKeywords.duration:
+                self.duration = float(value)
+            elif key == BenchmarkKeywords.concurrency:
+                self.concurrency = int(value)
+            elif key == BenchmarkKeywords.load_profile:
+                from resttest3.load import parse_load_profile
+                self.load_profile = parse_load_profile(value)
+
+    @property
+    def is_open_loop(self):
+        return self.rate is not None
+
+    @property
+    def open_loop_runs(self):
+        """ Requests sent by an open loop run """
+        if self.duration is not None:
+            return int(round(self.rate * self.duration))
+        return self.benchmark_runs
+
+    def body_buffer(self):
+        """ Benchmarks discard response bodies, whatever the streaming settings """
+        return BytesIO()
+
+    def configure_iteration(self, curl_handler, timeout):
+        """ Configure the handle for one request, whose response is discarded """
+        self.configure_curl(curl_handler, timeout, keep_alive=True)
+        curl_handler.setopt(pycurl.WRITEFUNCTION, lambda data: None)  # Response bodies are never stored
+        curl_handler.setopt(pycurl.HEADERFUNCTION, lambda data: None)
+
+    def __perform(self, curl_handler, timeout):
+        """ Configure the handle for one iteration and perform it, returns False on a curl error """
+        self.configure_iteration(curl_handler, timeout)
+        try:
+            curl_handler.perform()
+        except pycurl.error as e:
+            self.performed(curl_handler, e)
+            logger.debug("Benchmark %s iteration failed: %s" % (self.name, traceback.format_exc()))
+            return False
+        self.performed(curl_handler)
+        return True
+
+    def run(self, context=None, timeout=None, curl_handler=None, pool=None):
+        if context is None:
+            context = self.context
+        if timeout is None:
+            timeout = DEFAULT_TIMEOUT
+        close_handler = curl_handler is None
+        if pool is not None:
+            curl_handler = pool.acquire(self.pool_url)
+        elif close_handler:
+            curl_handler = pycurl.Curl()
+        else:
+            curl_handler.reset()
+
+        result = BenchmarkResult(name=self.name, group=self.group)
+        logger.info("Warmup: %s, running %s times" % (self.name, self.warmup_runs))
+        for _ in range(self.warmup_runs):
+            self.pre_update(context)
+            self.__perform(curl_handler, timeout)
+
+        output = None
+        writer = None
+        if self.output_file:
+            output = open(self.output_file, 'w', newline='')
+            writer = OUTPUT_WRITERS[self.output_format](output, result, sorted(self.raw_metrics))
+            writer.open()
+        collector = MetricCollector(self, result, writer)
+
+        try:
+            if self.load_profile or self.is_open_loop:
+                # The schedulers take their own handles, from the pool when there is one
+                self.__release(curl_handler, pool, close_handler)
+                curl_handler = None
+                if self.load_profile:
+                    self.run_load_profile(collector, context, timeout, pool=pool)
+                else:
+                    self.run_open_loop(collector, context, timeout, pool=pool)
+            else:
+                self.run_closed_loop(collector, context, timeout, curl_handler)
+            collector.close()
+        finally:
+            if output is not None:
+                output.close()
+            if curl_handler is not None:
+                self.__release(curl_handler, pool, close_handler)
+
+        self.result = result
+        return self.result
+
+    @staticmethod
+    def __release(curl_handler, pool, close_handler):
+        if pool is not None:
+            pool.release(curl_handler)
+        elif close_handler:
+            curl_handler.close()
+
+    def run_closed_loop(self, collector, context, timeout, curl_handler):
+        """ Send benchmark_runs requests one after the other on the handle """
+        logger.info("Benchmark: %s, running %s times" % (self.name, self.benchmark_runs))
+        started = time.monotonic()
+        for _ in range(self.benchmark_runs):
+            self.pre_update(context)
+            due_time = time.monotonic()
+            if self.__perform(curl_handler, timeout):
+                collector.add(curl_handler, time.monotonic() - due_time)
+            else:
+                collector.add_failure()
+        collector.result.elapsed = time.monotonic() - started
+
+    def run_open_loop(self, collector, context, timeout, pool=None):
+        """ Send requests at the benchmark rate on a CurlMulti, without waiting for earlier responses """
+        from resttest3.load import OpenLoopScheduler
+
+        runs = self.open_loop_runs
+        logger.info("Benchmark: %s, sending %s requests at %s per second" % (self.name, runs, self.rate))
+        scheduler = OpenLoopScheduler.constant(self.rate, runs, concurrency=self.concurrency, pool=pool,
+                                               url=self.pool_url)
+        self.__run_scheduler(scheduler, collector, context, timeout)
+        collector.result.target_rate = self.rate
+
+    def run_load_profile(self, collector, context, timeout, pool=None):
+        """ Run the load profile stages in order, metrics are gathered per stage and for the whole run
+
+        Every request, whichever stage and virtual user sends it, goes through pre_update on the shared
+        context, so generator_binds hand out unique values across all of them.
+        """
+        for stage in self.load_profile:
+            logger.info("Benchmark: %s, stage %s for %s seconds" % (self.name, stage.name, stage.total_duration))
+            stage_result = BenchmarkResult(name=stage.name, group=self.group)
+            stage_collector = MetricCollector(self, stage_result, parent=collector, keep_raw=False)
+            scheduler = stage.scheduler(pool=pool, url=self.pool_url, concurrency=self.concurrency)
+            self.__run_scheduler(scheduler, stage_collector, context, timeout)
+            stage_result.target_rate = stage.target_rate
+            stage_collector.close()
+            collector.result.stages.append(stage_result)
+        collector.result.elapsed = sum(stage_result.elapsed for stage_result in collector.result.stages)
+
+    def __run_scheduler(self, scheduler, collector, context, timeout):
+        def prepare(curl_handler):
+            self.pre_update(context)
+            self.configure_iteration(curl_handler, timeout)
+
+        def finish(curl_handler, due_time, done_time, error):
+            self.performed(curl_handler, error)
+            if error is None:
+                collector.add(curl_handler, done_time - due_time)
+            else:
+                logger.debug("Benchmark %s request failed: %s" % (self.name, error))
+                collector.add_failure()
+
+        scheduler.run(prepare, finish)
+        collector.result.elapsed = scheduler.elapsed
+
+    def write_output(self, result=None):
+        """ Write a benchmark result held in memory into output_file, using output_format
+        Runs with an output_file already stream their result to it, this is for results built by other means.
+        """
+        result = result if result is not None else self.result
+        if not self.output_file or result is None:
+            return
+        with open(self.output_file, 'w', newline='') as f:
+            OUTPUT_WRITERS[self.output_format].write_result(f, result)
+
+
+def metrics_to_tuples(raw_metrics):
+    """ Convert metric name to values dictionary into rows: a header row, then one row per iteration """
+    if not isinstance(raw_metrics, dict):
+        raise TypeError("Input must be dictionary!")
+    metric_names = sorted(raw_metrics.keys())
+    rows = [tuple(metric_names)]
+    rows.extend(zip(*[raw_metrics[name] for name in metric_names]))
+    return rows
+
+
+class BenchmarkWriter(metaclass=ABCMeta):
+    """ Streams a benchmark to a file: a header, one row of raw metrics per measured iteration,
+    then the failures and aggregates once the run is over. Rows are flushed every FLUSH_INTERVAL rows.
+    """
+
+    FLUSH_INTERVAL = 1000
+
+    def __init__(self, file_out, benchmark_result, metric_names):
+        self.file_out = file_out
+        self.result = benchmark_result
+        self.metric_names = list(metric_names)
+        self.row_count = 0
+
+    def open(self):
+        """ Write everything that comes before the rows """
+
+    def write_row(self, row):
+        self._write_row(row)
+        self.row_count += 1
+        if self.row_count % self.FLUSH_INTERVAL == 0:
+            self.file_out.flush()
+
+    @abstractmethod
+    def _write_row(self, row):
+        """ Write one row of raw metric values """
+
+    def close(self):
+        """ Write the failures and aggregates of the result, the file itself is left open """
+        self.file_out.flush()
+
+    @classmethod
+    def write_result(cls, file_out, benchmark_result):
+        """ Write a complete result with raw values held in memory """
+        writer = cls(file_out, benchmark_result, sorted(benchmark_result.results.keys()))
+        writer.open()
+        for row in metrics_to_tuples(benchmark_result.results)[1:]:
+            writer.write_row(row)
+        writer.close()
+
+
+class CsvBenchmarkWriter(BenchmarkWriter):
+
+    def __init__(self, file_out, benchmark_result, metric_names):
+        super(CsvBenchmarkWriter, self).__init__(file_out, benchmark_result, metric_names)
+        self.writer = csv.writer(file_out)
+
+    def open(self):
+        self.writer.writerow(('Benchmark', self.result.name))
+        self.writer.writerow(('Benchmark Group', self.result.group))
+        if self.metric_names:
+            self.writer.writerow(('Results', ''))
+            self.writer.writerow(self.metric_names)
+
+    def _write_row(self, row):
+        self.writer.writerow(row)
+
+    def close(self):
+        self.writer.writerow(('Failures', self.result.failures))
+        self.writer.writerow(('Requests', self.result.requests))
+        self.writer.writerow(('Elapsed', self.result.elapsed))
+        self.writer.writerow(('Achieved Rate', self.result.achieved_rate))
+        if self.result.target_rate is not None:
+            self.writer.writerow(('Target Rate', self.result.target_rate))
+        if self.result.aggregates:
+            self.writer.writerow(('Aggregates', ''))
+            self.writer.writerows(self.result.aggregates)
+        if self.result.histograms:
+            self.writer.writerow(('Percentiles', ''))
+            self.writer.writerow(['metric', 'count'] + ['p%s' % percent for percent in REPORT_PERCENTILES])
+            for name, histogram in sorted(self.result.histograms.items()):
+                self.writer.writerow([name, histogram.count] + [value for _, value in histogram.percentiles()])
+        if self.result.stages:
+            self.__write_stages()
+        super(CsvBenchmarkWriter, self).close()
+
+    def __write_stages(self):
+        stages = self.result.stages
+        self.writer.writerow(('Stages', ''))
+        self.writer.writerow(('stage', 'requests', 'failures', 'elapsed', 'achieved_rate', 'target_rate'))
+        for stage in stages:
+            self.writer.writerow((stage.name, stage.requests, stage.failures, stage.elapsed, stage.achieved_rate,
+                                  stage.target_rate if stage.target_rate is not None else ''))
+        self.writer.writerow(('Stage Aggregates', ''))
+        for stage in stages:
+            self.writer.writerows((stage.name,) + aggregate for aggregate in stage.aggregates)
+        self.writer.writerow(('Stage Percentiles', ''))
+        self.writer.writerow(['stage', 'metric', 'count'] + ['p%s' % percent for percent in REPORT_PERCENTILES])
+        for stage in stages:
+            for name, histogram in sorted(stage.histograms.items()):
+                percentile_values = [value for _, value in histogram.percentiles()]
+                self.writer.writerow([stage.name, name, histogram.count] + percentile_values)
+
+
+class JsonBenchmarkWriter(BenchmarkWriter):
+    """ A single json object, with results as a list of rows in the order of the metrics list """
+
+    def open(self):
+        self.file_out.write('{"name": %s, "group": %s, "metrics": %s, "results": [' % (
+            json.dumps(self.result.name), json.dumps(self.result.group), json.dumps(self.metric_names)))
+
+    def _write_row(self, row):
+        self.file_out.write((', ' if self.row_count else '') + json.dumps(list(row)))
+
+    def close(self):
+        histograms = {}
+        for name, histogram in sorted(self.result.histograms.items()):
+            histograms[name] = histogram.to_dict()
+            histograms[name]['percentiles'] = [list(row) for row in histogram.percentiles()]
+        summary = {
+            'failures': self.result.failures,
+            'requests': self.result.requests,
+            'elapsed': self.result.elapsed,
+            'achieved_rate': self.result.achieved_rate,
+            'target_rate': self.result.target_rate,
+            'aggregates': [list(aggregate) for aggregate in self.result.aggregates],
+            'histograms': histograms
+        }
+        if self.result.stages:
+            summary['stages'] = [{
+                'name': stage.name,
+                'requests': stage.requests,
+                'failures': stage.failures,
+                'elapsed': stage.elapsed,
+                'achieved_rate': stage.achieved_rate,
+                'target_rate': stage.target_rate,
+                'aggregates': [list(aggregate) for aggregate in stage.aggregates],
+                'percentiles': {name: [list(row) for row in histogram.percentiles()]
+                                for name, histogram in sorted(stage.histograms.items())}
+            } for stage in self.result.stages]
+        self.file_out.write('], %s' % json.dumps(summary)[1:])
+        super(JsonBenchmarkWriter, self).close()
+
+
+def write_benchmark_json(file_out, benchmark_result):
+    """ Writes benchmark to file as json """
+    JsonBenchmarkWriter.write_result(file_out, benchmark_result)
+
+
+def write_benchmark_csv(file_out, benchmark_result):
+    """ Writes benchmark to file as csv """
+    CsvBenchmarkWriter.write_result(file_out, benchmark_result)
+
+
+OUTPUT_WRITERS = {
+    'csv': CsvBenchmarkWriter,
+    'json': JsonBenchmarkWriter
+}
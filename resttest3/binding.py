@@ -1,6 +1,7 @@
 """Basic context implementation for binding variables to values
 """
 import logging
+import string
 import types
 
 logger = logging.getLogger('resttest3')
@@ -15,6 +16,12 @@ class Context:
         self.generators = {}  # Maps generator name to generator function
         self.mod_count = 0  # Lets us see if something has been altered, avoiding needless retemplating
 
+    def __getstate__(self):
+        # Generators cannot be pickled, whoever owns their configuration adds them again
+        state = self.__dict__.copy()
+        state['generators'] = {}
+        return state
+
     def bind_variable(self, variable_name, variable_value):
         """ Bind a named variable to a value within the context
             This allows for passing in variables in testing """
@@ -72,3 +79,34 @@ class Context:
     def get_generator(self, generator_name):
         """return generators for the given name"""
         return self.generators.get(str(generator_name))
+
+
+class ContextTemplate:
+    """ string.Template compiled once, which keeps its last rendering until the Context is modified
+
+    The rendering is keyed on the Context object and its mod_count, so a test run over and over
+    with the same variables (benchmarks, generator loops that repeat values) is only templated once.
+    """
+
+    def __init__(self, template_string):
+        self.template = string.Template(template_string)
+        self.__context = None
+        self.__mod_count = None
+        self.__rendered = None
+
+    @property
+    def template_string(self):
+        return self.template.template
+
+    def render(self, context):
+        """ Substitute the context variables, reusing the previous result when nothing changed """
+        if context is self.__context and context.mod_count == self.__mod_count:
+            return self.__rendered
+        rendered = self.template.safe_substitute(context.get_values())
+        self.__context = context
+        self.__mod_count = context.mod_count
+        self.__rendered = rendered
+        return rendered
+
+    def __str__(self):
+        return self.template_string
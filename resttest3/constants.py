@@ -64,6 +64,19 @@ class TestCaseKeywords:
     options = 'options'
     global_env = 'global_env'
     absolute_urls = 'absolute-url'
+    stream = 'stream'
+
+
+class BenchmarkKeywords:
+    warmup_runs = 'warmup_runs'
+    benchmark_runs = 'benchmark_runs'
+    output_file = 'output_file'
+    output_format = 'output_format'
+    metrics = 'metrics'
+    rate = 'rate'
+    duration = 'duration'
+    concurrency = 'concurrency'
+    load_profile = 'load_profile'
 
 
 class EnumHttpMethod(Enum):
@@ -1,6 +1,7 @@
+import mmap
 import os
-import string
 
+from resttest3.binding import ContextTemplate
 from resttest3.utils import Parser
 
 """
@@ -8,6 +9,34 @@ Encapsulates contend handling logic, for pulling file content into tests
 """
 
 
+class MappedFileReader:
+    """ Reads a memory mapped file for a libcurl READFUNCTION, each reader has its own offset
+    so handles uploading the same file at once do not interfere """
+
+    def __init__(self, view):
+        self.__view = view
+        self.__offset = 0
+
+    def __len__(self):
+        return len(self.__view)
+
+    def read(self, size):
+        chunk = self.__view[self.__offset:self.__offset + size]
+        self.__offset += len(chunk)
+        return bytes(chunk)
+
+    def seek(self, offset, origin=os.SEEK_SET):
+        """ SEEKFUNCTION callback, libcurl rewinds the upload when it resends it on a new connection """
+        if origin == os.SEEK_CUR:
+            offset += self.__offset
+        elif origin == os.SEEK_END:
+            offset += len(self.__view)
+        if not 0 <= offset <= len(self.__view):
+            return 1  # SEEKFUNC_FAIL
+        self.__offset = offset
+        return 0  # SEEKFUNC_OK
+
+
 class ContentHandler:
     """ Handles content that may be (lazily) read from filesystem and/or templated to various degrees
     Also creates pixie dust and unicorn farts on demand
@@ -26,32 +55,66 @@ class ContentHandler:
     is_file = False
     is_template_path = False
     is_template_content = False
+    _path_template = None  # ContextTemplate of a templated path, built on first use
+    _content_template = None  # ContextTemplate of templated content, rebuilt if a file's content changes
+    _mapping = None  # (mtime, size) of a static file and a memoryview of its memory map
 
     def is_dynamic(self):
         """ Is templating used? """
         return self.is_template_path or self.is_template_content
 
+    def is_static_file(self):
+        """ File content sent as is, neither the path nor the content is templated """
+        return self.is_file and not self.is_dynamic()
+
+    def open_reader(self):
+        """ Reader over a read only memory map of a static file, the file is mapped again once it changed
+        Its content is never copied into a python string, libcurl reads it chunk by chunk from the page cache.
+        """
+        stat = os.stat(self.content)
+        key = (stat.st_mtime_ns, stat.st_size)
+        if self._mapping is None or self._mapping[0] != key:
+            if stat.st_size:
+                with open(self.content, 'rb') as f:
+                    view = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+            else:  # Empty files cannot be mapped
+                view = memoryview(b'')
+            self._mapping = (key, view)
+        return MappedFileReader(self._mapping[1])
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('_mapping', None)  # Memory maps are not picklable, the file is mapped again on use
+        return state
+
     def get_content(self, context=None):
         """ Does all context binding and pathing to get content, templated out """
 
         if self.is_file:
             path = self.content
             if self.is_template_path and context:
-                path = string.Template(path).safe_substitute(
-                    context.get_values())
+                path = self.__render('_path_template', path, context)
             with open(path, 'r') as f:
                 data = f.read()
 
             if self.is_template_content and context:
-                return string.Template(data).safe_substitute(context.get_values())
+                return self.__render('_content_template', data, context)
             else:
                 return data
         else:
             if self.is_template_content and context:
-                return Parser.safe_substitute_unicode_template(self.content, context.get_values())
+                return self.__render('_content_template', self.content, context)
             else:
                 return self.content
 
+    def __render(self, template_attribute, template_string, context):
+        """ Render through the cached template, compiling it again only if the template text changed """
+        template = getattr(self, template_attribute)
+        if template is None or template.template_string != template_string:
+            template = ContextTemplate(template_string)
+            setattr(self, template_attribute, template)
+        return template.render(context)
+
     def create_noread_version(self):
         """ Read file content if it is static and return content handler with no I/O """
         if not self.is_file or self.is_template_path:
@@ -1,9 +1,10 @@
 """JMESPathExtractor file"""
 import json
+from functools import lru_cache
 
 import jmespath
 
-from resttest3.validators import AbstractExtractor
+from resttest3.validators import AbstractExtractor, QUERY_CACHE_SIZE
 
 
 class JMESPathExtractor(AbstractExtractor):
@@ -13,15 +14,32 @@ class JMESPathExtractor(AbstractExtractor):
     extractor_type = 'jmespath'
     is_body_extractor = True
 
+    accepts_parsed_json = True
+
+    @staticmethod
+    @lru_cache(maxsize=QUERY_CACHE_SIZE)
+    def compile_query(query):
+        """ Parse the expression once, jmespath.search would parse it again on every call """
+        try:
+            return jmespath.compile(query)
+        except Exception as Exe:
+            raise ValueError("Invalid query: " + str(query) + " : " + str(Exe)) from Exe
+
     def extract_internal(self, query=None, body=None, headers=None, args=None):
         if isinstance(body, bytes):
             body = body.decode('utf-8')
 
         try:
-            res = jmespath.search(query, json.loads(body))
+            res = self.compiled_query(query).search(json.loads(body))
             return res
         except Exception as Exe:
-            raise ValueError("Invalid query: " + query + " : " + str(Exe)) from Exe
+            raise ValueError("Invalid query: " + str(query) + " : " + str(Exe)) from Exe
+
+    def extract_parsed(self, query=None, data=None, headers=None, args=None):
+        try:
+            return self.compiled_query(query).search(data)
+        except Exception as Exe:
+            raise ValueError("Invalid query: " + str(query) + " : " + str(Exe)) from Exe
 
     @classmethod
     def parse(cls, config):
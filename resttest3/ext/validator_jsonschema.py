@@ -1,5 +1,7 @@
 import json
+import os
 import traceback
+from functools import lru_cache
 
 import jsonschema
 import yaml
@@ -10,24 +12,68 @@ from resttest3.utils import Parser
 from resttest3.validators import AbstractValidator, Failure
 
 
+SCHEMA_CACHE_SIZE = 256  # Distinct rendered schemas kept compiled
+
+
+@lru_cache(maxsize=SCHEMA_CACHE_SIZE)
+def compile_schema(schema_text):
+    """ Load a schema and build the validator for its draft, cached per distinct schema text """
+    schema = yaml.safe_load(schema_text)
+    validator_class = jsonschema.validators.validator_for(schema)
+    validator_class.check_schema(schema)
+    return validator_class(schema)
+
+
 class JsonSchemaValidator(AbstractValidator):
     """ Json schema validator using the jsonschema library """
+    accepts_response = True
 
     def __init__(self):
         super(JsonSchemaValidator, self).__init__()
         self.schema_context = None
+        self.__schema_key = None
+        self.__schema_validator = None
+
+    def __getstate__(self):
+        # The compiled schema is rebuilt on first use
+        state = self.__dict__.copy()
+        state['_JsonSchemaValidator__schema_key'] = None
+        state['_JsonSchemaValidator__schema_validator'] = None
+        return state
+
+    def get_schema_validator(self, context=None):
+        """ Compiled validator for the schema
+
+        A static schema is compiled once, or again when its file changes (path and mtime key).
+        Templated schemas are rendered for the context and looked up in the compile_schema LRU.
+        """
+        schema_context = self.schema_context
+        if schema_context.is_dynamic():
+            return compile_schema(schema_context.get_content(context=context))
+
+        if schema_context.is_file:
+            schema_key = (schema_context.content, os.stat(schema_context.content).st_mtime_ns)
+        else:
+            schema_key = schema_context.content
+        if schema_key != self.__schema_key:
+            self.__schema_validator = compile_schema(schema_context.get_content(context=context))
+            self.__schema_key = schema_key
+        return self.__schema_validator
 
-    def validate(self, body=None, headers=None, context=None):
-        schema_text = self.schema_context.get_content(context=context)
-        schema = yaml.safe_load(schema_text)
+    def validate(self, body=None, headers=None, context=None, response=None):
+        schema_validator = self.get_schema_validator(context=context)
         try:
-            if isinstance(body, bytes):
-                body = body.decode()
-            jsonschema.validate(json.loads(body), schema)
+            if response is not None:
+                instance = response.json
+            else:
+                if isinstance(body, bytes):
+                    body = body.decode()
+                instance = json.loads(body)
+            schema_validator.validate(instance)
             return True
         except jsonschema.exceptions.ValidationError:
             return self.__failed("JSON Schema Validation Failed")
-        except json.decoder.JSONDecodeError:
+        except ValueError:
             # trace = traceback.format_exc()
             return self.__failed("Invalid response json body")
 
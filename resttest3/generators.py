@@ -2,6 +2,8 @@ import logging
 import os
 import random
 import string
+import sys
+from array import array
 """ Collection of generators to be used in templating for test data
 
 Plans: extend these by allowing generators that take generators for input
@@ -9,6 +11,7 @@ Example: generators that case-swap
 """
 
 INT32_MAX_VALUE = 2147483647  # Max of 32 bit unsigned int
+BATCH_SIZE = 1024  # Values drawn at once by the fast (non secure) random generators
 
 logger = logging.getLogger('resttest3.generators')
 
@@ -55,28 +58,57 @@ def generator_basic_ids():
     return factory_generate_ids(1)()
 
 
-def generator_random_int32():
+def make_random(seed=None, secure=False):
+    """ Random number generator for the random generators: a seedable Mersenne Twister,
+        or SystemRandom when secure values are asked for, which cannot be seeded """
+    if secure:
+        if seed is not None:
+            raise ValueError("A secure random generator cannot be seeded")
+        return random.SystemRandom()
+    return random.Random(seed)
+
+
+def generator_random_int32(seed=None, secure=False):
     """ Random integer generator for up to 32-bit signed ints """
-    system_random = random.SystemRandom()
-    while True:
-        yield system_random.randint(0, INT32_MAX_VALUE)
+    rng = make_random(seed, secure)
+    if secure:
+        while True:
+            yield rng.randint(0, INT32_MAX_VALUE)
+    while True:  # 32 random bits per value, shifted to 31
+        values = array('I', rng.getrandbits(32 * BATCH_SIZE).to_bytes(4 * BATCH_SIZE, 'little'))
+        if sys.byteorder == 'big':  # Same values for a seed on every platform
+            values.byteswap()
+        for value in values:
+            yield value >> 1
 
 
-def factory_generate_text(legal_characters=string.ascii_letters, min_length=8, max_length=8):
+def factory_generate_text(legal_characters=string.ascii_letters, min_length=8, max_length=8, seed=None, secure=False):
     """ Returns a generator function for text with given legal_characters string and length
         Default is ascii letters, length 8
 
         For hex digits, combine with string.hexstring, etc
+        Unless secure, the characters of a whole batch of values are drawn at once and sliced
         """
-    system_random = random.SystemRandom()  # To Cryptographically secure random
 
     def generate_text():
+        rng = make_random(seed, secure)
         local_min_len = min_length
         local_max_len = max_length
+        if secure:
+            while True:
+                length = rng.randint(local_min_len, local_max_len)
+                yield ''.join([rng.choice(legal_characters) for _ in range(0, length)])
+        lengths = range(local_min_len, local_max_len + 1)
         while True:
-            length = system_random.randint(local_min_len, local_max_len)
-            array = [system_random.choice(legal_characters) for _ in range(0, length)]
-            yield ''.join(array)
+            if local_min_len == local_max_len:
+                batch_lengths = [local_min_len] * BATCH_SIZE
+            else:
+                batch_lengths = rng.choices(lengths, k=BATCH_SIZE)
+            text = ''.join(rng.choices(legal_characters, k=sum(batch_lengths)))
+            start = 0
+            for length in batch_lengths:
+                yield text[start:start + length]
+                start += length
 
     return generate_text
 
@@ -106,14 +138,17 @@ def parse_fixed_sequence(config):
     return factory_fixed_sequence(vals)()
 
 
-def factory_choice_generator(values):
+def factory_choice_generator(values, seed=None, secure=False):
     """ Return a generator that picks values from a list randomly """
-    system_random = random.SystemRandom()  # To Cryptographically secure random
 
     def choice_generator():
+        rng = make_random(seed, secure)
         my_list = list(values)
+        if secure:
+            while True:
+                yield rng.choice(my_list)
         while True:
-            yield system_random.choice(my_list)
+            yield from rng.choices(my_list, k=BATCH_SIZE)
 
     return choice_generator
 
@@ -123,7 +158,7 @@ def parse_choice_generator(config):
     vals = config['values']
     if not vals or (not isinstance(vals, list)):
         raise ValueError('Values must be a list of entries')
-    return factory_choice_generator(vals)()
+    return factory_choice_generator(vals, **parse_random_options(config))()
 
 
 def factory_env_variable(env_variable):
@@ -150,6 +185,16 @@ def factory_env_string(env_string):
 """ Implements the parsing logic for YAML, and acts as single point for reading configuration """
 
 
+def parse_random_options(configuration):
+    """ The seed and secure options of a random generator, as keyword arguments of its factory """
+    from resttest3.utils import Parser
+    seed = configuration.get('seed')
+    secure = Parser.safe_to_bool(configuration.get('secure', False))
+    if secure and seed is not None:
+        raise ValueError("A secure random generator cannot be seeded")
+    return {'seed': seed, 'secure': secure}
+
+
 def parse_random_text_generator(configuration):
     """ Parses configuration options for a random text generator """
     character_set = configuration.get('character_set')
@@ -165,8 +210,9 @@ def parse_random_text_generator(configuration):
 
     min_length = int(configuration.get('min_length', 8))
     max_length = int(configuration.get('max_length', 8))
+    random_options = parse_random_options(configuration)
     if not characters:
-        return factory_generate_text(min_length=min_length, max_length=max_length)()
+        return factory_generate_text(min_length=min_length, max_length=max_length, **random_options)()
     characters = str(characters)
 
     if configuration.get('length'):
@@ -175,7 +221,7 @@ def parse_random_text_generator(configuration):
         max_length = length
 
     return factory_generate_text(
-        legal_characters=characters, min_length=min_length, max_length=max_length)()
+        legal_characters=characters, min_length=min_length, max_length=max_length, **random_options)()
 
 
 # List of valid generator types
@@ -231,7 +277,7 @@ def parse_generator(configuration):
         increment = int(configuration.get('increment', 1))
         return factory_generate_ids(start, increment)()
     elif gen_type == 'random_int':
-        return generator_random_int32()
+        return generator_random_int32(**parse_random_options(configuration))
     elif gen_type == 'random_text':
         return parse_random_text_generator(configuration)
     elif gen_type in GENERATOR_TYPES:
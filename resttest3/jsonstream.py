@@ -0,0 +1,158 @@
+""" Incremental lookup of one path in a JSON document read as a stream of byte chunks
+
+Only the containers along the path are walked item by item. Items before the target are decoded one at a time by
+the C scanner of the json module and dropped, an item too large to decode at once is walked in turn, so memory stays
+bounded by the largest small item rather than the document. Reading stops as soon as the target value is decoded,
+the rest of the document is never fetched from the stream.
+"""
+import codecs
+import json
+import re
+
+MISSING = object()  # Returned by find_path when the path does not exist in the document
+
+DECODE_LIMIT = 1 << 20  # Characters a skipped value may span before it is walked item by item instead of decoded
+
+_TOO_LONG = object()
+_NON_WHITESPACE = re.compile(r'[^ \t\n\r]')
+_NUMBER_CHARACTERS = frozenset('0123456789+-.eE')
+
+
+class JsonStreamReader:
+    """ Cursor over a UTF-8 JSON document arriving in chunks, the consumed prefix of the buffer is dropped on refill """
+
+    def __init__(self, chunks):
+        self.__chunks = iter(chunks)
+        self.__decoder = codecs.getincrementaldecoder('utf-8')()
+        self.__scanner = json.JSONDecoder()
+        self.__buffer = ''
+        self.__position = 0
+        self.__exhausted = False
+
+    def __fill(self, size=1):
+        """ Append at least size characters, or what is left of the document """
+        added = []
+        length = 0
+        for chunk in self.__chunks:
+            text = self.__decoder.decode(chunk)
+            added.append(text)
+            length += len(text)
+            if length >= size:
+                break
+        else:
+            self.__exhausted = True
+            added.append(self.__decoder.decode(b'', final=True))
+        self.__buffer = self.__buffer[self.__position:] + ''.join(added)
+        self.__position = 0
+
+    def __decode(self, limit=None):
+        """ Decode the value at the position, or return _TOO_LONG once limit characters do not hold all of it
+        The buffered text at least doubles on each attempt, so a value is scanned a bounded number of times """
+        while True:
+            try:
+                value, end = self.__scanner.raw_decode(self.__buffer, self.__position)
+                # A number ending the buffer, or at a '.' or 'e', could go on in the next chunk
+                if self.__exhausted or end < len(self.__buffer) and self.__buffer[end] not in _NUMBER_CHARACTERS:
+                    self.__position = end
+                    return value
+            except json.JSONDecodeError as e:
+                if self.__exhausted:
+                    raise ValueError("Not legal JSON! {0}".format(e))
+            buffered = len(self.__buffer) - self.__position
+            if limit is not None and buffered >= limit:
+                return _TOO_LONG
+            self.__fill(max(buffered, 1))
+
+    def peek(self):
+        """ Next character that is not whitespace, without consuming it, '' at the end of the document """
+        while True:
+            match = _NON_WHITESPACE.search(self.__buffer, self.__position)
+            if match is not None:
+                self.__position = match.start()
+                return self.__buffer[self.__position]
+            self.__position = len(self.__buffer)
+            if self.__exhausted:
+                return ''
+            self.__fill()
+
+    def expect(self, token):
+        if self.peek() != token:
+            raise ValueError("Not legal JSON! Expected {0!r} at {1!r}".format(
+                token, self.__buffer[self.__position:self.__position + 20]))
+        self.__position += 1
+
+    def read_value(self):
+        """ Consume and decode a whole value """
+        if self.peek() in ('', ',', ':', ']', '}'):
+            raise ValueError("Not legal JSON! Expected a value at {0!r}".format(
+                self.__buffer[self.__position:self.__position + 20]))
+        return self.__decode()
+
+    def skip_value(self):
+        """ Consume a value, a container too large to decode at once is walked item by item """
+        if self.peek() not in ('{', '['):
+            self.read_value()
+        elif self.__decode(limit=DECODE_LIMIT) is _TOO_LONG:
+            for _ in self.__items():
+                self.skip_value()
+
+    def __items(self):
+        """ Walk the container at the position, yielding the key or index of each item with the reader at its
+        value, which has to be consumed before the next item """
+        opening = self.peek()
+        closing = '}' if opening == '{' else ']'
+        self.__position += 1
+        if self.peek() == closing:
+            self.__position += 1
+            return
+        index = 0
+        while True:
+            if opening == '{':
+                if self.peek() != '"':
+                    raise ValueError("Not legal JSON! Object keys must be strings")
+                key = self.__decode()
+                self.expect(':')
+                yield key
+            else:
+                yield index
+            index += 1
+            separator = self.peek()
+            self.__position += 1
+            if separator == closing:
+                return
+            if separator != ',':
+                raise ValueError("Not legal JSON! Expected ',' or {0!r} between items".format(closing))
+
+    def enter(self, step):
+        """ Move to the value at step of the container at the position, an int indexes an array and a str an
+        object. Returns False when there is no such item """
+        opening = self.peek()
+        if opening not in ('{', '[') or (opening == '[') != isinstance(step, int):
+            return False  # Same as indexing a dict with an int or a list with a str
+        for key in self.__items():
+            if key == step:
+                return True
+            self.skip_value()
+        return False
+
+
+def find_path(chunks, steps):
+    """ Decoded value at the steps of a compiled jsonpath_mini query, MISSING when the document has no such path
+    An object with duplicate keys resolves to the first one, where json.loads keeps the last. A negative index
+    decodes its whole array.
+    """
+    reader = JsonStreamReader(chunks)
+    if reader.peek() == '':
+        raise ValueError("Not legal JSON! Empty document")
+    for index, step in enumerate(steps):
+        if isinstance(step, int) and step < 0:  # Counted from the end: the rest is looked up in the decoded array
+            value = reader.read_value()
+            try:
+                for step in steps[index:]:
+                    value = value[step]
+            except Exception:
+                return MISSING
+            return value
+        if not reader.enter(step):
+            return MISSING
+    return reader.read_value()
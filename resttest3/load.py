@@ -0,0 +1,288 @@
+""" Load generation for benchmarks: schedulers driving requests from a pycurl CurlMulti, and load profile stages """
+import logging
+import math
+import time
+from abc import ABCMeta, abstractmethod
+
+import pycurl
+
+from resttest3.utils import Parser
+
+logger = logging.getLogger('resttest3.load')
+
+
+def constant_rate(rate, count, offset=0.0):
+    """ Send times, in seconds from the start, of `count` requests at `rate` per second """
+    for index in range(int(count)):
+        yield offset + index / rate
+
+
+def linear_ramp(start_rate, end_rate, duration, offset=0.0):
+    """ Send times of requests whose rate changes linearly from start_rate to end_rate over duration seconds
+    Request i is due when the number of requests sent so far, r0 t + (r1 - r0) t^2 / 2T, reaches i
+    """
+    start_rate, end_rate, duration = float(start_rate), float(end_rate), float(duration)
+    count = int(round((start_rate + end_rate) / 2.0 * duration))
+    acceleration = (end_rate - start_rate) / (2.0 * duration)
+    for index in range(count):
+        if acceleration == 0:
+            due = index / start_rate
+        else:
+            due = (-start_rate + math.sqrt(start_rate * start_rate + 4.0 * acceleration * index)) / (2.0 * acceleration)
+        yield offset + due
+
+
+class MultiScheduler(metaclass=ABCMeta):
+    """ Base of the schedulers: runs transfers on a CurlMulti with handles from the pool or its own """
+
+    SELECT_TIMEOUT = 0.05
+
+    def __init__(self, pool=None, url=None):
+        self.pool = pool
+        self.url = url
+        self.started = None  # Monotonic time the run started
+        self.finished = None  # Monotonic time the last request finished
+        self.sent = 0
+        self._multi = None
+        self._in_flight = {}  # curl handle to the monotonic time its request was due
+        self.__idle = []
+        self.__handles = []
+
+    @property
+    def elapsed(self):
+        if self.started is None or self.finished is None:
+            return 0.0
+        return self.finished - self.started
+
+    @property
+    def achieved_rate(self):
+        """ Requests completed per second over the run """
+        return self.sent / self.elapsed if self.elapsed > 0 else 0.0
+
+    def run(self, prepare, finish):
+        """ Run the schedule: prepare(curl_handler) configures a handle for the next request and
+        finish(curl_handler, due_time, done_time, error) is called as each one completes, error being None on success
+        """
+        self._multi = pycurl.CurlMulti()
+        self.started = time.monotonic()
+        try:
+            while self._has_work():
+                self._start_due(time.monotonic(), prepare)
+                self.__perform(finish)
+                timeout = self._wait_timeout(time.monotonic())
+                if self._in_flight:
+                    self._multi.select(timeout)
+                elif timeout > 0:
+                    time.sleep(timeout)
+            self.finished = time.monotonic()
+        finally:
+            for curl_handler in list(self._in_flight):
+                self._multi.remove_handle(curl_handler)
+            self._in_flight.clear()
+            self._multi.close()
+            self.__close_handles()
+
+    @abstractmethod
+    def _has_work(self):
+        """ Requests remain to be sent or are in flight """
+
+    @abstractmethod
+    def _start_due(self, now, prepare):
+        """ Add the requests that are due now """
+
+    def _wait_timeout(self, now):
+        return self.SELECT_TIMEOUT
+
+    def _send(self, prepare, due_time):
+        curl_handler = self.__acquire()
+        prepare(curl_handler)
+        self._in_flight[curl_handler] = due_time
+        self._multi.add_handle(curl_handler)
+        self.sent += 1
+
+    def __acquire(self):
+        if self.__idle:
+            return self.__idle.pop()
+        if self.pool is not None:
+            curl_handler = self.pool.acquire(self.url)
+        else:
+            curl_handler = pycurl.Curl()
+        self.__handles.append(curl_handler)
+        return curl_handler
+
+    def __perform(self, finish):
+        ret, _ = self._multi.perform()
+        while ret == pycurl.E_CALL_MULTI_PERFORM:
+            ret, _ = self._multi.perform()
+        while True:
+            queued, ok_list, error_list = self._multi.info_read()
+            done_time = time.monotonic()
+            for curl_handler in ok_list:
+                self.__finish(curl_handler, done_time, None, finish)
+            for curl_handler, errno, message in error_list:
+                self.__finish(curl_handler, done_time, pycurl.error(errno, message), finish)
+            if not queued:
+                break
+
+    def __finish(self, curl_handler, done_time, error, finish):
+        self._multi.remove_handle(curl_handler)
+        due_time = self._in_flight.pop(curl_handler)
+        finish(curl_handler, due_time, done_time, error)
+        self.__idle.append(curl_handler)
+
+    def __close_handles(self):
+        for curl_handler in self.__handles:
+            if self.pool is not None:
+                self.pool.release(curl_handler)
+            else:
+                curl_handler.close()
+        self.__handles = []
+        self.__idle = []
+
+
+class OpenLoopScheduler(MultiScheduler):
+    """ Sends requests on a fixed timetable of send times, in seconds from the start of the run
+
+    The schedule does not wait for responses (open loop), so a slow server cannot slow the client
+    down and hide its own latency (coordinated omission). Each finished request is reported with the
+    time it was due, not the time it could actually be sent. At most `concurrency` requests are in
+    flight, a request that is due while all handles are busy is sent late and its latency shows it.
+    """
+
+    DEFAULT_CONCURRENCY = 100
+
+    def __init__(self, schedule, concurrency=None, pool=None, url=None):
+        super(OpenLoopScheduler, self).__init__(pool=pool, url=url)
+        self.concurrency = int(concurrency) if concurrency else self.DEFAULT_CONCURRENCY
+        self.__schedule = iter(schedule)
+        self.__next_offset = next(self.__schedule, None)
+
+    @classmethod
+    def constant(cls, rate, count, concurrency=None, pool=None, url=None):
+        if float(rate) <= 0:
+            raise ValueError("Request rate must be positive, not {0}".format(rate))
+        return cls(constant_rate(float(rate), count), concurrency=concurrency, pool=pool, url=url)
+
+    def _has_work(self):
+        return self.__next_offset is not None or self._in_flight
+
+    def __due(self):
+        return self.started + self.__next_offset
+
+    def _start_due(self, now, prepare):
+        while self.__next_offset is not None and len(self._in_flight) < self.concurrency and self.__due() <= now:
+            self._send(prepare, self.__due())
+            self.__next_offset = next(self.__schedule, None)
+
+    def _wait_timeout(self, now):
+        """ Sleep until the next request is due or a transfer needs attention """
+        if self.__next_offset is not None and len(self._in_flight) < self.concurrency:
+            return max(0.0, min(self.SELECT_TIMEOUT, self.__due() - now))
+        return self.SELECT_TIMEOUT
+
+
+class ConcurrencyScheduler(MultiScheduler):
+    """ Keeps a number of virtual users busy for `duration` seconds, closed loop: each user sends its
+    next request as soon as its previous one finished. concurrency_at(seconds since start) gives the
+    number of users at any time, users above it stop once their request finishes.
+    """
+
+    def __init__(self, concurrency_at, duration, pool=None, url=None):
+        super(ConcurrencyScheduler, self).__init__(pool=pool, url=url)
+        self.concurrency_at = concurrency_at
+        self.duration = float(duration)
+
+    def _has_work(self):
+        return time.monotonic() < self.started + self.duration or self._in_flight
+
+    def _start_due(self, now, prepare):
+        if now >= self.started + self.duration:
+            return
+        target = self.concurrency_at(now - self.started)
+        while len(self._in_flight) < target:
+            self._send(prepare, now)
+
+    def _wait_timeout(self, now):
+        if self._in_flight:
+            return self.SELECT_TIMEOUT
+        return max(0.0, min(self.SELECT_TIMEOUT, self.started + self.duration - now))
+
+
+class LoadStage:
+    """ One stage of a benchmark load profile: a constant or linearly ramped rate (open loop)
+    or number of concurrent users (closed loop) for `duration` seconds, then held at the final
+    level for `hold` seconds. Metrics of the stage, hold included, are reported separately.
+    """
+
+    def __init__(self, name=None, duration=None, rate=None, concurrency=None, ramp_from=None, hold=0.0):
+        if (rate is None) == (concurrency is None):
+            raise ValueError("A load profile stage needs either a rate or a concurrency")
+        if duration is None or float(duration) <= 0:
+            raise ValueError("A load profile stage needs a positive duration, not {0}".format(duration))
+        self.name = name
+        self.duration = float(duration)
+        self.rate = float(rate) if rate is not None else None
+        self.concurrency = int(concurrency) if concurrency is not None else None
+        self.ramp_from = float(ramp_from) if ramp_from is not None else None
+        self.hold = float(hold) if hold else 0.0
+        level = self.rate if self.rate is not None else self.concurrency
+        if level <= 0 or (self.ramp_from is not None and self.ramp_from < 0):
+            raise ValueError("Load profile stage {0} needs a positive rate or concurrency".format(name))
+
+    @property
+    def total_duration(self):
+        return self.duration + self.hold
+
+    @property
+    def target_rate(self):
+        """ Average requests per second asked for by a rate stage, None for a concurrency stage """
+        if self.rate is None:
+            return None
+        start = self.ramp_from if self.ramp_from is not None else self.rate
+        return ((start + self.rate) / 2.0 * self.duration + self.rate * self.hold) / self.total_duration
+
+    def schedule(self):
+        """ Send times of a rate stage """
+        if self.ramp_from is None or self.ramp_from == self.rate:
+            yield from constant_rate(self.rate, round(self.rate * self.total_duration))
+            return
+        ramp_start = self.ramp_from if self.ramp_from > 0 else self.rate / 1000.0  # Avoid an endless first gap
+        yield from linear_ramp(ramp_start, self.rate, self.duration)
+        if self.hold:
+            yield from constant_rate(self.rate, round(self.rate * self.hold), offset=self.duration)
+
+    def concurrency_at(self, elapsed):
+        """ Users a concurrency stage runs, `elapsed` seconds into it """
+        if self.ramp_from is None or elapsed >= self.duration:
+            return self.concurrency
+        level = self.ramp_from + (self.concurrency - self.ramp_from) * elapsed / self.duration
+        return max(1, int(round(level)))
+
+    def scheduler(self, pool=None, url=None, concurrency=None):
+        """ Scheduler running this stage, `concurrency` caps the requests in flight of a rate stage """
+        if self.rate is not None:
+            return OpenLoopScheduler(self.schedule(), concurrency=concurrency, pool=pool, url=url)
+        return ConcurrencyScheduler(self.concurrency_at, self.total_duration, pool=pool, url=url)
+
+    @classmethod
+    def parse(cls, node, index=0):
+        """ Parse a stage from a dictionary (or list of single key dictionaries) of its settings """
+        node = Parser.flatten_lowercase_keys_dict(node)
+        unknown = set(node) - {'name', 'duration', 'rate', 'concurrency', 'ramp_from', 'hold'}
+        if unknown:
+            raise ValueError("Unknown load profile stage settings: {0}".format(sorted(unknown)))
+        return cls(name=Parser.coerce_to_string(node.get('name', 'stage %s' % (index + 1))),
+                   duration=node.get('duration'), rate=node.get('rate'), concurrency=node.get('concurrency'),
+                   ramp_from=node.get('ramp_from'), hold=node.get('hold'))
+
+
+def parse_load_profile(node):
+    """ Parse a benchmark load_profile: a list of stages """
+    if not isinstance(node, list) or not node:
+        raise ValueError("A load profile must be a non empty list of stages")
+    stage_list = []
+    for index, stage_node in enumerate(node):
+        if isinstance(stage_node, dict) and len(stage_node) == 1 and 'stage' in Parser.lowercase_keys(stage_node):
+            stage_node = Parser.lowercase_keys(stage_node)['stage']  # Allow "- stage: {...}"
+        stage_list.append(LoadStage.parse(stage_node, index))
+    return stage_list
@@ -0,0 +1,180 @@
+""" Concurrent execution of test groups on a single pycurl CurlMulti event loop """
+import heapq
+import logging
+import time
+from collections import deque
+from itertools import count
+
+import pycurl
+
+from resttest3.constants import DEFAULT_TIMEOUT
+
+logger = logging.getLogger('resttest3.parallel')
+
+
+class GroupState:
+    """ Progress of one test group: tests run strictly in order, one curl handle at a time """
+
+    def __init__(self, name, testcase_list, pool=None):
+        self.name = name
+        self.pending = deque(testcase_list)
+        self.pool = pool
+        self.curl_handler = None
+        self.testcase = None
+        self.body_byte = None
+        self.header_byte = None
+
+    def next_testcase(self):
+        self.testcase = self.pending.popleft() if self.pending else None
+        return self.testcase
+
+    def acquire(self):
+        """ Get a clean handle for the current test, from the pool or by reusing the group's own handle """
+        if self.pool is not None:
+            self.curl_handler = self.pool.acquire(self.testcase.url)
+        elif self.curl_handler is None:
+            self.curl_handler = pycurl.Curl()
+        else:
+            self.curl_handler.reset()
+        return self.curl_handler
+
+    def release(self):
+        if self.pool is not None and self.curl_handler is not None:
+            self.pool.release(self.curl_handler)
+            self.curl_handler = None
+
+    def close(self):
+        if self.curl_handler is not None:
+            self.curl_handler.close()
+            self.curl_handler = None
+
+
+class ParallelRunner:
+    """ Drives up to `concurrency` test groups at once on one CurlMulti
+
+    Groups are independent of each other, so they may interleave freely. Inside a group
+    the next test is only prepared once the previous one has finished, which keeps the
+    ordering and extract_binds chaining on the group's shared Context intact.
+    """
+
+    SELECT_TIMEOUT = 1.0
+
+    def __init__(self, concurrency, timeout=None, pool=None):
+        if int(concurrency) < 1:
+            raise ValueError("Parallel concurrency must be at least 1, not {0}".format(concurrency))
+        self.concurrency = int(concurrency)
+        self.timeout = timeout if timeout else DEFAULT_TIMEOUT
+        self.pool = pool
+        self.__multi = None
+        self.__active = {}  # curl handle to GroupState for requests in flight
+        self.__delayed = []  # heap of (start time, sequence, GroupState) for tests with a delay
+        self.__sequence = count()
+
+    def run(self, test_group_dict, callback=None):
+        """ Run every test of every group, callback(group_name, testcase) is invoked as each test finishes """
+        waiting_groups = deque(
+            GroupState(name, group.testcase_list, self.pool)
+            for name, group in test_group_dict.items() if group.testcase_list
+        )
+        running_count = 0
+        self.__multi = pycurl.CurlMulti()
+        try:
+            while waiting_groups or running_count:
+                while waiting_groups and running_count < self.concurrency:
+                    if self.__start_next(waiting_groups.popleft()):
+                        running_count += 1
+
+                self.__start_delayed()
+                for group_state, error in self.__perform():
+                    if self.__retry(group_state, error):
+                        continue
+                    if error is None:
+                        group_state.testcase.process_response(
+                            group_state.curl_handler, group_state.body_byte, group_state.header_byte)
+                    else:
+                        group_state.testcase.curl_failed(pycurl.error(*error))
+                    group_state.release()
+                    if callback:
+                        callback(group_state.name, group_state.testcase)
+                    if not self.__start_next(group_state):
+                        running_count -= 1
+        finally:
+            for curl_handler, group_state in list(self.__active.items()):
+                self.__multi.remove_handle(curl_handler)
+                group_state.release()
+            self.__multi.close()
+            self.__active.clear()
+            self.__delayed = []
+
+    def __start_next(self, group_state):
+        """ Prepare the next test of the group and queue it, returns False once the group is exhausted """
+        testcase = group_state.next_testcase()
+        if testcase is None:
+            group_state.close()
+            return False
+
+        group_state.body_byte, group_state.header_byte = testcase.prepare(
+            group_state.acquire(), timeout=self.timeout, keep_alive=True)
+        if testcase.delay:
+            heapq.heappush(self.__delayed, (time.monotonic() + testcase.delay, next(self.__sequence), group_state))
+        else:
+            self.__add(group_state)
+        return True
+
+    def __retry(self, group_state, error):
+        """ Queue the test of the group again on the same handle when its attempt is to be retried """
+        testcase = group_state.testcase
+        delay = testcase.retry_delay(group_state.curl_handler, group_state.header_byte,
+                                     error=None if error is None else pycurl.error(*error))
+        if delay is None:
+            return False
+        group_state.body_byte, group_state.header_byte = testcase.retry(
+            group_state.curl_handler, group_state.body_byte, group_state.header_byte, timeout=self.timeout)
+        heapq.heappush(self.__delayed, (time.monotonic() + delay, next(self.__sequence), group_state))
+        return True
+
+    def __add(self, group_state):
+        logger.info("Hitting %s" % group_state.testcase.url)
+        self.__active[group_state.curl_handler] = group_state
+        self.__multi.add_handle(group_state.curl_handler)
+
+    def __start_delayed(self):
+        now = time.monotonic()
+        while self.__delayed and self.__delayed[0][0] <= now:
+            self.__add(heapq.heappop(self.__delayed)[2])
+
+    def __perform(self):
+        """ Drive transfers until at least one finishes, returns a list of (GroupState, error or None) """
+        while True:
+            ret, _ = self.__multi.perform()
+            while ret == pycurl.E_CALL_MULTI_PERFORM:
+                ret, _ = self.__multi.perform()
+
+            finished = []
+            while True:
+                queued, ok_list, error_list = self.__multi.info_read()
+                for curl_handler in ok_list:
+                    finished.append((self.__finish(curl_handler), None))
+                for curl_handler, errno, message in error_list:
+                    finished.append((self.__finish(curl_handler), (errno, message)))
+                if not queued:
+                    break
+            if finished:
+                return finished
+
+            if self.__active:
+                self.__multi.select(self.__select_timeout())
+            elif self.__delayed:
+                time.sleep(max(0.0, self.__delayed[0][0] - time.monotonic()))
+            else:
+                return finished
+            self.__start_delayed()
+
+    def __select_timeout(self):
+        if self.__delayed:
+            return max(0.0, min(self.SELECT_TIMEOUT, self.__delayed[0][0] - time.monotonic()))
+        return self.SELECT_TIMEOUT
+
+    def __finish(self, curl_handler):
+        self.__multi.remove_handle(curl_handler)
+        return self.__active.pop(curl_handler)
@@ -0,0 +1,117 @@
+""" Compiled test plans: parsed test groups pickled next to the YAML file they were parsed from """
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+from pathlib import Path
+
+logger = logging.getLogger('resttest3.plan')
+
+PLAN_VERSION = 3  # Bump when parsed objects change shape, older plans are then parsed again
+
+
+def file_digest(path):
+    """ sha256 hex digest of the content of a file """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Dependency:
+    """ A file a plan was parsed from: its path, mtime and content hash """
+
+    def __init__(self, path, mtime_ns, size, digest):
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.digest = digest
+
+    @classmethod
+    def from_file(cls, path):
+        path = str(Path(path).resolve())
+        stat = os.stat(path)
+        return cls(path, stat.st_mtime_ns, stat.st_size, file_digest(path))
+
+    def is_current(self):
+        """ The file is unchanged: same mtime and size, or else same content """
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return False
+        if stat.st_mtime_ns == self.mtime_ns and stat.st_size == self.size:
+            return True
+        return stat.st_size == self.size and file_digest(self.path) == self.digest
+
+
+class PlanCache:
+    """ Stores the parsed groups of a test file in a hidden file next to it
+
+    A plan is used while the base URL is the same and the test file and every file it includes or
+    imports are unchanged. A file whose mtime changed but whose content did not still matches.
+    Plans that cannot be pickled, for instance extension objects holding lambdas, are not stored.
+    """
+
+    SUFFIX = '.plan'
+
+    def __init__(self, directory=None):
+        self.directory = directory  # Store plans here instead of next to the test files
+        self.hits = 0
+        self.misses = 0
+
+    def plan_path(self, test_file):
+        test_file = Path(test_file).resolve()
+        directory = Path(self.directory) if self.directory else test_file.parent
+        return directory.joinpath('.%s%s' % (test_file.name, self.SUFFIX))
+
+    def load(self, test_file, base_url):
+        """ The stored plan dictionary of the test file, None when there is none or it is out of date """
+        plan_path = self.plan_path(test_file)
+        try:
+            with open(plan_path, 'rb') as f:
+                plan = pickle.load(f)
+        except FileNotFoundError:
+            plan = None
+        except Exception:
+            logger.warning("Ignoring unreadable test plan %s" % plan_path, exc_info=True)
+            plan = None
+
+        if plan is None or plan.get('version') != PLAN_VERSION or plan.get('base_url') != base_url or not all(
+                dependency.is_current() for dependency in plan['dependencies']):
+            self.misses += 1
+            return None
+        logger.debug("Using test plan %s" % plan_path)
+        self.hits += 1
+        return plan
+
+    def store(self, test_file, base_url, dependency_files, test_group_dict, config):
+        """ Pickle the parsed groups and config, replacing any previous plan atomically """
+        plan = {
+            'version': PLAN_VERSION,
+            'base_url': base_url,
+            'dependencies': [Dependency.from_file(path) for path in dependency_files],
+            'groups': test_group_dict,
+            'config': config,
+        }
+        try:
+            data = pickle.dumps(plan, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            logger.info("Test plan of %s is not stored, it cannot be pickled: %s" % (test_file, e))
+            return False
+
+        plan_path = self.plan_path(test_file)
+        temp_name = None
+        try:
+            with tempfile.NamedTemporaryFile('wb', dir=str(plan_path.parent), prefix=plan_path.name,
+                                             delete=False) as f:
+                temp_name = f.name
+                f.write(data)
+            os.replace(temp_name, str(plan_path))  # Concurrent readers see the old plan or the new one
+        except OSError as e:
+            logger.warning("Cannot write test plan %s: %s" % (plan_path, e))
+            if temp_name is not None and os.path.exists(temp_name):
+                os.remove(temp_name)
+            return False
+        return True
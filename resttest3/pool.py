@@ -0,0 +1,110 @@
+""" Pool of reusable curl handles, so tests against the same host keep their connections alive """
+import logging
+from functools import lru_cache
+from urllib.parse import urlsplit
+
+import pycurl
+
+logger = logging.getLogger('resttest3.pool')
+
+# Data a CurlShare hands between easy handles, connection sharing needs libcurl 7.57+
+SHARE_LOCK_DATA = [
+    getattr(pycurl, name) for name in ('LOCK_DATA_DNS', 'LOCK_DATA_SSL_SESSION', 'LOCK_DATA_CONNECT')
+    if hasattr(pycurl, name)
+]
+
+
+@lru_cache(maxsize=None)
+def ca_bundle():
+    """ Path of the certifi CA bundle, certifi is only imported once a handle needs it """
+    import certifi
+    return certifi.where()
+
+
+class CurlPool:
+    """ Per-host pool of curl handles
+
+    A handle keeps its connection cache, DNS cache and TLS sessions across curl reset(),
+    so handing the same handle to the next test against a host skips the TCP and TLS handshakes.
+    With share=True every handle is also attached to one CurlShare, which lets handles for
+    different tests share DNS results, TLS sessions and connections with each other.
+    """
+
+    DEFAULT_MAX_IDLE_PER_HOST = 8
+
+    def __init__(self, share=False, max_idle_per_host=DEFAULT_MAX_IDLE_PER_HOST):
+        self.hits = 0
+        self.misses = 0
+        self.max_idle_per_host = max_idle_per_host
+        self.__idle = {}  # Host key to list of idle handles
+        self.__in_use = {}  # Handle to the host key it was acquired for
+        self.__share = None
+        if share:
+            self.__share = pycurl.CurlShare()
+            for lock_data in SHARE_LOCK_DATA:
+                self.__share.setopt(pycurl.SH_SHARE, lock_data)
+
+    @property
+    def is_shared(self):
+        return self.__share is not None
+
+    @staticmethod
+    def host_key(url):
+        """ Connections can only be reused for the same scheme, host and port """
+        if isinstance(url, bytes):
+            url = url.decode('utf-8')
+        parts = urlsplit(str(url))
+        return "%s://%s" % (parts.scheme.lower(), parts.netloc.lower())
+
+    def acquire(self, url):
+        """ Return a clean handle for the url, reusing an idle one for the same host when there is one """
+        key = self.host_key(url)
+        idle_list = self.__idle.get(key)
+        if idle_list:
+            curl_handler = idle_list.pop()
+            self.hits += 1
+            self.__clean(curl_handler, reused=True)
+        else:
+            curl_handler = pycurl.Curl()
+            self.misses += 1
+            self.__clean(curl_handler)
+        self.__in_use[curl_handler] = key
+        return curl_handler
+
+    def release(self, curl_handler):
+        """ Return a handle to the pool, it is closed if the host already has enough idle handles """
+        key = self.__in_use.pop(curl_handler, None)
+        if key is None:
+            logger.warning("Released a curl handle that was not acquired from the pool")
+            return
+        idle_list = self.__idle.setdefault(key, [])
+        if len(idle_list) < self.max_idle_per_host:
+            idle_list.append(curl_handler)
+        else:
+            curl_handler.close()
+
+    def __clean(self, curl_handler, reused=False):
+        # reset() clears the options and cookies from the last test but retains the connection and DNS caches
+        if reused and self.__share is not None:
+            curl_handler.unsetopt(pycurl.SHARE)  # reset() drops the share in libcurl but not in pycurl
+        curl_handler.reset()
+        curl_handler.setopt(pycurl.COOKIELIST, "ALL")
+        curl_handler.setopt(pycurl.CAINFO, ca_bundle())
+        if self.__share is not None:
+            curl_handler.setopt(pycurl.SHARE, self.__share)
+
+    def stats(self):
+        idle_count = sum(len(idle_list) for idle_list in self.__idle.values())
+        return {'hits': self.hits, 'misses': self.misses, 'idle': idle_count, 'in_use': len(self.__in_use)}
+
+    def close(self):
+        for curl_handler in list(self.__in_use) + [h for idle_list in self.__idle.values() for h in idle_list]:
+            curl_handler.close()
+        self.__in_use.clear()
+        self.__idle.clear()
+        if self.__share is not None:
+            self.__share.close()
+            self.__share = None
+
+    def __str__(self):
+        return "Connection pool: {hits} hits, {misses} misses".format(**self.stats())
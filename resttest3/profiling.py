@@ -0,0 +1,272 @@
+""" Where resttest3 spends its own time: parse, templating, network and validation phases of a run
+
+Profiler.install() wraps the methods of each phase, so a run without --profile pays nothing for it.
+Every measured call is handed to the hook callbacks as hook(phase, seconds, detail), detail being the
+validator type for the 'validator' phase and the test name for the others when there is one.
+"""
+import functools
+import logging
+import sys
+import threading
+import time
+from collections import Counter
+
+import pycurl
+
+from resttest3.aggregates import LogLinearHistogram, RunningStats
+
+logger = logging.getLogger('resttest3.profiling')
+
+PHASES = ('parse', 'templating', 'network', 'validation')
+VALIDATOR_PHASE = 'validator'  # Time of each validator, by validator type, within the validation phase
+
+PROFILE_HOOKS = {}  # Name to hook(phase, seconds, detail) called by every Profiler
+
+
+def register_profile_hook(name, hook):
+    """ Register a hook(phase, seconds, detail) receiving every timing of a profiled run """
+    if not callable(hook):
+        raise TypeError("Profile hook {0} is not callable".format(name))
+    PROFILE_HOOKS[str(name)] = hook
+
+
+class PhaseStats:
+    """ Calls, total, mean, max and p95 seconds of a phase """
+
+    def __init__(self):
+        self.stats = RunningStats()
+        self.histogram = LogLinearHistogram(unit=1e-6)
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.stats.add(seconds)
+        self.histogram.record(seconds)
+        self.max = max(self.max, seconds)
+
+    @property
+    def count(self):
+        return self.stats.count
+
+    @property
+    def total(self):
+        return self.stats.total
+
+    @property
+    def mean(self):
+        return self.stats.mean
+
+    def as_dict(self):
+        return {'count': self.count, 'total': self.total, 'mean': self.mean, 'p95': self.histogram.percentile(95),
+                'max': self.max}
+
+
+class StackSampler:
+    """ Samples the stack of a thread at an interval, counting each stack as collapsed frames for flamegraph.pl """
+
+    def __init__(self, interval=0.001, thread_id=None):
+        self.interval = interval
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.stacks = Counter()
+        self.__stop = threading.Event()
+        self.__thread = None
+
+    @staticmethod
+    def frame_name(frame):
+        code = frame.f_code
+        return '%s:%s' % (frame.f_globals.get('__name__', '?'), getattr(code, 'co_qualname', code.co_name))
+
+    def sample(self):
+        frame = sys._current_frames().get(self.thread_id)
+        stack = []
+        while frame is not None:
+            stack.append(self.frame_name(frame))
+            frame = frame.f_back
+        if stack:
+            self.stacks[';'.join(reversed(stack))] += 1
+
+    def __run(self):
+        while not self.__stop.wait(self.interval):
+            self.sample()
+
+    def start(self):
+        self.__stop.clear()
+        self.__thread = threading.Thread(target=self.__run, name='resttest3-stack-sampler', daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        self.__stop.set()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+
+    def write(self, path):
+        """ One 'frame;frame;frame count' line per sampled stack """
+        with open(path, 'w') as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write('%s %s\n' % (stack, count))
+
+
+class Profiler:
+    """ Wraps the phases of a run while installed and aggregates their timings
+
+    Nested calls of a phase, like TestCase.url read inside TestCase.headers, count once for the outer call.
+    With pstats_file the run is also profiled by cProfile, with flamegraph_file its stack is sampled into
+    collapsed stacks. Only the process installing the profiler is measured, not --workers processes.
+    """
+
+    def __init__(self, hooks=None, pstats_file=None, flamegraph_file=None, sample_interval=0.001):
+        self.hooks = list(PROFILE_HOOKS.values()) + list(hooks or [])
+        self.pstats_file = pstats_file
+        self.flamegraph_file = flamegraph_file
+        self.sample_interval = sample_interval
+        self.phases = {phase: PhaseStats() for phase in PHASES}
+        self.validators = {}  # Validator type to its PhaseStats
+        self.elapsed = 0.0
+        self.__depth = Counter()
+        self.__patches = []  # (owner, attribute name, original value) to restore on uninstall
+        self.__validator_classes = set()
+        self.__cprofile = None
+        self.__sampler = None
+        self.__started = None
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    def record(self, phase, seconds, detail=None):
+        if phase == VALIDATOR_PHASE:
+            self.validators.setdefault(detail, PhaseStats()).add(seconds)
+        else:
+            self.phases.setdefault(phase, PhaseStats()).add(seconds)
+        for hook in self.hooks:
+            try:
+                hook(phase, seconds, detail)
+            except Exception:
+                logger.warning("Profile hook %s failed" % hook, exc_info=True)
+
+    def __timed(self, phase, function, detail=None):
+        """ function measured as a call of phase, detail(args) names what was called """
+        profiler = self
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if profiler.__depth[phase]:
+                return function(*args, **kwargs)
+            profiler.__depth[phase] += 1
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                seconds = time.perf_counter() - start
+                profiler.__depth[phase] -= 1
+                profiler.record(phase, seconds, detail(args) if detail is not None else None)
+        return wrapper
+
+    def __patch(self, owner, name, value):
+        self.__patches.append((owner, name, owner.__dict__.get(name)))
+        setattr(owner, name, value)
+
+    def __wrap_property(self, owner, name, phase, detail=None):
+        prop = owner.__dict__[name]
+        self.__patch(owner, name, property(self.__timed(phase, prop.fget, detail), prop.fset, prop.fdel, prop.__doc__))
+
+    def __wrap_validator(self, validator_class):
+        """ Time validate() of a validator class, the first time a validator of it runs """
+        if validator_class in self.__validator_classes:
+            return
+        self.__validator_classes.add(validator_class)
+        for owner in validator_class.__mro__:
+            if 'validate' in owner.__dict__:
+                if getattr(owner.__dict__['validate'], '__profiled__', False):
+                    return
+                wrapper = self.__timed(VALIDATOR_PHASE, owner.__dict__['validate'],
+                                       lambda args: args[0].name or type(args[0]).__name__)
+                wrapper.__profiled__ = True
+                self.__patch(owner, 'validate', wrapper)
+                return
+
+    def install(self):
+        """ Wrap the phase methods and start cProfile and the stack sampler if asked for """
+        from resttest3.testcase import TestCase, TestSet
+
+        def test_name(args):
+            return args[0].name
+
+        self.__patch(TestSet, 'parse', self.__timed('parse', TestSet.parse))
+        self.__patch(TestSet, 'parse_file', self.__timed('parse', TestSet.parse_file))
+        self.__patch(TestCase, 'render', self.__timed('templating', TestCase.render, test_name))
+        for name in ('url', 'headers', 'body'):
+            self.__wrap_property(TestCase, name, 'templating', test_name)
+
+        # Called after each perform of tests and benchmarks with the handle of the request, read its time from libcurl
+        performed = TestCase.performed
+
+        @functools.wraps(performed)
+        def network(testcase, curl_handler, *args, **kwargs):
+            self.record('network', curl_handler.getinfo(pycurl.TOTAL_TIME), testcase.name)
+            return performed(testcase, curl_handler, *args, **kwargs)
+        self.__patch(TestCase, 'performed', network)
+
+        perform_validation = TestCase.__dict__['_TestCase__perform_validation']
+        timed_validation = self.__timed('validation', perform_validation, test_name)
+
+        @functools.wraps(perform_validation)
+        def validation(testcase, *args, **kwargs):
+            for validator in testcase.validators:
+                self.__wrap_validator(type(validator))
+            return timed_validation(testcase, *args, **kwargs)
+        self.__patch(TestCase, '_TestCase__perform_validation', validation)
+
+        if self.pstats_file:
+            import cProfile
+            self.__cprofile = cProfile.Profile()
+            self.__cprofile.enable()
+        if self.flamegraph_file:
+            self.__sampler = StackSampler(self.sample_interval)
+            self.__sampler.start()
+        self.__started = time.perf_counter()
+        return self
+
+    def uninstall(self):
+        """ Restore the wrapped methods and write the pstats and flamegraph files """
+        if self.__started is not None:
+            self.elapsed += time.perf_counter() - self.__started
+            self.__started = None
+        if self.__cprofile is not None:
+            self.__cprofile.disable()
+            self.__cprofile.dump_stats(self.pstats_file)
+            self.__cprofile = None
+        if self.__sampler is not None:
+            self.__sampler.stop()
+            self.__sampler.write(self.flamegraph_file)
+            self.__sampler = None
+        for owner, name, original in reversed(self.__patches):
+            if original is None:
+                delattr(owner, name)
+            else:
+                setattr(owner, name, original)
+        self.__patches = []
+        self.__validator_classes = set()
+
+    def __enter__(self):
+        return self.install()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.uninstall()
+
+    def as_dict(self):
+        return {'elapsed': self.elapsed,
+                'phases': {phase: stats.as_dict() for phase, stats in self.phases.items()},
+                'validators': {name: stats.as_dict() for name, stats in self.validators.items()}}
+
+    def report(self):
+        """ Text table of the phases then the validator types, in milliseconds """
+        line = '%-36s %8s %12s %10s %10s %10s'
+        rows = [line % ('Phase', 'Calls', 'Total (ms)', 'Mean', 'p95', 'Max')]
+        named_stats = list(self.phases.items())
+        named_stats += [('validator: %s' % name, stats) for name, stats in
+                        sorted(self.validators.items(), key=lambda item: item[1].total, reverse=True)]
+        for name, stats in named_stats:
+            rows.append(line % (name, stats.count, '%.3f' % (stats.total * 1000), '%.3f' % (stats.mean * 1000),
+                                '%.3f' % (stats.histogram.percentile(95) * 1000), '%.3f' % (stats.max * 1000)))
+        rows.append('Profiled run: %.3f ms' % (self.elapsed * 1000))
+        return '\n'.join(rows)
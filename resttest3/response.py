@@ -0,0 +1,142 @@
+""" HTTP response of a test run, shared by every validator and extractor of that test """
+import hashlib
+import json
+import mmap
+import os
+
+_NOT_DECODED = object()
+
+
+class SpooledBody:
+    """ Response body spooled to a temporary file, or held in memory by a SpooledTemporaryFile below its size
+
+    The length, hashes and chunks are read from the spool without loading the body. bytes() and str()
+    load it whole, for validators that need all of it anyway.
+    """
+
+    CHUNK_SIZE = 1 << 16
+
+    def __init__(self, spool):
+        self.spool = spool  # Binary file object the body was written to
+
+    @property
+    def is_on_disk(self):
+        """ The body lives in a file, a SpooledTemporaryFile only gets one past its threshold """
+        return getattr(self.spool, '_rolled', True)
+
+    def __len__(self):
+        self.spool.seek(0, os.SEEK_END)
+        return self.spool.tell()
+
+    def open(self):
+        """ The spool, rewound to the start of the body """
+        self.spool.seek(0)
+        return self.spool
+
+    def chunks(self, chunk_size=CHUNK_SIZE):
+        spool = self.open()
+        chunk = spool.read(chunk_size)
+        while chunk:
+            yield chunk
+            chunk = spool.read(chunk_size)
+
+    def read(self):
+        return self.open().read()
+
+    def digest(self, algorithm='sha256'):
+        """ Hex digest of the body with a hashlib algorithm """
+        digest = hashlib.new(algorithm)
+        for chunk in self.chunks():
+            digest.update(chunk)
+        return digest.hexdigest()
+
+    def mmap(self):
+        """ Read only memory map of a body on disk, a memoryview of one still in memory """
+        if not self.is_on_disk or not len(self):
+            return memoryview(self.read())
+        self.spool.flush()
+        return mmap.mmap(self.spool.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def decode(self, encoding='utf-8', errors='strict'):
+        return self.read().decode(encoding, errors)
+
+    def __bytes__(self):
+        return self.read()
+
+    def __str__(self):
+        return self.decode()
+
+    def __eq__(self, other):
+        if isinstance(other, SpooledBody):
+            other = other.read()
+        if isinstance(other, str):
+            return self.decode() == other
+        if isinstance(other, (bytes, bytearray)):
+            return len(self) == len(other) and self.read() == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def close(self):
+        self.spool.close()
+
+
+class Response:
+    """ Response body, headers and status code
+
+    The decoded text and the parsed JSON tree are computed on first use and cached,
+    so a test with many validators and extract_binds decodes the body only once.
+    A streamed response keeps its body in a SpooledBody, `body_stream`, instead of bytes.
+    """
+
+    def __init__(self, body=None, headers=None, status_code=None, body_stream=None):
+        self.body = body  # Raw bytes as received, None for a streamed response
+        self.body_stream = body_stream
+        self.headers = headers if headers is not None else []  # List of (lowercase name, value)
+        self.status_code = status_code
+        self.__text = None
+        self.__json = _NOT_DECODED
+        self.__json_error = None
+
+    @property
+    def is_streamed(self):
+        return self.body_stream is not None
+
+    @property
+    def content(self):
+        """ Body handed to validators and extractors: the text, or the SpooledBody of a streamed response """
+        return self.body_stream if self.is_streamed else self.text
+
+    @property
+    def text(self):
+        """ Body decoded as UTF-8 """
+        if self.__text is None:
+            if self.is_streamed:
+                self.__text = self.body_stream.decode()
+                return self.__text
+            body = self.body if self.body is not None else b''
+            self.__text = body.decode('utf-8') if isinstance(body, (bytes, bytearray)) else str(body)
+        return self.__text
+
+    @property
+    def json(self):
+        """ Body parsed as JSON, a parse error is cached too and raised again as ValueError """
+        if self.__json is _NOT_DECODED and self.__json_error is None:
+            try:
+                # A streamed body is parsed from its bytes, without keeping a decoded copy
+                self.__json = json.loads(self.body_stream.read() if self.is_streamed else self.text)
+            except ValueError as e:
+                self.__json_error = e
+        if self.__json_error is not None:
+            raise ValueError("Not legal JSON! {0}".format(self.__json_error)) from self.__json_error
+        return self.__json
+
+    def close(self):
+        """ Release the spool of a streamed response """
+        if self.is_streamed:
+            self.body_stream.close()
+
+    def __len__(self):
+        if self.is_streamed:
+            return len(self.body_stream)
+        return len(self.body) if self.body is not None else 0
@@ -0,0 +1,100 @@
+""" Retries of a test whose request failed transiently: a curl error or a retryable status such as 503 """
+import datetime
+import random
+from email.utils import parsedate_to_datetime
+
+import pycurl
+
+DEFAULT_RETRY_STATUSES = (502, 503, 504)
+
+# Curl errors a new attempt may not hit again: no connection, a timeout, or a reset connection
+RETRYABLE_CURL_ERRORS = frozenset([
+    pycurl.E_COULDNT_RESOLVE_HOST,
+    pycurl.E_COULDNT_CONNECT,
+    pycurl.E_OPERATION_TIMEDOUT,
+    pycurl.E_GOT_NOTHING,
+    pycurl.E_SEND_ERROR,
+    pycurl.E_RECV_ERROR,
+    pycurl.E_PARTIAL_FILE,
+])
+
+
+class Attempt:
+    """ One performed request of a test: its latency, and the status code or the curl error it ended with """
+
+    def __init__(self, number, elapsed, status_code=None, error=None, retry_delay=None):
+        self.number = number  # Starts at 1
+        self.elapsed = elapsed  # Seconds, curl TOTAL_TIME
+        self.status_code = status_code
+        self.error = error  # pycurl.error of a failed transfer
+        self.retry_delay = retry_delay  # Seconds waited before the next attempt, None for the last one
+
+    @property
+    def outcome(self):
+        """ The curl error or else the status code the attempt ended with """
+        return self.error if self.error is not None else self.status_code
+
+    def __str__(self):
+        text = '#%s %s in %.3f ms' % (self.number, self.outcome, (self.elapsed or 0.0) * 1000)
+        if self.retry_delay is not None:
+            text += ', retried after %.3f s' % self.retry_delay
+        return text
+
+    def __repr__(self):
+        return 'Attempt(%s, %.3fs, %s)' % (self.number, self.elapsed or 0.0, self.outcome)
+
+
+class RetryPolicy:
+    """ When a test is attempted again and how long to wait before
+
+    The n-th retry waits backoff * 2 ** (n - 1) seconds, capped at max_backoff, minus a random
+    fraction of up to jitter of it so that clients failing together do not retry together.
+    A Retry-After header of the response replaces the backoff, capped at max_backoff too.
+    """
+
+    def __init__(self, retries=0, backoff=0.1, max_backoff=10.0, jitter=0.5, statuses=DEFAULT_RETRY_STATUSES,
+                 rng=None):
+        if int(retries) < 0:
+            raise ValueError("Retries must not be negative, not {0}".format(retries))
+        if not 0 <= float(jitter) <= 1:
+            raise ValueError("Retry jitter is a fraction between 0 and 1, not {0}".format(jitter))
+        self.retries = int(retries)
+        self.backoff = float(backoff)
+        self.max_backoff = float(max_backoff)
+        self.jitter = float(jitter)
+        self.statuses = frozenset(int(status) for status in statuses)
+        self.rng = rng if rng is not None else random.Random()
+
+    def should_retry(self, attempt, status_code=None, error=None):
+        """ The request failed in a way a new attempt may fix, and attempt (counted from 1) was not the last """
+        if attempt > self.retries:
+            return False
+        if error is not None:
+            return bool(error.args) and error.args[0] in RETRYABLE_CURL_ERRORS
+        return status_code in self.statuses
+
+    def delay(self, attempt, retry_after=None):
+        """ Seconds to wait before retrying after attempt, retry_after is the value of a Retry-After header """
+        seconds = self.parse_retry_after(retry_after)
+        if seconds is not None:
+            return min(seconds, self.max_backoff)
+        seconds = min(self.backoff * 2 ** (attempt - 1), self.max_backoff)
+        return seconds * (1 - self.jitter * self.rng.random())
+
+    @staticmethod
+    def parse_retry_after(value):
+        """ Seconds from a Retry-After header: a number of seconds or an HTTP date, None when unusable """
+        if value is None:
+            return None
+        value = str(value).strip()
+        if value.isdigit():
+            return float(value)
+        try:
+            date = parsedate_to_datetime(value)
+        except (TypeError, ValueError, IndexError):
+            return None
+        if date is None:
+            return None
+        if date.tzinfo is None:
+            date = date.replace(tzinfo=datetime.timezone.utc)
+        return max(0.0, (date - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
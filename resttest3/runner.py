@@ -3,15 +3,14 @@ import logging
 import os
 import sys
 from argparse import ArgumentParser
+from contextlib import contextmanager
 from inspect import getframeinfo, currentframe
 from pathlib import Path
 from typing import Dict, List
 
-import yaml
-from alive_progress import alive_bar
-
+from resttest3.pool import CurlPool
 from resttest3.testcase import TestSet
-from resttest3.utils import register_extensions
+from resttest3.utils import read_testcase_file, register_extensions
 
 logger = logging.getLogger('resttest3')
 logging.basicConfig(format='%(levelname)s:%(message)s')
@@ -20,6 +19,20 @@ filename = getframeinfo(currentframe()).filename
 current_module_path = Path(filename)
 
 
+@contextmanager
+def no_progress_bar(total=None):
+    """ Stands in for alive_bar when the output is not a terminal """
+    yield lambda *args, **kwargs: None
+
+
+def progress_bar(total):
+    """ alive_progress bar on a terminal, alive_progress is only imported then """
+    if not sys.stdout.isatty():
+        return no_progress_bar(total)
+    from alive_progress import alive_bar
+    return alive_bar(total)
+
+
 class ArgsRunner:
 
     def __init__(self):
@@ -34,6 +47,14 @@ class ArgsRunner:
         self.absolute_urls = None
         self.skip_term_colors = None
         self.html = 'html'
+        self.parallel = 1
+        self.workers = 1
+        self.users = None
+        self.plan_cache = False
+        self.curl_share = False
+        self.profile = False
+        self.profile_pstats = None
+        self.profile_flamegraph = None
 
     def args(self):
         parser = ArgumentParser(description='usage: %prog base_url test_filename.yaml [options]')
@@ -44,6 +65,22 @@ class ArgsRunner:
         parser.add_argument("--test", help="Test file to use", action="store", type=str, required=True)
         # parser.add_argument('--vars', help='Variables to set, as a YAML dictionary', action="store", type=str)
         parser.add_argument('--html', help='Generate HTML Report', action="store")
+        parser.add_argument('--parallel', help='Number of test groups to run concurrently', action="store", type=int,
+                            default=1)
+        parser.add_argument('--workers', help='Number of processes to shard test groups across', action="store",
+                            type=int, default=1)
+        parser.add_argument('--users', help='Run every test group as a scenario for N concurrent virtual users, '
+                                            'each with its own context', action="store", type=int)
+        parser.add_argument('--plan-cache', help='Keep the parsed test plan next to the test file and reuse it until '
+                            'a test file changes', action='store_true', default=False)
+        parser.add_argument('--curl-share', help='Share DNS cache, TLS sessions and connections between curl handles',
+                            action='store_true', default=False)
+        parser.add_argument('--profile', help='Print where resttest3 spent its time: parse, templating, network and '
+                            'validation phases and validator types', action='store_true', default=False)
+        parser.add_argument('--profile-pstats', help='Profile the run with cProfile and dump its stats to this file, '
+                            'implies --profile', action='store', type=str)
+        parser.add_argument('--profile-flamegraph', help='Sample the stack of the run and write collapsed stacks for '
+                            'flamegraph.pl to this file, implies --profile', action='store', type=str)
         # parser.add_argument(u'--insecure', help='Disable cURL host and peer cert verification', action='store_true',
         #                     default=False)
         # parser.add_argument(u'--absolute_urls', help='Enable absolute URLs in tests instead of relative paths',
@@ -65,9 +102,7 @@ class Runner:
 
     @staticmethod
     def read_test_file(file_location: str) -> List[Dict]:
-        with open(file_location, 'r') as f:
-            test_dict = yaml.safe_load(f.read())
-        return test_dict
+        return read_testcase_file(file_location)
 
     def main(self) -> int:
         self.__args.args()  # Set the arguments
@@ -82,36 +117,89 @@ class Runner:
             register_extensions(self.__args.extensions)
         p = Path(self.__args.test)
 
-        test_case_dict = self.read_test_file(str(p.absolute()))
+        profiler = None
+        if self.__args.profile or self.__args.profile_pstats or self.__args.profile_flamegraph:
+            from resttest3.profiling import Profiler
+            profiler = Profiler(pstats_file=self.__args.profile_pstats,
+                                flamegraph_file=self.__args.profile_flamegraph).install()
+        try:
+            return self.__run(p, profiler)
+        finally:
+            if profiler is not None:
+                profiler.uninstall()  # Restores the wrapped methods and writes the profile files after an error too
+
+    def __run(self, p, profiler=None) -> int:
+        """ Parse the test file, run its tests and benchmarks and report the results """
         testcase_set = TestSet()
-        testcase_set.parse(self.__args.url, testcase_list=test_case_dict, working_directory=p.parent.absolute())
+        if self.__args.plan_cache:
+            from resttest3.plan import PlanCache
+            testcase_set.parse_file(self.__args.url, p.absolute(), plan_cache=PlanCache())
+        else:
+            test_case_dict = self.read_test_file(str(p.absolute()))
+            testcase_set.parse(self.__args.url, testcase_list=test_case_dict, working_directory=p.parent.absolute())
 
         success_dict = {}
         failure_dict = {}
         context_list = []
         total_testcase_count = len([y for x, y in testcase_set.test_group_list_dict.items() for c in y.testcase_list])
         stat_time = datetime.datetime.now()
-        with alive_bar(total_testcase_count) as bar:
-            for test_group, test_group_object in testcase_set.test_group_list_dict.items():
-                for testcase_object in test_group_object.testcase_list:
-                    bar()
-                    testcase_object.run()
-                    if testcase_object.is_passed:
-                        try:
-                            (count, case_list) = success_dict[test_group]
-                            case_list.append(testcase_object)
-                            success_dict[test_group] = (count + 1, case_list)
-                        except KeyError:
-                            success_dict[test_group] = (1, [testcase_object])
-                    else:
-                        try:
-                            count, case_list = failure_dict[test_group]
-                            case_list.append(testcase_object)
-                            failure_dict[test_group] = (count + 1, case_list)
-                        except KeyError:
-                            failure_dict[test_group] = (1, [testcase_object])
-                    context_list.append(testcase_object)
+        pool = CurlPool(share=self.__args.curl_share)
+
+        def record(test_group, testcase_object):
+            if testcase_object.is_passed:
+                try:
+                    (count, case_list) = success_dict[test_group]
+                    case_list.append(testcase_object)
+                    success_dict[test_group] = (count + 1, case_list)
+                except KeyError:
+                    success_dict[test_group] = (1, [testcase_object])
+            else:
+                try:
+                    count, case_list = failure_dict[test_group]
+                    case_list.append(testcase_object)
+                    failure_dict[test_group] = (count + 1, case_list)
+                except KeyError:
+                    failure_dict[test_group] = (1, [testcase_object])
+            context_list.append(testcase_object)
+
+        scenario_result_list = []
+        progress_count = total_testcase_count * (self.__args.users or 1)
+        with progress_bar(progress_count) as bar:
+            def parallel_record(test_group, testcase_object):
+                bar()
+                record(test_group, testcase_object)
+
+            if self.__args.users:
+                from resttest3.scenario import ScenarioRunner
+                scenario_runner = ScenarioRunner(self.__args.users, pool=pool)
+                scenario_result_list = list(scenario_runner.run(
+                    testcase_set.test_group_list_dict, lambda test_group, user, testcase_object: bar()).values())
+            elif self.__args.workers > 1:
+                from resttest3.workers import WorkerRunner
+                worker_runner = WorkerRunner(self.__args.workers, parallel=self.__args.parallel,
+                                             curl_share=self.__args.curl_share, extensions=self.__args.extensions,
+                                             plan_cache=self.__args.plan_cache)
+                worker_runner.run(p.absolute(), self.__args.url, testcase_set.test_group_list_dict, parallel_record,
+                                  pool=pool)
+            elif self.__args.parallel > 1:
+                from resttest3.parallel import ParallelRunner
+                parallel_runner = ParallelRunner(self.__args.parallel, pool=pool)
+                parallel_runner.run(testcase_set.test_group_list_dict, parallel_record)
+            else:
+                for test_group, test_group_object in testcase_set.test_group_list_dict.items():
+                    for testcase_object in test_group_object.testcase_list:
+                        bar()
+                        testcase_object.run(pool=pool)
+                        record(test_group, testcase_object)
+
+        benchmark_result_list = []
+        for test_group, test_group_object in testcase_set.test_group_list_dict.items():
+            for benchmark_object in test_group_object.benchmark_list:
+                benchmark_result_list.append(benchmark_object.run(pool=pool))  # Streams to its output_file
         end_time = datetime.datetime.now()
+        pool.close()
+        if profiler is not None:
+            profiler.uninstall()
         if self.__args.html:
             with open(current_module_path.parent.joinpath('reports/template/report_template.html').absolute()) as f:
                 html = f.read()
@@ -122,6 +210,8 @@ class Runner:
                     'stat_time': stat_time,
                     'elapsed': divmod((end_time - stat_time).total_seconds(), 60),
                     'context_list': context_list,
+                    'benchmark_result_list': benchmark_result_list,
+                    'scenario_result_list': scenario_result_list,
                 }
                 html = _engine.render(_context)
             path = Path(os.getcwd()).joinpath(self.__args.html)
@@ -132,6 +222,7 @@ class Runner:
 
         print("========== TEST RESULT ===========")
         print("Total Test to run: %s" % total_testcase_count)
+        logger.info("%s", pool)
         for group_name, case_list_tuple in failure_dict.items():
             print("%sGroup Name: %s %s" % (self.FAIL, group_name, self.NOCOL))
             count, courtcase_list = case_list_tuple
@@ -147,6 +238,48 @@ class Runner:
             print('%sTotal testcase success: %s %s' % (self.SUCCESS, count, self.NOCOL))
             for index, testcase in enumerate(courtcase_list):
                 print('\t%s %s. Case Name: %s %s' % (self.SUCCESS, index+1, testcase.name, self.NOCOL))
+
+        if scenario_result_list:
+            print("========== SCENARIO RESULT ===========")
+        for scenario_result in scenario_result_list:
+            color = self.SUCCESS if scenario_result.is_passed else self.FAIL
+            print("%sScenario: %s, users passed: %s of %s in %.3f s %s" % (
+                color, scenario_result.name, scenario_result.passed_users, scenario_result.users,
+                scenario_result.elapsed, self.NOCOL))
+            for test_stats in scenario_result.tests.values():
+                print('\t%s: passed %s, failed %s, mean %.6f s, %s' % (
+                    test_stats.name, test_stats.passed, test_stats.failed, test_stats.mean, ', '.join(
+                        'p%s=%s' % (percent, value) for percent, value in test_stats.percentiles())))
+            for user, testcase_name, failure in scenario_result.failures:
+                print('\t%s User %s, Case Name: %s: %s %s' % (self.FAIL, user, testcase_name, failure, self.NOCOL))
+
+        if benchmark_result_list:
+            print("========== BENCHMARK RESULT ===========")
+        for benchmark_result in benchmark_result_list:
+            print("Benchmark Name: %s, Group: %s" % (benchmark_result.name, benchmark_result.group))
+            print('\tFailures: %s' % benchmark_result.failures)
+            print('\tRequests: %s in %.3f s, achieved rate: %.2f/s' % (
+                benchmark_result.requests, benchmark_result.elapsed, benchmark_result.achieved_rate))
+            if benchmark_result.target_rate is not None:
+                print('\tTarget rate: %.2f/s' % benchmark_result.target_rate)
+            for metric_name, aggregate_name, value in benchmark_result.aggregates:
+                print('\t%s %s: %s' % (metric_name, aggregate_name, value))
+            for metric_name, histogram in sorted(benchmark_result.histograms.items()):
+                print('\t%s percentiles: %s' % (metric_name, ', '.join(
+                    'p%s=%s' % (percent, value) for percent, value in histogram.percentiles())))
+            for stage in benchmark_result.stages:
+                print('\tStage: %s, requests: %s, failures: %s, achieved rate: %.2f/s' % (
+                    stage.name, stage.requests, stage.failures, stage.achieved_rate))
+                for metric_name, aggregate_name, value in stage.aggregates:
+                    print('\t\t%s %s: %s' % (metric_name, aggregate_name, value))
+
+        if profiler is not None:
+            print("========== PROFILE ===========")
+            print(profiler.report())
+            if self.__args.profile_pstats:
+                print("cProfile stats written to %s" % self.__args.profile_pstats)
+            if self.__args.profile_flamegraph:
+                print("Collapsed stacks written to %s" % self.__args.profile_flamegraph)
         return 0
 
 
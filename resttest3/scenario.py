@@ -0,0 +1,144 @@
+""" Virtual user scenarios: a test group cloned for a number of users, each with its own Context """
+import logging
+import time
+
+from resttest3.aggregates import LogLinearHistogram, RunningStats, REPORT_PERCENTILES
+from resttest3.parallel import ParallelRunner
+
+logger = logging.getLogger('resttest3.scenario')
+
+LATENCY_UNIT = 1e-6  # Latency histograms record seconds with microsecond resolution
+
+
+class LatencyStats:
+    """ Count, mean and histogram of the latency of finished tests """
+
+    def __init__(self):
+        self.stats = RunningStats()
+        self.histogram = LogLinearHistogram(unit=LATENCY_UNIT)
+
+    def add(self, elapsed):
+        self.stats.add(elapsed)
+        self.histogram.record(elapsed)
+
+    @property
+    def count(self):
+        return self.stats.count
+
+    @property
+    def mean(self):
+        return self.stats.mean
+
+    def percentiles(self, percent_list=REPORT_PERCENTILES):
+        return self.histogram.percentiles(percent_list)
+
+
+class ScenarioTestStats(LatencyStats):
+    """ Outcome of one test of the scenario over every virtual user """
+
+    def __init__(self, name):
+        super(ScenarioTestStats, self).__init__()
+        self.name = name
+        self.passed = 0
+        self.failed = 0
+
+
+class ScenarioResult:
+    """ Aggregated pass/fail and latency of a group run by `users` virtual users """
+
+    def __init__(self, name, users):
+        self.name = name
+        self.users = users
+        self.elapsed = 0.0
+        self.latency = LatencyStats()  # Every test of every user
+        self.tests = {}  # Test name to ScenarioTestStats, in the order of the group
+        self.failures = []  # (user number, test name, Failure) of every failed test
+        self.__failed_users = set()
+
+    def add(self, user, testcase):
+        test_stats = self.tests.get(testcase.name)
+        if test_stats is None:
+            test_stats = self.tests[testcase.name] = ScenarioTestStats(testcase.name)
+        if testcase.is_passed:
+            test_stats.passed += 1
+        else:
+            test_stats.failed += 1
+            self.__failed_users.add(user)
+            self.failures.extend((user, testcase.name, failure) for failure in testcase.failures)
+        if testcase.elapsed is not None:
+            test_stats.add(testcase.elapsed)
+            self.latency.add(testcase.elapsed)
+
+    @property
+    def failed_users(self):
+        return sorted(self.__failed_users)
+
+    @property
+    def passed_users(self):
+        return self.users - len(self.__failed_users)
+
+    @property
+    def is_passed(self):
+        return not self.__failed_users
+
+    @property
+    def test_table(self):
+        """ Rows of test name, passed and failed counts, mean and percentile latencies, for the HTML report """
+        return [
+            {'name': stats.name, 'passed': stats.passed, 'failed': stats.failed, 'mean': stats.mean,
+             'percentiles': [{'percent': percent, 'value': value} for percent, value in stats.percentiles()]}
+            for stats in self.tests.values()
+        ]
+
+
+class ScenarioRunner:
+    """ Runs every test group as a scenario for `users` virtual users at once
+
+    Each user gets a clone of the group with a private Context and fresh generators, so values
+    extracted by one user (an auth token, a created id) are never seen by another. The clones of
+    a group run concurrently on one CurlMulti, each of them in order like any group, and the
+    groups run one after the other.
+    """
+
+    def __init__(self, users, timeout=None, pool=None):
+        if int(users) < 1:
+            raise ValueError("Number of virtual users must be at least 1, not {0}".format(users))
+        self.users = int(users)
+        self.timeout = timeout
+        self.pool = pool
+
+    @staticmethod
+    def user_group_name(group_name, user):
+        return "%s#%s" % (group_name, user)
+
+    def run(self, test_group_dict, callback=None):
+        """ Run the scenarios, callback(group_name, user, testcase) is invoked as each test of a user finishes
+        Returns a dictionary of group name to ScenarioResult
+        """
+        result_dict = {}
+        for group_name, group in test_group_dict.items():
+            if not group.testcase_list:
+                continue
+            result_dict[group_name] = self.run_group(group_name, group, callback)
+        return result_dict
+
+    def run_group(self, group_name, group, callback=None):
+        result = ScenarioResult(group_name, self.users)
+        user_groups = {}
+        user_numbers = {}
+        for user in range(1, self.users + 1):
+            user_group_name = self.user_group_name(group_name, user)
+            user_groups[user_group_name] = group.clone(name=user_group_name)
+            user_numbers[user_group_name] = user
+
+        def record(user_group_name, testcase):
+            user = user_numbers[user_group_name]
+            result.add(user, testcase)
+            if callback:
+                callback(group_name, user, testcase)
+
+        logger.info("Scenario %s: running %s virtual users" % (group_name, self.users))
+        started = time.monotonic()
+        ParallelRunner(self.users, timeout=self.timeout, pool=self.pool).run(user_groups, record)
+        result.elapsed = time.monotonic() - started
+        return result
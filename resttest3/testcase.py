@@ -1,7 +1,8 @@
+import copy
 import json
 import logging
 import os
-import string
+import tempfile
 import time
 import traceback
 from io import BytesIO
@@ -9,17 +10,20 @@ from pathlib import Path
 from typing import List, Dict, Optional
 from urllib.parse import urljoin, quote_plus
 
-import certifi
 import pycurl
 
-from resttest3.binding import Context
+from resttest3.binding import Context, ContextTemplate
 from resttest3.constants import (
     AuthType, YamlKeyWords, TestCaseKeywords, DEFAULT_TIMEOUT, EnumHttpMethod, FAILURE_CURL_EXCEPTION,
     FAILURE_TEST_EXCEPTION, FAILURE_INVALID_RESPONSE
 )
-from resttest3.contenthandling import ContentHandler
+from resttest3.contenthandling import ContentHandler, MappedFileReader
 from resttest3.exception import HttpMethodError, BindError, ValidatorError
 from resttest3.generators import parse_generator
+from resttest3.pool import ca_bundle
+from resttest3.response import Response, SpooledBody
+from resttest3.retry import Attempt, RetryPolicy, DEFAULT_RETRY_STATUSES
+from resttest3.timing import Timings
 from resttest3.utils import read_testcase_file, ChangeDir, Parser
 from resttest3.validators import parse_extractor, parse_validator, Failure
 
@@ -36,7 +40,13 @@ class TestCaseConfig:
         self.timeout = 60
         self.print_bodies = False
         self.retries = 0
+        self.retry_backoff = 0.1  # Seconds before the first retry, doubled on each following one
+        self.retry_max_backoff = 10.0
+        self.retry_jitter = 0.5  # Fraction of the backoff randomly taken off it
+        self.retry_statuses = DEFAULT_RETRY_STATUSES
+        self.stream_threshold = None  # Bytes above which response bodies are spooled to a temporary file
         self.generators = {}
+        self.generator_configs = {}  # Generator name to its parsed configuration, to create it again
 
     @property
     def variable_binds(self):
@@ -58,6 +68,18 @@ class TestCaseConfig:
                 self.print_bodies = Parser.safe_to_bool(value)
             elif key == 'retries':
                 self.retries = int(value)
+            elif key == 'retry_backoff':
+                self.retry_backoff = float(value)
+            elif key == 'retry_max_backoff':
+                self.retry_max_backoff = float(value)
+            elif key == 'retry_jitter':
+                self.retry_jitter = float(value)
+            elif key == 'retry_statuses':
+                if not isinstance(value, list):
+                    raise TypeError("retry_statuses in config should defined as list(array).")
+                self.retry_statuses = tuple(int(status) for status in value)
+            elif key == 'stream_threshold':
+                self.stream_threshold = int(value)
             elif key == 'variable_binds':
                 self.variable_binds = value
             elif key == u'generators':
@@ -68,8 +90,32 @@ class TestCaseConfig:
                 for generator_name, generator_config in flat.items():
                     gen = parse_generator(generator_config)
                     gen_dict[str(generator_name)] = gen
+                    self.generator_configs[str(generator_name)] = generator_config
                 self.generators = gen_dict
 
+    def retry_policy(self):
+        """ RetryPolicy of the retry settings """
+        return RetryPolicy(self.retries, backoff=self.retry_backoff, max_backoff=self.retry_max_backoff,
+                           jitter=self.retry_jitter, statuses=self.retry_statuses)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['generators'] = {}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.generators = self.create_generators()
+
+    def create_generators(self):
+        """ New generators starting from their first value, for every generator parsed from the configuration
+        Generators added by other means than parse are shared as they are
+        """
+        gen_dict = dict(self.generators)
+        for generator_name, generator_config in self.generator_configs.items():
+            gen_dict[generator_name] = parse_generator(generator_config)
+        return gen_dict
+
     def __str__(self):
         return json.dumps(self, default=Parser.safe_to_json)
 
@@ -83,6 +129,13 @@ class TestSet:
         self.__extract_binds = {}
         self.__variable_binds = {}
         self.config = TestCaseConfig()
+        self.parsed_files = []  # Files included or imported by parse, for the plan cache
+
+    @classmethod
+    def reset(cls):
+        """ Forget the parsed groups and test files, which are shared by every TestSet """
+        cls.__testcase_file.clear()
+        cls.test_group_list_dict.clear()
 
     def parse(self, base_url: str, testcase_list: List, test_file=None, working_directory=None, variable_dict=None):
 
@@ -112,6 +165,7 @@ class TestSet:
                         testcase_file = str(working_directory.joinpath("%s.yaml" % testcase_file_path).resolve())
                         if testcase_file not in self.__testcase_file:
                             self.__testcase_file.add(testcase_file)
+                            self.parsed_files.append(testcase_file)
                             import_testcase_list = read_testcase_file(testcase_file)
                             with ChangeDir(working_directory):
                                 self.parse(base_url, import_testcase_list, variable_dict=variable_dict)
@@ -121,6 +175,7 @@ class TestSet:
                         logger.debug("Importing testcase from %s", testcase_file_path)
                         testcase_file_path = str(working_directory.joinpath("%s" % testcase_file_path).resolve())
                         self.__testcase_file.add(sub_testcase_node)
+                        self.parsed_files.append(testcase_file_path)
                         import_testcase_list = read_testcase_file(testcase_file_path)
                         with ChangeDir(working_directory):
                             self.parse(base_url, import_testcase_list, variable_dict=variable_dict)
@@ -139,18 +194,62 @@ class TestSet:
                     with ChangeDir(working_directory):
                         self.parse_test(base_url, sub_testcase_node, testcase_config_object)
 
+                elif key == YamlKeyWords.BENCHMARK:
+                    with ChangeDir(working_directory):
+                        self.parse_benchmark(base_url, sub_testcase_node, testcase_config_object)
+
                 elif key == YamlKeyWords.CONFIG:
                     testcase_config_object.parse(sub_testcase_node)
 
         self.config = testcase_config_object
 
+    def parse_file(self, base_url, test_file, plan_cache=None):
+        """ Parse a test file and everything it includes, through the PlanCache when one is given
+
+        The parsed groups are shared by every TestSet, so a plan is only used or stored for the
+        first file parsed into empty groups.
+        """
+        test_file = Path(test_file).resolve()
+        use_plan = plan_cache is not None and not self.test_group_list_dict
+        if use_plan:
+            plan = plan_cache.load(test_file, base_url)
+            if plan is not None:
+                self.__load_plan(plan)
+                return self
+
+        self.parse(base_url, testcase_list=read_testcase_file(str(test_file)), test_file=str(test_file),
+                   working_directory=test_file.parent)
+        if use_plan:
+            plan_cache.store(test_file, base_url, [test_file] + self.parsed_files, self.test_group_list_dict,
+                             self.config)
+        return self
+
+    def __load_plan(self, plan):
+        self.config = plan['config']
+        self.parsed_files = [dependency.path for dependency in plan['dependencies'][1:]]
+        self.__testcase_file.add(plan['dependencies'][0].path)
+        self.__testcase_file.update(self.parsed_files)
+        for group_name, group in plan['groups'].items():
+            for testcase in group.testcase_list + group.benchmark_list:
+                testcase.config = testcase.config  # Add the config generators to the context again
+            self.test_group_list_dict[group_name] = group
+
+    async def run_async(self, callback=None, concurrency=None, timeout=None, pool=None):
+        """ Run the parsed test groups on the running event loop, see AsyncRunner """
+        from resttest3.aio import AsyncRunner
+        await AsyncRunner(concurrency, timeout=timeout, pool=pool).run(self.test_group_list_dict, callback)
+
     @staticmethod
-    def parse_test(base_url, sub_testcase_node, testcase_config_object):
+    def __find_group_name(sub_testcase_node):
         __group_name = None
         for node_dict in sub_testcase_node:
             if __group_name is None:
                 __group_name = node_dict.get(TestCaseKeywords.group)
-        __group_name = __group_name if __group_name else TestCaseGroup.DEFAULT_GROUP
+        return __group_name if __group_name else TestCaseGroup.DEFAULT_GROUP
+
+    @staticmethod
+    def parse_test(base_url, sub_testcase_node, testcase_config_object):
+        __group_name = TestSet.__find_group_name(sub_testcase_node)
         group_object = TestSet.__create_test(__group_name, testcase_config_object)
         testcase_object = TestCase(
             base_url=base_url, extract_binds=group_object.extract_binds,
@@ -160,6 +259,19 @@ class TestSet:
         testcase_object.parse(sub_testcase_node)
         group_object.testcase_list = testcase_object
 
+    @staticmethod
+    def parse_benchmark(base_url, sub_testcase_node, testcase_config_object):
+        from resttest3.benchmarks import Benchmark
+        __group_name = TestSet.__find_group_name(sub_testcase_node)
+        group_object = TestSet.__create_test(__group_name, testcase_config_object)
+        benchmark_object = Benchmark(
+            base_url=base_url, extract_binds=group_object.extract_binds,
+            variable_binds=group_object.variable_binds, context=group_object.context,
+            config=group_object.config
+        )
+        benchmark_object.parse(sub_testcase_node)
+        group_object.benchmark_list = benchmark_object
+
     @staticmethod
     def __create_test(__group_name, testcase_config_object):
         try:
@@ -242,17 +354,62 @@ class TestCaseGroup:
     def context(self):
         return self.__context
 
+    @property
+    def name(self):
+        return self.__name
+
+    def clone(self, name=None, context=None):
+        """ Copy of the group and its tests running on their own Context, with fresh generators
+        The parsed validators, extractors and templates are shared with the original tests
+        """
+        if context is None:
+            context = Context()
+            for generator_name, generator in self.config.create_generators().items():
+                context.add_generator(generator_name, generator)
+        group = TestCaseGroup(name if name is not None else self.__name, context=context,
+                              extract_binds=self.__extract_binds, variable_binds=self.__variable_binds,
+                              config=self.config)
+        for testcase in self.__testcase_list:
+            group.testcase_list = testcase.clone(context)
+        return group
+
 
 class TestResult:
+    """ Outcome of the last run of a test: response, failures and where its time went """
 
-    def __init__(self, body, status_code):
+    def __init__(self, body, status_code, elapsed=0.000, timings=None, attempts=None):
         self.__headers = None
         self.__body = body
         self.__status_code = status_code
         self.__status = False
-        self.__elapsed = 0.000
+        self.__elapsed = elapsed
+        self.__timings = timings
+        self.__attempts = attempts if attempts is not None else []
         self.__failure_list = []
 
+    @property
+    def body(self):
+        return self.__body
+
+    @property
+    def status_code(self):
+        return self.__status_code
+
+    @property
+    def elapsed(self):
+        """ Seconds the request took (curl TOTAL_TIME), 0 when it failed before a response """
+        return self.__elapsed
+
+    @property
+    def timings(self):
+        """ Timings of the libcurl phases of the request and of the tool phases of the run """
+        return self.__timings
+
+    @property
+    def attempts(self):
+        """ Attempt of each request performed, with its latency, status or curl error and the delay before the next """
+        return self.__attempts
+
     @property
     def failures(self):
         return self.__failure_list
@@ -270,6 +427,40 @@ class TestResult:
         self.__headers = value
 
 
+class PreparedRequest:
+    """ What a test sets on a curl handle to send its request: options, header list and body
+    A test without templates builds it once and applies it again on every run, see TestCase.prepared_request
+    """
+
+    def __init__(self, options, headers, keep_alive_headers, body=None, body_file=None, size_option=None):
+        self.options = options  # (curl option, value) pairs: URL, method, auth...
+        self.headers = headers  # HTTPHEADER closing the connection after the request
+        self.keep_alive_headers = keep_alive_headers  # HTTPHEADER for a reused handle
+        self.body = body  # Encoded request body
+        self.body_file = body_file  # ContentHandler of a static file body, read from a memory map of the file
+        self.size_option = size_option  # INFILESIZE or POSTFIELDSIZE, set to the body length
+
+    def body_reader(self):
+        """ A reader with its own offset over the body, None without a body """
+        if self.body_file is not None:
+            return self.body_file.open_reader()
+        if self.body:
+            return MappedFileReader(memoryview(self.body))
+        return None
+
+    def apply(self, curl_handler, keep_alive=False):
+        setopt = curl_handler.setopt
+        for option, value in self.options:
+            setopt(option, value)
+        setopt(pycurl.HTTPHEADER, self.keep_alive_headers if keep_alive else self.headers)
+        reader = self.body_reader()
+        if reader is not None:
+            setopt(pycurl.READFUNCTION, reader.read)
+            setopt(pycurl.SEEKFUNCTION, reader.seek)  # Rewinds the upload when curl resends it on a new connection
+        if self.size_option is not None:
+            setopt(self.size_option, len(reader) if reader is not None else 0)
+
+
 class TestCase:
     DEFAULT_NAME = "NO NAME"
 
@@ -287,11 +478,19 @@ class TestCase:
         self.__ssl_insecure = False
         self.__response_headers = None
         self.__response_code = None
+        self.__response = None
         self.__passed = False
         self.__failure_list = []
         self.__abs_url = False
+        self.__elapsed = None
+        self.__stream = False
+        self.__prepared = None  # PreparedRequest kept while the test has no templates
+        self.__attempts = []  # Attempt of each request performed by the last run
+        self.__timings = None  # Timings of the last run
+        self.__retry_policy = None
 
         self.__header_dict = {}
+        self.__header_templates = {}  # Header template string to its ContextTemplate
         self.__http_method = EnumHttpMethod.GET.name
         self.__group = TestCaseGroup.DEFAULT_GROUP
         self.__name = TestCase.DEFAULT_NAME
@@ -314,15 +513,42 @@ class TestCase:
     def __str__(self):
         return json.dumps(self, default=Parser.safe_to_json)
 
+    def clone(self, context):
+        """ Copy of the test bound to another Context, which has not run yet
+        Validators, extractors and binds are shared, templates are copied to keep their own render cache
+        """
+        testcase = copy.copy(self)
+        testcase.__context = context
+        testcase.__passed = False
+        testcase.__failure_list = []
+        testcase.__response = None
+        testcase.__response_code = None
+        testcase.__response_headers = None
+        testcase.__elapsed = None
+        testcase.__header_templates = {}
+        testcase.templates = {
+            name: ContextTemplate(template.template_string) for name, template in self.templates.items()}
+        testcase.result = None
+        testcase.__attempts = []
+        testcase.__timings = None
+        return testcase
+
     @property
     def config(self) -> Optional[TestCaseConfig]:
         return self.__config
 
     @config.setter
     def config(self, config_object: TestCaseConfig):
+        self.__prepared = None
         if config_object:
             self.variable_binds.update(config_object.variable_binds)
-            self.generator_binds.update(config_object.generators)
+            for generator_name, generator in config_object.generators.items():
+                if self.__context.get_generator(generator_name) is None:
+                    self.__context.add_generator(generator_name, generator)
+
+    @property
+    def context(self) -> Context:
+        return self.__context
 
     @property
     def auth_username(self):
@@ -330,6 +556,7 @@ class TestCase:
 
     @auth_username.setter
     def auth_username(self, username):
+        self.__prepared = None
         self.__auth_username = Parser.coerce_string_to_ascii(username)
 
     @property
@@ -338,6 +565,7 @@ class TestCase:
 
     @ssl_insecure.setter
     def ssl_insecure(self, val):
+        self.__prepared = None
         self.__ssl_insecure = bool(val)
 
     @property
@@ -346,6 +574,7 @@ class TestCase:
 
     @auth_password.setter
     def auth_password(self, password):
+        self.__prepared = None
         self.__auth_password = Parser.coerce_string_to_ascii(password)
 
     @property
@@ -354,6 +583,7 @@ class TestCase:
 
     @http_method.setter
     def http_method(self, method: str):
+        self.__prepared = None
         __method = ["GET", "PUT", "POST", "DELETE", "PATCH"]
         if method.upper() not in __method:
             raise HttpMethodError("Method %s is not supported." % method)
@@ -371,21 +601,47 @@ class TestCase:
     def is_passed(self):
         return bool(self.__passed)
 
+    @property
+    def stream(self):
+        """ Spool the response body to a temporary file instead of memory """
+        return self.__stream
+
+    @stream.setter
+    def stream(self, value):
+        self.__stream = bool(value)
+
+    @property
+    def elapsed(self):
+        """ Seconds the last request took (curl TOTAL_TIME), None before it was performed """
+        return self.__elapsed
+
+    @property
+    def timings(self) -> Optional[Timings]:
+        """ Timings of the last run: libcurl phases of its final request and time spent in resttest3 """
+        return self.__timings
+
+    @property
+    def attempts(self):
+        """ Attempt of each request the last run performed, more than one when it was retried """
+        return self.__attempts
+
     @property
     def url(self):
         val = self.realize_template("url", self.__context)
         if val is None:
             val = self.__url
-        if not self.__abs_url:
-            val = urljoin(self.__base_url, val)
         if isinstance(val, dict):
             logger.warning("URL is not applied template values.")
+            return val
+        if not self.__abs_url:
+            val = urljoin(self.__base_url, val)
         if isinstance(val, (str, bytes)):
             return quote_plus(bytes(val, encoding='utf-8'), safe='//:.?=&')  # Fix #36
         return val
 
     @url.setter
     def url(self, value):
+        self.__prepared = None
 
         if isinstance(value, dict):
             # this is the templated url , we need to convert it into actual URL
@@ -458,19 +714,16 @@ class TestCase:
     def headers(self) -> Dict:
         # if not self.templates.get('headers'):
         #     return self.__header_dict
-        context_values = self.__context.get_values()
         header_dict = {}
         for key, header in self.__header_dict.items():
             if isinstance(header, dict):
                 if key == 'template':
                     for k, v in header.items():
-                        templated_string = string.Template(v).safe_substitute(context_values)
-                        header_dict[k] = templated_string
+                        header_dict[k] = self.__header_template(v).render(self.__context)
                     continue
                 templated_value = header.get('template')
                 if templated_value:
-                    templated_string = string.Template(templated_value).safe_substitute(context_values)
-                    header_dict[key] = templated_string
+                    header_dict[key] = self.__header_template(templated_value).render(self.__context)
                 else:
                     logger.warning("Skipping the header: %s. We don't support mapping as header" % header)
             else:
@@ -480,18 +733,30 @@ class TestCase:
 
     @headers.setter
     def headers(self, headers):
+        self.__prepared = None
         config_value = Parser.flatten_dictionaries(headers)
         if isinstance(config_value, dict):
             for key, value in config_value.items():
                 if isinstance(value, dict):
-                    if value.get('template'):
+                    if key == 'template':
+                        for template_value in value.values():
+                            self.set_template("headers", template_value)  # Marks the test dynamic
+                            self.__header_template(template_value)
+                    elif value.get('template'):
                         self.set_template("headers", value.get('template'))
+                        self.__header_template(value.get('template'))
             self.__header_dict.update(config_value)
         else:
             raise ValidatorError("Illegal header type: headers must be a dictionary or list of dictionary keys")
 
+    def __header_template(self, template_string):
+        template = self.__header_templates.get(template_string)
+        if template is None:
+            template = self.__header_templates[template_string] = ContextTemplate(str(template_string))
+        return template
+
     def set_template(self, variable_name, template_string):
-        self.templates[variable_name] = string.Template(str(template_string))
+        self.templates[variable_name] = ContextTemplate(str(template_string))
 
     @property
     def body(self):
@@ -501,10 +766,11 @@ class TestCase:
 
     @body.setter
     def body(self, value):
+        self.__prepared = None
         if value:
             if isinstance(value, bytes):
                 self.__body = ContentHandler.parse_content(value.decode())
-            elif isinstance(value, str):
+            elif isinstance(value, (str, dict, list)):
                 self.__body = ContentHandler.parse_content(value)
             else:
                 self.__body = value
@@ -515,12 +781,17 @@ class TestCase:
     def failures(self):
         return self.__failure_list
 
+    @property
+    def response(self) -> Optional[Response]:
+        """ Response of the last run, None until the test has run """
+        return self.__response
+
     def realize_template(self, variable_name, context):
         if (context or self.templates) is None or (variable_name not in self.templates):
             return None
         if not context.get_values():
             return None
-        val = self.templates[variable_name].safe_substitute(context.get_values())
+        val = self.templates[variable_name].render(context)
         return val
 
     def parse(self, testcase_dict):
@@ -554,14 +825,17 @@ class TestCase:
             elif keyword == TestCaseKeywords.variable_binds:
                 self.__variable_binds_dict = Parser.flatten_dictionaries(value)
             elif keyword == TestCaseKeywords.generator_binds:
-                self.__generator_binds_dict = {str(k): str(v) for k, v in Parser.flatten_dictionaries(value)}
+                self.__generator_binds_dict = {str(k): str(v) for k, v in Parser.flatten_dictionaries(value).items()}
             elif keyword == TestCaseKeywords.options:
                 raise NotImplementedError("Yet to Support")
             elif keyword == TestCaseKeywords.body:
                 self.body = value
             elif keyword == TestCaseKeywords.absolute_urls:
                 self.__abs_url = Parser.safe_to_bool(value)
+            elif keyword == TestCaseKeywords.stream:
+                self.__stream = Parser.safe_to_bool(value)
 
+        self.__prepared = None  # abs_url and others are set without their setters
         expected_status = testcase_dict.get(TestCaseKeywords.expected_status, [])
         if expected_status:
             self.expected_http_status_code_list = expected_status
@@ -576,11 +850,13 @@ class TestCase:
             for key, value in self.generator_binds.items():
                 context.bind_generator_next(key, value)
 
-    def post_update(self, context):
-        if self.extract_binds:
+    def post_update(self, context, response=None):
+        if response is None:
+            response = self.__response
+        if self.extract_binds and response is not None:
             for key, value in self.extract_binds.items():
                 result = value.extract(
-                    body=self.body, headers=self.headers, context=context)
+                    body=response.content, headers=response.headers, context=context, response=response)
                 if result:
                     context.bind_variable(key, result)
 
@@ -590,16 +866,20 @@ class TestCase:
         return False
 
     def render(self):
-        if self.is_dynamic() or self.__context is not None:
-            if isinstance(self.__body, ContentHandler):
-                self.__body = self.__body.get_content(self.__context)
+        """ Templates are rendered when the request of a run is built, the body ContentHandler is kept
+        so that each run of a templated body renders it with the context of that run """
 
-    def __perform_validation(self) -> List:
+    def __perform_validation(self, response: Response) -> List:
 
         failure_list = []
         for validator in self.validators:
             logger.debug("Running validator: %s" % validator.name)
-            validate_result = validator.validate(body=self.body, headers=self.headers, context=self.__context)
+            if validator.accepts_response:
+                validate_result = validator.validate(
+                    body=response.content, headers=response.headers, context=self.__context, response=response)
+            else:
+                validate_result = validator.validate(
+                    body=response.content, headers=response.headers, context=self.__context)
             if not validate_result:
                 self.__passed = False
             if hasattr(validate_result, 'details'):
@@ -607,17 +887,64 @@ class TestCase:
 
         return failure_list
 
-    def run(self, context=None, timeout=None, curl_handler=None):
-
+    def prepare(self, curl_handler, context=None, timeout=None, keep_alive=False):
+        """ Bind the context and configure the curl handle for this test, returns the (body, header) buffers """
         if context is None:
             context = self.__context
 
-        self.pre_update(context)
-        self.render()
-        if timeout is None:
-            timeout = DEFAULT_TIMEOUT
+        self.__timings = Timings()
+        with self.__timings.measure('templating'):
+            self.pre_update(context)
+            self.render()
+            self.__attempts = []
+            self.__retry_policy = self.config.retry_policy()
+            if timeout is None:
+                timeout = DEFAULT_TIMEOUT
+            return self.configure_curl(curl_handler, timeout, keep_alive=keep_alive)
+
+    def performed(self, curl_handler, error=None):
+        """ Called after every perform of a request of this test, failed with error or not, by every runner
+        and benchmark loop. Does nothing, it is where --profile reads the network time of each request """
+
+    def retry_delay(self, curl_handler, header_byte=None, error=None):
+        """ Record the attempt just performed on the handle, failed with error or else answered in header_byte
+        Returns the seconds to wait before performing it again, None when it is the final attempt """
+        self.performed(curl_handler, error)
+        attempt = Attempt(len(self.__attempts) + 1, curl_handler.getinfo(pycurl.TOTAL_TIME), error=error)
+        if error is None:
+            attempt.status_code = int(curl_handler.getinfo(pycurl.RESPONSE_CODE))
+        self.__attempts.append(attempt)
+        policy = self.__retry_policy
+        if policy is None or policy.retries == 0:
+            return None
+        retry_after = None
+        if error is None:
+            if attempt.status_code in self.expected_http_status_code_list:
+                return None
+            retry_after = dict(Parser.parse_headers(header_byte.getvalue())).get('retry-after')
+        if not policy.should_retry(attempt.number, status_code=attempt.status_code, error=error):
+            return None
+        attempt.retry_delay = policy.delay(attempt.number, retry_after)
+        logger.info("Attempt %s of %s failed with %s, retrying in %.3fs", attempt.number,
+                    curl_handler.getinfo(pycurl.EFFECTIVE_URL), attempt.outcome, attempt.retry_delay)
+        return attempt.retry_delay
+
+    def retry(self, curl_handler, body_byte, header_byte, timeout=None):
+        """ Configure the handle to perform the request again, returns new (body, header) buffers
+        The handle is not reset and keeps its connection open for the new attempt """
+        body_byte.close()
+        header_byte.close()
+        with self.__timings.measure('templating'):
+            return self.configure_curl(curl_handler, timeout or DEFAULT_TIMEOUT, keep_alive=True)
+
+    def run(self, context=None, timeout=None, curl_handler=None, pool=None):
+
+        if context is None:
+            context = self.__context
 
-        if curl_handler:
+        if pool is not None:
+            curl_handler = pool.acquire(self.url)
+        elif curl_handler:
 
             try:  # Check the curl handle isn't closed, and reuse it if possible
                 curl_handler.getinfo(curl_handler.HTTP_CODE)
@@ -627,53 +954,152 @@ class TestCase:
                 curl_handler.setopt(curl_handler.COOKIELIST, "ALL")
             except pycurl.error:
                 curl_handler = pycurl.Curl()
-                curl_handler.setopt(pycurl.CAINFO, certifi.where())  # Fix for #29
+                curl_handler.setopt(pycurl.CAINFO, ca_bundle())  # Fix for #29
                 curl_handler.setopt(pycurl.FOLLOWLOCATION, 1)  # Support for HTTP 301
         else:
             curl_handler = pycurl.Curl()
 
-        body_byte, header_byte = self.__default_curl_config(curl_handler, timeout)
-        if self.config.timeout:
-            curl_handler.setopt(pycurl.CONNECTTIMEOUT, self.config.timeout)
-
-        if self.__ssl_insecure:
-            curl_handler.setopt(pycurl.SSL_VERIFYPEER, 0)
-            curl_handler.setopt(pycurl.SSL_VERIFYHOST, 0)
-
-        if self.body:
-            logger.debug("Request body %s" % self.body)
-            curl_handler.setopt(curl_handler.READFUNCTION, BytesIO(bytes(self.body, 'utf-8')).read)
+        try:
+            # A test that may be retried keeps the connection open for its next attempt
+            keep_alive = pool is not None or self.config.retries > 0
+            body_byte, header_byte = self.prepare(curl_handler, context, timeout, keep_alive=keep_alive)
+
+            if self.__delay:
+                time.sleep(self.__delay)
+            while True:
+                try:
+                    logger.info("Hitting %s" % self.url)
+                    curl_handler.perform()
+                except pycurl.error as e:
+                    delay = self.retry_delay(curl_handler, error=e)
+                    if delay is None:
+                        logger.error("Unknown Exception", exc_info=True)
+                        self.curl_failed(e, traceback.format_exc())
+                        break
+                else:
+                    delay = self.retry_delay(curl_handler, header_byte)
+                    if delay is None:
+                        self.process_response(curl_handler, body_byte, header_byte, context)
+                        break
+                time.sleep(delay)
+                body_byte, header_byte = self.retry(curl_handler, body_byte, header_byte, timeout)
+        finally:
+            if pool is not None:
+                pool.release(curl_handler)
+            else:
+                curl_handler.close()
 
-        if self.auth_username and self.auth_password:
-            curl_handler.setopt(pycurl.USERPWD, self.auth_username + ':' + self.auth_password)
+    async def run_async(self, context=None, timeout=None, pool=None, multi=None):
+        """ Run the test as a coroutine: the request is awaited on an AsyncCurlMulti of the running loop,
+        its own one unless `multi` is given, and the delay with asyncio.sleep
+        """
+        import asyncio
+        from resttest3.aio import AsyncCurlMulti
 
-        self.__configure_curl_method(curl_handler)
+        if context is None:
+            context = self.__context
+        own_multi = multi is None
+        if own_multi:
+            multi = AsyncCurlMulti()
+        curl_handler = pool.acquire(self.url) if pool is not None else pycurl.Curl()
+        try:
+            keep_alive = pool is not None or self.config.retries > 0
+            body_byte, header_byte = self.prepare(curl_handler, context, timeout, keep_alive=keep_alive)
+            if self.__delay:
+                await asyncio.sleep(self.__delay)
+            while True:
+                try:
+                    logger.info("Hitting %s" % self.url)
+                    await multi.perform(curl_handler)
+                except pycurl.error as e:
+                    delay = self.retry_delay(curl_handler, error=e)
+                    if delay is None:
+                        logger.error("Unknown Exception", exc_info=True)
+                        self.curl_failed(e, traceback.format_exc())
+                        break
+                else:
+                    delay = self.retry_delay(curl_handler, header_byte)
+                    if delay is None:
+                        self.process_response(curl_handler, body_byte, header_byte, context)
+                        break
+                await asyncio.sleep(delay)
+                body_byte, header_byte = self.retry(curl_handler, body_byte, header_byte, timeout)
+        finally:
+            if pool is not None:
+                pool.release(curl_handler)
+            else:
+                curl_handler.close()
+            if own_multi:
+                multi.close()
 
-        head = self.headers
-        self.__configure_curl_headers(curl_handler, head)
+    def curl_failed(self, error, details=None):
+        """ Record a curl error raised while performing this test """
+        self.__passed = False
+        self.__failure_list.append(
+            Failure(message="Curl Exception: {0}".format(error), details=details, failure_type=FAILURE_CURL_EXCEPTION))
+        self.__record_result()
 
-        if self.__delay:
-            time.sleep(self.__delay)
-        try:
-            logger.info("Hitting %s" % self.url)
-            curl_handler.perform()
-        except pycurl.error as e:
-            logger.error("Unknown Exception", exc_info=True)
+    def process_response(self, curl_handler, body_byte, header_byte, context=None):
+        """ Read the response of a performed curl handle, then run the validators and extractors """
+        if context is None:
+            context = self.__context
+        if self.__timings is None:
+            self.__timings = Timings()
+        self.__timings.read_curl(curl_handler)
+
+        with self.__timings.measure('response'):
+            response_read = self.__read_response(curl_handler, body_byte, header_byte)
+        if not response_read:
+            self.__record_result(self.__response)
+            return
+        if self.__response_code in self.expected_http_status_code_list:
+            self.__passed = True
+            with self.__timings.measure('validation'):
+                self.__failure_list.extend(self.__perform_validation(self.__response))
+            with self.__timings.measure('extraction'):
+                self.post_update(context, self.__response)
+        else:
             self.__passed = False
-            curl_handler.close()
-            trace = traceback.format_exc()
+            failure_message = "Invalid HTTP response code: response code {0} not in expected codes {1}".format(
+                self.__response_code, self.expected_http_status_code_list
+            )
             self.__failure_list.append(
-                Failure(message="Curl Exception: {0}".format(e), details=trace, failure_type=FAILURE_CURL_EXCEPTION))
-            return
-        self.body = body_byte.getvalue()
-        body_byte.close()
+                Failure(message=failure_message, details=None, failure_type=FAILURE_INVALID_RESPONSE)
+            )
+        self.__record_result(self.__response)
+
+    def __record_result(self, response=None):
+        """ Keep the outcome of the run in self.result, response is None when the request failed """
+        if response is None:
+            self.result = TestResult(None, None, timings=self.__timings, attempts=list(self.__attempts))
+        else:
+            self.result = TestResult(response.body_stream if response.is_streamed else response.body,
+                                     response.status_code, elapsed=self.__elapsed, timings=self.__timings,
+                                     attempts=list(self.__attempts))
+            self.result.headers = response.headers
+        self.result.failures.extend(self.__failure_list)
+
+    def __read_response(self, curl_handler, body_byte, header_byte):
+        """ Response of the performed handle from its buffers, returns False when its headers cannot be parsed """
         response_code = curl_handler.getinfo(pycurl.RESPONSE_CODE)
+        self.__elapsed = curl_handler.getinfo(pycurl.TOTAL_TIME)
         self.__response_code = int(response_code)
+        if self.__response is not None:
+            self.__response.close()
+        if isinstance(body_byte, BytesIO):
+            self.__response = Response(body=body_byte.getvalue(), status_code=self.__response_code)
+            body_byte.close()
+        else:  # Spooled, the file is closed with the response
+            self.__response = Response(body_stream=SpooledBody(body_byte), status_code=self.__response_code)
         if self.config.print_bodies:
-            print(self.body)
+            if self.__response.is_streamed:
+                print("<streamed body of %s bytes>" % len(self.__response))
+            else:
+                print(self.__response.text)
         try:
             response_headers = Parser.parse_headers(header_byte.getvalue())
             self.__response_headers = response_headers
+            self.__response.headers = response_headers
             logger.debug("RESPONSE HEADERS: %s" % self.__response_headers)
             header_byte.close()
 
@@ -683,67 +1109,80 @@ class TestCase:
                 message="Header parsing exception: {0}".format(e), details=trace, failure_type=FAILURE_TEST_EXCEPTION)
             )
             self.__passed = False
-            curl_handler.close()
-            return
+            return False
+        return True
 
-        if self.__response_code in self.expected_http_status_code_list:
-            self.__passed = True
-            self.__failure_list.extend(self.__perform_validation())
-            self.post_update(context)
+    def __method_options(self, has_body=False):
+        """ Curl options of the HTTP method, and the option set to the body length if the method sends one
+        A request body is read through the READFUNCTION """
+        if self.http_method == EnumHttpMethod.POST.name:
+            return [(EnumHttpMethod.POST.value, 1)], pycurl.POSTFIELDSIZE
+        if self.http_method == EnumHttpMethod.PUT.name:
+            return [(EnumHttpMethod.PUT.value, 1)], pycurl.INFILESIZE
+        # PATCH, DELETE and custom methods: posted like POST when there is a body
+        if has_body:
+            return [(pycurl.POST, 1), (pycurl.CUSTOMREQUEST, self.http_method.upper())], pycurl.POSTFIELDSIZE
+        return [(pycurl.CUSTOMREQUEST, self.http_method.upper())], None
+
+    def build_request(self):
+        """ Render the request of this test with its context into a PreparedRequest """
+        options = [(pycurl.URL, str(self.url))]
+        if self.config.timeout:
+            options.append((pycurl.CONNECTTIMEOUT, self.config.timeout))
+        if self.__ssl_insecure:
+            options.extend([(pycurl.SSL_VERIFYPEER, 0), (pycurl.SSL_VERIFYHOST, 0)])
+        if self.auth_username and self.auth_password:
+            options.append((pycurl.USERPWD, self.auth_username + ':' + self.auth_password))
+
+        body = body_file = None
+        if isinstance(self.__body, ContentHandler) and self.__body.is_static_file():
+            logger.debug("Request body from %s" % self.__body.content)
+            body_file = self.__body
         else:
-            self.__passed = False
-            failure_message = "Invalid HTTP response code: response code {0} not in expected codes {1}".format(
-                self.__response_code, self.expected_http_status_code_list
-            )
-            self.__failure_list.append(
-                Failure(message=failure_message, details=None, failure_type=FAILURE_INVALID_RESPONSE)
-            )
-        curl_handler.close()
+            text = self.body
+            if text:
+                logger.debug("Request body %s" % text)
+                body = text.encode('utf-8') if isinstance(text, str) else bytes(text)
+        method_options, size_option = self.__method_options(has_body=body_file is not None or bool(body))
+        options.extend(method_options)
 
-    @staticmethod
-    def __configure_curl_headers(curl_handler, head):
+        head = self.headers
         if head.get('content-type'):
-            content_type = head['content-type']
-            head[u'content-type'] = '%s ; charset=UTF-8' % content_type
+            head[u'content-type'] = '%s ; charset=UTF-8' % head['content-type']
+        logger.debug("Request headers %s " % head)
         headers = ["%s:%s" % (header_name, header_value) for header_name, header_value in head.items()]
         headers.append("Expect:")
-        headers.append("Connection: close")
-        logger.debug("Request headers %s " % head)
-        curl_handler.setopt(curl_handler.HTTPHEADER, headers)
+        return PreparedRequest(options, headers + ["Connection: close"], headers, body=body, body_file=body_file,
+                               size_option=size_option)
+
+    def prepared_request(self):
+        """ The request to send: built once and kept for a test without templates, built again for each run
+        of a dynamic one """
+        if self.is_dynamic():
+            return self.build_request()
+        if self.__prepared is None:
+            self.__prepared = self.build_request()
+        return self.__prepared
+
+    def configure_curl(self, curl_handler, timeout=DEFAULT_TIMEOUT, keep_alive=False):
+        """ Apply every option of this test onto the curl handle, returns the (body, header) write buffers
+            keep_alive leaves the connection open for the next request on a reused handle """
+        body_byte, header_byte = self.__default_curl_config(curl_handler, timeout)
+        self.prepared_request().apply(curl_handler, keep_alive)
+        return body_byte, header_byte
 
-    def __configure_curl_method(self, curl_handler):
-        body_length = len(self.body) if self.body else 0
-        if self.http_method == EnumHttpMethod.POST.name:
-            curl_handler.setopt(EnumHttpMethod.POST.value, 1)
-            curl_handler.setopt(pycurl.POSTFIELDSIZE, body_length)
-
-        elif self.http_method == EnumHttpMethod.PUT.name:
-            curl_handler.setopt(EnumHttpMethod.PUT.value, 1)
-            curl_handler.setopt(pycurl.INFILESIZE, body_length)
-
-        elif self.http_method == EnumHttpMethod.PATCH.name:
-            curl_handler.setopt(EnumHttpMethod.PATCH.value, EnumHttpMethod.PATCH.name)
-            curl_handler.setopt(pycurl.POSTFIELDS, self.body)
-
-        elif self.http_method == EnumHttpMethod.DELETE.name:
-            curl_handler.setopt(EnumHttpMethod.DELETE.value, EnumHttpMethod.DELETE.name)
-            if self.body:
-                curl_handler.setopt(pycurl.POSTFIELDS, self.body)
-                curl_handler.setopt(pycurl.POSTFIELDSIZE, body_length)
-
-        elif self.http_method == EnumHttpMethod.HEAD.name:
-            curl_handler.setopt(pycurl.NOBODY, 1)
-            curl_handler.setopt(EnumHttpMethod.HEAD.value, EnumHttpMethod.HEAD.name)
-        else:
-            curl_handler.setopt(pycurl.CUSTOMREQUEST, self.http_method.upper())
-            if self.body:
-                curl_handler.setopt(pycurl.POSTFIELDS, self.body)
-                curl_handler.setopt(pycurl.POSTFIELDSIZE, body_length)
+    def body_buffer(self):
+        """ Buffer the response body is written to: a temporary file for a streamed test, a spooled
+        file rolling over to disk past the configured stream_threshold, or else memory """
+        if self.__stream:
+            return tempfile.TemporaryFile()
+        if self.config.stream_threshold is not None:
+            return tempfile.SpooledTemporaryFile(max_size=max(1, self.config.stream_threshold))
+        return BytesIO()
 
     def __default_curl_config(self, curl_handler, timeout):
-        body_byte = BytesIO()
+        body_byte = self.body_buffer()
         header_byte = BytesIO()
-        curl_handler.setopt(curl_handler.URL, str(self.url))
         curl_handler.setopt(curl_handler.TIMEOUT, timeout)
         curl_handler.setopt(pycurl.WRITEFUNCTION, body_byte.write)
         curl_handler.setopt(pycurl.HEADERFUNCTION, header_byte.write)
@@ -0,0 +1,82 @@
+""" Where the time of a test run went: the phases of its request in libcurl and the work of resttest3 around it """
+import time
+from contextlib import contextmanager
+
+import pycurl
+
+# libcurl time name to its getinfo() value, each counted in seconds from the start of the request
+CURL_TIMES = (
+    ('namelookup', pycurl.NAMELOOKUP_TIME),
+    ('connect', pycurl.CONNECT_TIME),
+    ('appconnect', pycurl.APPCONNECT_TIME),
+    ('pretransfer', pycurl.PRETRANSFER_TIME),
+    ('starttransfer', pycurl.STARTTRANSFER_TIME),
+    ('total', pycurl.TOTAL_TIME),
+)
+
+# Work resttest3 does for a test: rendering and configuring the request, reading the response into a Response,
+# running the validators and extracting the extract_binds
+TOOL_PHASES = ('templating', 'response', 'validation', 'extraction')
+
+
+class Timings:
+    """ libcurl times of the last request of a test, and seconds spent in each tool phase of its run """
+
+    def __init__(self):
+        self.curl = {}  # Name in CURL_TIMES to seconds since the start of the request
+        self.tool = dict.fromkeys(TOOL_PHASES, 0.0)
+
+    def read_curl(self, curl_handler):
+        """ Read the times of the request just performed on the handle """
+        self.curl = {name: curl_handler.getinfo(info) for name, info in CURL_TIMES}
+
+    @contextmanager
+    def measure(self, phase):
+        """ Add the time spent in the with block to the tool phase """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.tool[phase] += time.perf_counter() - start
+
+    @property
+    def network(self):
+        """ Seconds of each phase of the request, from the cumulative libcurl times
+        dns, tcp and tls are 0 on a reused connection, wait is the time to the first byte once the request was sent
+        """
+        if not self.curl:
+            return {}
+        curl = self.curl
+        connected = max(curl['appconnect'], curl['connect'])
+        return {
+            'dns': curl['namelookup'],
+            'tcp': max(0.0, curl['connect'] - curl['namelookup']),
+            'tls': max(0.0, curl['appconnect'] - curl['connect']) if curl['appconnect'] else 0.0,
+            'request': max(0.0, curl['pretransfer'] - connected),
+            'wait': max(0.0, curl['starttransfer'] - curl['pretransfer']),
+            'transfer': max(0.0, curl['total'] - curl['starttransfer']),
+        }
+
+    @property
+    def total(self):
+        """ Seconds libcurl took for the request """
+        return self.curl.get('total', 0.0)
+
+    @property
+    def overhead(self):
+        """ Seconds resttest3 spent on the test outside of libcurl """
+        return sum(self.tool.values())
+
+    def as_dict(self):
+        return {'curl': dict(self.curl), 'network': self.network, 'tool': dict(self.tool),
+                'total': self.total, 'overhead': self.overhead}
+
+    def report_rows(self):
+        """ Rows of phase name and milliseconds for the HTML report: request total and its network phases,
+        then the tool overhead and its phases """
+        phases = [('total', self.total)] + list(self.network.items())
+        phases += [('overhead', self.overhead)] + list(self.tool.items())
+        return [{'phase': name, 'ms': '%.3f' % (seconds * 1000)} for name, seconds in phases]
+
+    def __repr__(self):
+        return 'Timings(total=%.6f, overhead=%.6f)' % (self.total, self.overhead)
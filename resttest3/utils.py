@@ -15,6 +15,9 @@ from resttest3.validators import register_validator
 
 logger = logging.getLogger('resttest3')
 
+# libyaml's C loader is many times faster than the pure Python one, when PyYAML was built with it
+YamlLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
 
 class ChangeDir:
     """Context manager for changing the current working directory"""
@@ -37,9 +40,14 @@ class ChangeDir:
             ChangeDir.DIR_LOCK.release()
 
 
+def load_yaml(stream):
+    """ yaml.safe_load with the C loader when available """
+    return yaml.load(stream, Loader=YamlLoader)
+
+
 def read_testcase_file(path):
     with open(path, "r") as f:
-        testcase = yaml.safe_load(f.read())
+        testcase = load_yaml(f.read())
     return testcase
 
 
@@ -181,6 +189,12 @@ class Parser:
         return [(k.lower(), v) for k, v in header_msg.items()]
 
 
+def register_profile_hook(name, hook):
+    """ Register a profile hook of an extension, resttest3.profiling is only imported by extensions having some """
+    from resttest3 import profiling
+    profiling.register_profile_hook(name, hook)
+
+
 def register_extensions(modules):
     """ Import the modules and register their respective extensions """
     if isinstance(modules, str):  # Catch supplying just a string arg
@@ -200,7 +214,8 @@ def register_extensions(modules):
             'COMPARATORS': register_comparator,
             'VALIDATOR_TESTS': register_test,
             'EXTRACTORS': register_extractor,
-            'GENERATORS': register_generator
+            'GENERATORS': register_generator,
+            'PROFILE_HOOKS': register_profile_hook
         }
 
         has_registry = False
@@ -1,17 +1,27 @@
+import hashlib
 import json
 import logging
 import os
-import string
 import traceback
 from abc import abstractmethod, ABCMeta
+from functools import lru_cache
 from typing import Dict, List, Union, Optional
 
-from resttest3.constants import COMPARATORS, FAILURE_EXTRACTOR_EXCEPTION, FAILURE_VALIDATOR_FAILED, VALIDATOR_TESTS
+from resttest3.binding import ContextTemplate
+from resttest3 import jsonstream
+from resttest3.constants import COMPARATORS, FAILURE_EXTRACTOR_EXCEPTION, FAILURE_VALIDATOR_FAILED, VALIDATOR_TESTS, \
+    safe_length
+from resttest3.response import SpooledBody
 
 logger = logging.getLogger('resttest3.validators')
 
 EXTRACTORS = {}
 VALIDATORS = {}
+# Names of extensions not imported yet, to the module providing them (see register_lazy_extension)
+LAZY_EXTRACTORS = {}
+LAZY_VALIDATORS = {}
+
+QUERY_CACHE_SIZE = 256  # Compiled plans kept per extractor type for templated queries
 
 
 class Failure:
@@ -33,6 +43,10 @@ class Failure:
 class AbstractExtractor(metaclass=ABCMeta):
     """ Basic extractor, you only need to implement full_extract """
 
+    # Extractors setting this receive the response body already decoded from JSON in extract_parsed,
+    # the Response object parses it once and shares it with every validator and extractor of a test
+    accepts_parsed_json = False
+
     def __init__(self):
         self.extractor_type = None
         self.query = None
@@ -40,6 +54,8 @@ class AbstractExtractor(metaclass=ABCMeta):
         self.args = None
         self._is_body_extractor = None
         self._is_header_extractor = None
+        self._compiled_query = None  # (query, plan) compiled at parse time for a non-templated query
+        self._query_template = None  # ContextTemplate of a templated query
 
     @property
     def is_templated(self):
@@ -61,17 +77,38 @@ class AbstractExtractor(metaclass=ABCMeta):
     def extract_internal(self, query=None, body=None, headers=None, args=None):
         """ Do extraction, query should be pre-templated """
 
-    def extract(self, body=None, headers=None, context=None):
+    def extract_parsed(self, query=None, data=None, headers=None, args=None):
+        """ Do extraction on the JSON decoded body, only called when accepts_parsed_json is set """
+        raise NotImplementedError("Extractor {0} does not accept parsed JSON".format(self.extractor_type))
+
+    @staticmethod
+    def compile_query(query):
+        """ Turn a query into a reusable plan, extractors with a query language override this
+        Plans for templated queries are looked up on every extraction, so overrides should be cached
+        """
+        return query
+
+    def compiled_query(self, query):
+        """ Plan for a (rendered) query, the one compiled at parse time is reused while the query is unchanged """
+        compiled = self._compiled_query
+        if compiled is not None and compiled[0] == query:
+            return compiled[1]
+        return self.compile_query(query)
+
+    def extract(self, body=None, headers=None, context=None, response=None):
         """ Extract data """
 
         query = self.templated_query(context=context)
+        if response is not None and self.accepts_parsed_json:
+            return self.extract_parsed(query=query, data=response.json, headers=headers, args=self.args)
         return self.extract_internal(query=query, body=body, headers=headers, args=self.args)
 
     def templated_query(self, context=None):
         if context and self.is_templated:
-            query = string.Template(self.query).safe_substitute(
-                context.get_values())
-            return query
+            template = self._query_template
+            if template is None or template.template_string != self.query:
+                template = self._query_template = ContextTemplate(self.query)
+            return template.render(context)
         return self.query
 
     def get_readable_config(self, context=None):
@@ -94,12 +131,14 @@ class AbstractExtractor(metaclass=ABCMeta):
                 config = config['template']
                 extractor_base.is_templated = True
                 extractor_base.query = config
+                extractor_base._query_template = ContextTemplate(config)
             except KeyError:
                 raise ValueError(
                     "Cannot define a dictionary config for abstract extractor without it having template key")
         elif isinstance(config, str):
             extractor_base.query = config
             extractor_base.is_templated = False
+            extractor_base._compiled_query = (config, extractor_base.compile_query(config))
         else:
             raise TypeError(
                 "Base extractor must have a string or {template: querystring} configuration node!")
@@ -111,6 +150,8 @@ class MiniJsonExtractor(AbstractExtractor):
         IE key.key or array_index.key extraction
     """
 
+    accepts_parsed_json = True
+
     def __init__(self):
         super(MiniJsonExtractor, self).__init__()
         self.extractor_type = 'jsonpath_mini'
@@ -122,31 +163,82 @@ class MiniJsonExtractor(AbstractExtractor):
             body = body.decode()
         try:
             body = json.loads(body)
-            return self.query_dictionary(query, body)
         except ValueError:
             raise ValueError("Not legal JSON!")
+        return self.extract_parsed(query=query, data=body, headers=headers, args=args)
+
+    def extract_parsed(self, query=None, data=None, headers=None, args=None):
+        return self.query_steps(self.compiled_query(query), data)
 
     @staticmethod
-    def query_dictionary(query: str, dictionary: Union[List, Dict], delimiter='.') -> Optional[Dict]:
-        """ Do an xpath-like query with dictionary, using a template if relevant """
+    @lru_cache(maxsize=QUERY_CACHE_SIZE)
+    def compile_query(query: str, delimiter='.') -> Optional[tuple]:
+        """ Split a query into a tuple of steps: int steps index arrays, str steps index objects """
+        if not isinstance(query, str):
+            return None
+        steps = []
+        stripped_query = query.strip(delimiter)
+        if stripped_query:
+            for x in stripped_query.split(delimiter):
+                try:
+                    steps.append(int(x))
+                except ValueError:
+                    steps.append(x)
+        return tuple(steps)
+
+    @staticmethod
+    def query_steps(steps: Optional[tuple], dictionary: Union[List, Dict]) -> Optional[Dict]:
+        """ Walk the compiled steps of a query through the dictionary, None if any step is missing """
+        if steps is None:
+            return None
         try:
-            stripped_query = query.strip(delimiter)
-            if stripped_query:
-                for x in stripped_query.split(delimiter):
-                    try:
-                        dictionary = dictionary[int(x)]
-                    except ValueError:
-                        dictionary = dictionary[x]
+            for step in steps:
+                dictionary = dictionary[step]
         except Exception:
             return None
         return dictionary
 
+    @staticmethod
+    def query_dictionary(query: str, dictionary: Union[List, Dict], delimiter='.') -> Optional[Dict]:
+        """ Do an xpath-like query with dictionary, using a template if relevant """
+        return MiniJsonExtractor.query_steps(MiniJsonExtractor.compile_query(query, delimiter), dictionary)
+
     @classmethod
     def parse(cls, config):
         base = MiniJsonExtractor()
         return cls.configure_base(config, base)
 
 
+class StreamingJsonExtractor(AbstractExtractor):
+    """ Extractor with the jsonpath_mini syntax that reads the body as a stream, never decoding it whole
+    It stops reading once the path is resolved, for huge documents where only a few values are needed.
+    """
+
+    def __init__(self):
+        super(StreamingJsonExtractor, self).__init__()
+        self.extractor_type = 'jsonpath_stream'
+        self._is_body_extractor = True
+
+    def extract_internal(self, query=None, args=None, body=None, headers=None):
+        steps = self.compiled_query(query)
+        if steps is None:
+            return None
+        if isinstance(body, SpooledBody):
+            chunks = body.chunks()
+        elif isinstance(body, str):
+            chunks = (body.encode('utf-8'),)
+        else:
+            chunks = (body or b'',)
+        value = jsonstream.find_path(chunks, steps)
+        return None if value is jsonstream.MISSING else value
+
+    compile_query = staticmethod(MiniJsonExtractor.compile_query)
+
+    @classmethod
+    def parse(cls, config):
+        return cls.configure_base(config, StreamingJsonExtractor())
+
+
 class HeaderExtractor(AbstractExtractor):
     """ Extractor that pulls out a named header value... or list of values if multiple values defined """
 
@@ -191,11 +283,39 @@ class RawBodyExtractor(AbstractExtractor):
         return base
 
 
+class BodyHashExtractor(AbstractExtractor):
+    """ Extractor that returns the hex digest of the body, the query names the hashlib algorithm
+    A streamed body is hashed chunk by chunk from its spool
+    """
+
+    def __init__(self):
+        super(BodyHashExtractor, self).__init__()
+        self.extractor_type = 'body_hash'
+        self._is_header_extractor = False
+        self._is_body_extractor = True
+
+    def extract_internal(self, query=None, args=None, body=None, headers=None):
+        algorithm = query or 'sha256'
+        if isinstance(body, SpooledBody):
+            return body.digest(algorithm)
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        return hashlib.new(algorithm, body or b'').hexdigest()
+
+    @classmethod
+    def parse(cls, config):
+        base = cls.configure_base(config if config else 'sha256', BodyHashExtractor())
+        if not base.is_templated and base.query.lower() not in hashlib.algorithms_available:
+            raise ValueError("Unknown hash algorithm {0}, available are {1}".format(
+                base.query, sorted(hashlib.algorithms_available)))
+        return base
+
+
 def _get_extractor(config_dict):
     """ Utility function, get an extract function for a single valid extractor name in config
         and error if more than one or none """
     for key, value in config_dict.items():
-        if key in EXTRACTORS:
+        if key in EXTRACTORS or key in LAZY_EXTRACTORS:
             return parse_extractor(key, value)
     raise Exception(
         'No valid extractor name to use in input: {0}'.format(config_dict))
@@ -204,6 +324,9 @@ def _get_extractor(config_dict):
 class AbstractValidator(metaclass=ABCMeta):
     """ Encapsulates basic validator handling """
 
+    # Validators setting this are passed the Response of the test, so they can share its parsed body
+    accepts_response = False
+
     def __init__(self):
         self.name = None
         self.config = None
@@ -212,19 +335,32 @@ class AbstractValidator(metaclass=ABCMeta):
         self.comparator = None
         self.comparator_name = None
         self.is_template_expected = None
+        self.expected_template = None  # ContextTemplate of a templated expected value
 
     @abstractmethod
     def validate(self, body=None, headers=None, context=None):
-        """ Run the validation function, return true or a Failure """
+        """ Run the validation function, return true or a Failure
+            Validators with accepts_response also get the Response of the test as a response keyword """
 
 
 class ComparatorValidator(AbstractValidator):
     """ Does extract and compare from request body   """
+    accepts_response = True
 
     def __init__(self):
         super(ComparatorValidator, self).__init__()
         self.name = 'ComparatorValidator'
 
+    def __getstate__(self):
+        # Comparators are often lambdas, they are looked up again by name when unpickled
+        state = self.__dict__.copy()
+        state['comparator'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.comparator = COMPARATORS[self.comparator_name]
+
     def get_readable_config(self, context=None):
         """ Get a human-readable config string """
         frag_list = ["Extractor: %s" % self.extractor.get_readable_config(context=context)]
@@ -235,10 +371,11 @@ class ComparatorValidator(AbstractValidator):
             frag_list.append('Expected is templated, raw value: {0}'.format(self.expected))
         return os.linesep.join(frag_list)
 
-    def validate(self, body=None, headers=None, context=None):
+    def extract_values(self, body=None, headers=None, context=None, response=None):
+        """ The extracted value and the expected one, or a Failure when an extractor raised """
         try:
             extracted_val = self.extractor.extract(
-                body=body, headers=headers, context=context)
+                body=body, headers=headers, context=context, response=response)
         except Exception:
             trace = traceback.format_exc()
             return Failure(message="Extractor threw exception", details=trace, validator=self,
@@ -246,16 +383,24 @@ class ComparatorValidator(AbstractValidator):
 
         if isinstance(self.expected, AbstractExtractor):
             try:
-                expected_val = self.expected.extract(body=body, headers=headers, context=context)
+                expected_val = self.expected.extract(body=body, headers=headers, context=context, response=response)
             except Exception:
                 trace = traceback.format_exc()
                 return Failure(message="Expected value extractor threw exception", details=trace, validator=self,
                                failure_type=FAILURE_EXTRACTOR_EXCEPTION)
         elif self.is_template_expected and context:
-            expected_val = string.Template(
-                self.expected).safe_substitute(context.get_values())
+            if self.expected_template is None or self.expected_template.template_string != self.expected:
+                self.expected_template = ContextTemplate(self.expected)
+            expected_val = self.expected_template.render(context)
         else:
             expected_val = self.expected
+        return extracted_val, expected_val
+
+    def validate(self, body=None, headers=None, context=None, response=None):
+        values = self.extract_values(body=body, headers=headers, context=context, response=response)
+        if isinstance(values, Failure):
+            return values
+        extracted_val, expected_val = values
 
         # Handle a bytes-based body and a unicode expected value seamlessly
         if isinstance(extracted_val, bytes) and isinstance(expected_val, str):
@@ -265,9 +410,9 @@ class ComparatorValidator(AbstractValidator):
         if not comparison:
             failure = Failure(validator=self)
             if self.comparator_name in ("count_eq", "length_eq"):  # Thanks @KellyBennett
-
-                failure.message = "Comparison failed, evaluating {0}({1}, {2}) returned False".format(
-                    self.comparator_name, extracted_val, len(expected_val))
+                # Report the length, a streamed body is not loaded just to print it
+                failure.message = "Comparison failed, evaluating {0}(length {1}, {2}) returned False".format(
+                    self.comparator_name, safe_length(extracted_val), expected_val)
             else:
                 failure.message = "Comparison failed, evaluating {0}({1}, {2}) returned False".format(
                     self.comparator_name, extracted_val, expected_val)
@@ -277,8 +422,8 @@ class ComparatorValidator(AbstractValidator):
 
         return True
 
-    @staticmethod
-    def parse(config):
+    @classmethod
+    def parse(cls, config):
         """ Create a validator that does an extract from body and applies a comparator,
             Then does comparison vs expected value
             Syntax sample:
@@ -288,7 +433,7 @@ class ComparatorValidator(AbstractValidator):
               }
         """
         from resttest3.utils import Parser
-        output = ComparatorValidator()
+        output = cls()
         config = Parser.lowercase_keys(Parser.flatten_dictionaries(config))
         output.config = config
 
@@ -331,6 +476,7 @@ class ComparatorValidator(AbstractValidator):
                         "Can't template a comparator-validator unless template value is a string")
                 output.is_template_expected = True
                 output.expected = template
+                output.expected_template = ContextTemplate(template)
             else:  # Extractor to compare against
                 output.expected = _get_extractor(expected)
                 if not output.expected:
@@ -340,14 +486,144 @@ class ComparatorValidator(AbstractValidator):
         return output
 
 
+class ArrayComparatorValidator(ComparatorValidator):
+    """ Applies a comparator to every element of an extracted array in one pass
+    In 'all' mode every element has to match and the failure lists the indices that did not, in 'any' mode
+    one matching element is enough. An optional jsonpath_mini `element` query picks the value within each element.
+    Numeric comparisons run vectorised with NumPy when it is installed.
+    """
+
+    MODES = ('all', 'any')
+    MAX_REPORTED = 20  # Failing indices listed in a failure, the others are only counted
+    NUMPY_COMPARATORS = ('eq', 'ne', 'lt', 'le', 'ge', 'gt')
+
+    def __init__(self):
+        super(ArrayComparatorValidator, self).__init__()
+        self.name = 'ArrayComparatorValidator'
+        self.mode = 'all'
+        self.element = None
+        self.element_steps = ()
+
+    def get_readable_config(self, context=None):
+        readable = "Mode: {0}, Element: {1}".format(self.mode, self.element) if self.element else \
+            "Mode: {0}".format(self.mode)
+        return os.linesep.join([readable, super(ArrayComparatorValidator, self).get_readable_config(context=context)])
+
+    def compare_elements(self, elements, expected_val):
+        """ Indices of the elements the comparator does not hold for, with NumPy for numbers when possible """
+        if self.comparator_name in self.NUMPY_COMPARATORS and isinstance(expected_val, (int, float)) and \
+                not isinstance(expected_val, bool):
+            failed = self.__compare_numpy(elements, expected_val)
+            if failed is not None:
+                return failed
+        comparator = self.comparator
+        failed = []
+        for index, element in enumerate(elements):
+            try:
+                if comparator(element, expected_val):
+                    continue
+            except (TypeError, ValueError):
+                pass
+            failed.append(index)
+        return failed
+
+    def __compare_numpy(self, elements, expected_val):
+        """ None when NumPy is not installed or the elements are not all numbers """
+        try:
+            import numpy
+        except ImportError:
+            return None
+        array = numpy.asarray(elements)
+        if array.ndim != 1 or array.dtype.kind not in 'iuf':  # Booleans, strings and mixed lists compare in python
+            return None
+        matched = getattr(numpy, {'eq': 'equal', 'ne': 'not_equal', 'lt': 'less', 'le': 'less_equal',
+                                  'ge': 'greater_equal', 'gt': 'greater'}[self.comparator_name])(array, expected_val)
+        return numpy.flatnonzero(~matched).tolist()
+
+    def validate(self, body=None, headers=None, context=None, response=None):
+        values = self.extract_values(body=body, headers=headers, context=context, response=response)
+        if isinstance(values, Failure):
+            return values
+        extracted_val, expected_val = values
+
+        if not isinstance(extracted_val, (list, tuple)):
+            return Failure(message="Comparison failed, {0} expects an array, extracted {1}".format(
+                self.mode, type(extracted_val).__name__), details=self.get_readable_config(context=context),
+                validator=self, failure_type=FAILURE_VALIDATOR_FAILED)
+        elements = extracted_val
+        if self.element_steps:
+            elements = [MiniJsonExtractor.query_steps(self.element_steps, element) for element in extracted_val]
+
+        if self.mode == 'any':
+            comparator = self.comparator
+            for element in elements:
+                try:
+                    if comparator(element, expected_val):
+                        return True
+                except (TypeError, ValueError):
+                    pass
+            message = "Comparison failed, evaluating {0}(element, {1}) returned False for all {2} elements".format(
+                self.comparator_name, expected_val, len(elements))
+            return Failure(message=message, details=self.get_readable_config(context=context), validator=self,
+                           failure_type=FAILURE_VALIDATOR_FAILED)
+
+        failed = self.compare_elements(elements, expected_val)
+        if not failed:
+            return True
+        reported = failed[:self.MAX_REPORTED]
+        message = "Comparison failed, evaluating {0}(element, {1}) returned False for {2} of {3} elements at " \
+                  "indices {4}".format(self.comparator_name, expected_val, len(failed), len(elements),
+                                       ', '.join(str(index) for index in reported))
+        if len(failed) > len(reported):
+            message += " and {0} more".format(len(failed) - len(reported))
+        details = [self.get_readable_config(context=context)]
+        details.extend("[{0}]: {1!r}".format(index, elements[index]) for index in reported)
+        return Failure(message=message, details=os.linesep.join(details), validator=self,
+                       failure_type=FAILURE_VALIDATOR_FAILED)
+
+    @classmethod
+    def parse(cls, config, mode='all'):
+        """ Same configuration as compare, plus an optional `element` query:
+              { jsonpath_mini: 'items', element: 'status', comparator: 'eq', expected: 'active' }
+        """
+        if mode not in cls.MODES:
+            raise ValueError("Invalid array comparison mode {0}, available are {1}".format(mode, cls.MODES))
+        output = super(ArrayComparatorValidator, cls).parse(config)
+        output.mode = mode
+        element = output.config.get('element')
+        if element is not None:
+            output.element = str(element)
+            output.element_steps = MiniJsonExtractor.compile_query(output.element)
+        return output
+
+    @classmethod
+    def parse_all(cls, config):
+        return cls.parse(config, 'all')
+
+    @classmethod
+    def parse_any(cls, config):
+        return cls.parse(config, 'any')
+
+
 class ExtractTestValidator(AbstractValidator):
     """ Does extract and test from request body """
+    accepts_response = True
+
     def __init__(self):
         super(ExtractTestValidator, self).__init__()
         self.name = 'ExtractTestValidator'
         self.test_fn = None
         self.test_name = None
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['test_fn'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.test_fn = VALIDATOR_TESTS[self.test_name]
+
     def get_readable_config(self, context=None):
         """ Get a human-readable config string """
         return "Extractor: " + self.extractor.get_readable_config(context=context)
@@ -367,10 +643,10 @@ class ExtractTestValidator(AbstractValidator):
         output.test_fn = test_fn
         return output
 
-    def validate(self, body=None, headers=None, context=None):
+    def validate(self, body=None, headers=None, context=None, response=None):
         try:
             extracted = self.extractor.extract(
-                body=body, headers=headers, context=context)
+                body=body, headers=headers, context=context, response=response)
         except Exception:
             trace = traceback.format_exc()
             return Failure(message="Exception thrown while running extraction from body", details=trace, validator=self,
@@ -396,6 +672,8 @@ def parse_extractor(extractor_type, config):
             - OR a a full Extractor instance (configured)
     """
     parse = EXTRACTORS.get(extractor_type.lower())
+    if not parse and _load_lazy_extension(LAZY_EXTRACTORS, extractor_type.lower()):
+        parse = EXTRACTORS.get(extractor_type.lower())
     if not parse:
         raise ValueError(
             "Extractor {0} is not a valid extractor type".format(extractor_type))
@@ -416,6 +694,8 @@ def parse_extractor(extractor_type, config):
 def parse_validator(name, config_node):
     '''Parse a validator from configuration and use it '''
     name = name.lower()
+    if name not in VALIDATORS:
+        _load_lazy_extension(LAZY_VALIDATORS, name)
     if name not in VALIDATORS:
         raise ValueError(
             "Name {0} is not a named validator type!".format(name))
@@ -445,6 +725,7 @@ def register_validator(name, parse_function):
         raise Exception("Validator exists with this name: {0}".format(name))
 
     VALIDATORS[name] = parse_function
+    LAZY_VALIDATORS.pop(name, None)
 
 
 def register_extractor(extractor_name, parse_function):
@@ -464,6 +745,7 @@ def register_extractor(extractor_name, parse_function):
         raise ValueError(
             "Cannot register an extractor name that already exists: {0}".format(extractor_name))
     EXTRACTORS[extractor_name] = parse_function
+    LAZY_EXTRACTORS.pop(extractor_name, None)
 
 
 def register_test(test_name, test_function):
@@ -486,12 +768,41 @@ def register_comparator(comparator_name, comparator_function):
     COMPARATORS[comparator_name] = comparator_function
 
 
+def register_lazy_extension(module_name, validators=(), extractors=()):
+    """ Register the validator and extractor names an extension module provides, without importing it
+    The module is imported and registered with register_extensions when one of the names is first parsed
+    """
+    for name in validators:
+        if name.lower() not in VALIDATORS:
+            LAZY_VALIDATORS[name.lower()] = module_name
+    for name in extractors:
+        if name not in EXTRACTORS:
+            LAZY_EXTRACTORS[name] = module_name
+
+
+def _load_lazy_extension(lazy_registry, name):
+    """ Import the extension module providing a lazily registered name, returns False for other names """
+    module_name = lazy_registry.get(name)
+    if module_name is None:
+        return False
+    from resttest3.utils import register_extensions
+    logger.debug("Loading extension %s for %s" % (module_name, name))
+    register_extensions(module_name)
+    lazy_registry.pop(name, None)
+    return True
+
+
 # --- REGISTRY OF EXTRACTORS AND VALIDATORS ---
 register_extractor('jsonpath_mini', MiniJsonExtractor.parse)
 register_extractor('header', HeaderExtractor.parse)
 register_extractor('raw_body', RawBodyExtractor.parse)
+register_extractor('jsonpath_stream', StreamingJsonExtractor.parse)
+register_extractor('body_hash', BodyHashExtractor.parse)
 register_validator('comparator', ComparatorValidator.parse)
 register_validator('compare', ComparatorValidator.parse)
+register_validator('all', ArrayComparatorValidator.parse_all)
+register_validator('for_each', ArrayComparatorValidator.parse_all)
+register_validator('any', ArrayComparatorValidator.parse_any)
 register_validator('assertEqual', ComparatorValidator.parse)
 register_validator('extract_test', ExtractTestValidator.parse)
 register_validator('assertTrue', ExtractTestValidator.parse)
@@ -0,0 +1,121 @@
+""" Sharding of test groups across worker processes, for suites that are CPU bound in validation """
+import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from resttest3.parallel import ParallelRunner
+from resttest3.plan import PlanCache
+from resttest3.pool import CurlPool
+from resttest3.testcase import TestSet
+from resttest3.utils import register_extensions
+from resttest3.validators import Failure
+
+logger = logging.getLogger('resttest3.workers')
+
+
+class TestCaseSummary:
+    """ Picklable outcome of a test run in a worker, with what the runner reports on a TestCase """
+
+    def __init__(self, name=None, group=None, is_passed=False, failures=None, elapsed=None, timings=None,
+                 attempts=None):
+        self.name = name
+        self.group = group
+        self.is_passed = is_passed
+        self.failures = failures if failures is not None else []
+        self.elapsed = elapsed
+        self.timings = timings
+        self.attempts = attempts if attempts is not None else []
+
+    @classmethod
+    def from_testcase(cls, testcase):
+        # Validators, contexts and curl handles stay in the worker, failures keep their text only
+        failures = [Failure(message=str(f.message), details=f.details, failure_type=f.failure_type)
+                    for f in testcase.failures]
+        return cls(name=testcase.name, group=testcase.group, is_passed=testcase.is_passed, failures=failures,
+                   elapsed=testcase.elapsed, timings=testcase.timings, attempts=list(testcase.attempts))
+
+
+def shard_groups(test_group_dict, workers):
+    """ Split group names into at most `workers` shards of about the same number of tests
+    Biggest groups are placed first, each on the shard with the fewest tests so far
+    """
+    shards = [[] for _ in range(max(1, int(workers)))]
+    loads = [0] * len(shards)
+    groups = sorted(test_group_dict.items(), key=lambda item: len(item[1].testcase_list), reverse=True)
+    for group_name, group in groups:
+        if not group.testcase_list:
+            continue
+        index = loads.index(min(loads))
+        shards[index].append(group_name)
+        loads[index] += len(group.testcase_list)
+    return [shard for shard in shards if shard]
+
+
+def run_shard(test_file, base_url, group_names, parallel=1, curl_share=False, extensions=None, plan_cache=False):
+    """ Worker entry point: parse the test file again and run only the given groups
+
+    Every worker builds its own groups, Contexts, generators and curl handles from the file,
+    or from the plan the parent stored with plan_cache.
+    Returns a dictionary of group name to list of TestCaseSummary, and the pool statistics.
+    """
+    if extensions is not None:
+        register_extensions(extensions)
+    TestSet.reset()  # A forked worker inherits the groups parsed by the parent
+    testcase_set = TestSet()
+    testcase_set.parse_file(base_url, test_file, plan_cache=PlanCache() if plan_cache else None)
+    test_group_dict = {name: testcase_set.test_group_list_dict[name] for name in group_names}
+
+    result_dict = {name: [] for name in group_names}
+    pool = CurlPool(share=curl_share)
+    try:
+        if parallel > 1:
+            ParallelRunner(parallel, pool=pool).run(
+                test_group_dict, lambda group_name, testcase: result_dict[group_name].append(
+                    TestCaseSummary.from_testcase(testcase)))
+        else:
+            for group_name, group in test_group_dict.items():
+                for testcase in group.testcase_list:
+                    testcase.run(pool=pool)
+                    result_dict[group_name].append(TestCaseSummary.from_testcase(testcase))
+    finally:
+        pool.close()
+    return result_dict, pool.stats()
+
+
+class WorkerRunner:
+    """ Runs test groups in a pool of processes, one shard of groups per worker """
+
+    def __init__(self, workers, parallel=1, curl_share=False, extensions=None, plan_cache=False):
+        if int(workers) < 1:
+            raise ValueError("Number of workers must be at least 1, not {0}".format(workers))
+        self.workers = int(workers)
+        self.parallel = parallel
+        self.curl_share = curl_share
+        self.extensions = extensions
+        self.plan_cache = plan_cache
+
+    def run(self, test_file, base_url, test_group_dict, callback=None, pool=None):
+        """ Run every group of test_group_dict, callback(group_name, summary) is invoked in group order
+
+        Worker pool statistics are added into `pool` when one is given.
+        """
+        shards = shard_groups(test_group_dict, self.workers)
+        result_dict = {}
+        with ProcessPoolExecutor(max_workers=len(shards) or 1) as executor:
+            future_list = [
+                executor.submit(run_shard, str(test_file), base_url, shard, self.parallel, self.curl_share,
+                                self.extensions, self.plan_cache)
+                for shard in shards
+            ]
+            for future in as_completed(future_list):
+                shard_result, stats = future.result()
+                logger.info("Worker finished groups %s" % list(shard_result.keys()))
+                result_dict.update(shard_result)
+                if pool is not None:
+                    pool.hits += stats['hits']
+                    pool.misses += stats['misses']
+
+        for group_name in test_group_dict:
+            for summary in result_dict.get(group_name, []):
+                if callback:
+                    callback(group_name, summary)
+        return result_dict
@@ -0,0 +1,133 @@
+""" Minimal threaded HTTP server, so tests can run requests without network access """
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+PERSON_LIST = [
+    {"id": 1, "first_name": "Gaius", "last_name": "Baltar", "login": "gbaltar"},
+    {"id": 2, "first_name": "Leeroy", "last_name": "Jenkins", "login": "jenkins"},
+]
+
+
+class TestRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, headers=None):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body)
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def _send_bytes(self, size):
+        """ Body of `size` bytes b'x', written in chunks """
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(size))
+        self.end_headers()
+        remaining = size
+        while remaining > 0 and self.command != 'HEAD':
+            chunk = b'x' * min(remaining, 1 << 16)
+            self.wfile.write(chunk)
+            remaining -= len(chunk)
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def _route(self):
+        self.server.request_log.append((self.command, self.path))
+        self.server.client_ports.add(self.client_address[1])
+        request_body = self._read_body()
+        path = self.path.split('?')[0]
+        if path.startswith('/delay/'):
+            time.sleep(float(path.split('/')[2]))
+            return self._send(200, {"delay": path.split('/')[2]})
+        if path.startswith('/status/'):
+            return self._send(int(path.split('/')[2]), {"status": path.split('/')[2]})
+        if path == '/api/person/':
+            return self._send(200, PERSON_LIST)
+        if path.startswith('/api/person/'):
+            if request_body:
+                return self._send(200, request_body)
+            person_id = path.rstrip('/').split('/')[-1]
+            return self._send(200, {"id": person_id, "login": "user%s" % person_id})
+        if path.startswith('/bytes/'):
+            return self._send_bytes(int(path.split('/')[2]))
+        if path.startswith('/flaky/') or path.startswith('/drop/'):
+            # /flaky/<key>/<n> answers 503 to the first n requests of key, /drop/<key>/<n> closes their connection
+            _, kind, key, failures = path.split('/')[:4]
+            with self.server.lock:
+                self.server.counters[key] = self.server.counters.get(key, 0) + 1
+                count = self.server.counters[key]
+            if count > int(failures):
+                return self._send(200, {"key": key, "count": count})
+            if kind == 'drop':
+                self.close_connection = True
+                return None
+            query = dict(pair.split('=') for pair in self.path.split('?')[1].split('&')) if '?' in self.path else {}
+            headers = {'Retry-After': query['retry_after']} if 'retry_after' in query else None
+            return self._send(int(query.get('status', 503)), {"key": key, "count": count}, headers)
+        if path == '/upload':
+            return self._send(200, {"method": self.command, "size": len(request_body),
+                                    "sha256": hashlib.sha256(request_body).hexdigest()})
+        if path == '/echo':
+            return self._send(200, request_body)
+        return self._send(404, {"error": "not found"})
+
+    do_GET = _route
+    do_PUT = _route
+    do_POST = _route
+    do_PATCH = _route
+    do_DELETE = _route
+    do_HEAD = _route
+
+
+class ThreadingTestServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # Concurrent runners open many connections at once
+
+
+class LocalServer:
+    """ Runs the test server on a free localhost port in a background thread """
+
+    def __init__(self, handler=TestRequestHandler):
+        self.server = ThreadingTestServer(('127.0.0.1', 0), handler)
+        self.server.request_log = []
+        self.server.client_ports = set()  # One entry per TCP connection made to the server
+        self.server.counters = {}  # Requests made to each /flaky/ and /drop/ key
+        self.server.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:%s' % self.server.server_address[1]
+
+    @property
+    def request_log(self):
+        return self.server.request_log
+
+    @property
+    def client_ports(self):
+        return self.server.client_ports
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,88 @@
+import math
+import random
+import statistics
+import unittest
+
+from resttest3.aggregates import AGGREGATES, LogLinearHistogram, MetricAggregate, RunningStats, histogram_percent, \
+    percentile_of
+
+
+class AggregatesTest(unittest.TestCase):
+
+    def test_running_stats(self):
+        values = [0.1 * x for x in range(1, 1001)]
+        stats = RunningStats()
+        for value in values:
+            stats.add(value)
+        self.assertEqual(1000, stats.count)
+        self.assertAlmostEqual(statistics.mean(values), stats.mean)
+        self.assertAlmostEqual(statistics.pstdev(values), stats.std_deviation)
+        self.assertEqual(math.fsum(values), stats.total)
+        self.assertAlmostEqual(statistics.harmonic_mean(values), stats.mean_harmonic)
+
+        stats.add(0.0)
+        self.assertEqual(0.0, stats.mean_harmonic)
+        self.assertEqual(0.0, RunningStats().std_deviation)
+
+    def test_metric_aggregate_matches_batch(self):
+        values = [float(x % 17) + 1 for x in range(500)]
+        ordered = sorted(values)
+        expected = {'mean': statistics.mean(values), 'mean_harmonic': statistics.harmonic_mean(values),
+                    'median': ordered[249], 'std_dev': statistics.pstdev(values), 'total': math.fsum(values),
+                    'p90': ordered[449], 'p99': ordered[494]}
+        aggregate = MetricAggregate(list(expected))
+        for value in values:
+            aggregate.add(value)
+        for name, value in aggregate.values():
+            self.assertAlmostEqual(expected[name], value, msg=name)
+        self.assertEqual([('mean', 0.0)], MetricAggregate(['mean']).values())
+        self.assertIsNone(MetricAggregate(['mean', 'sum']).histogram)
+        self.assertTrue(set(expected) - {'p90', 'p99'} <= AGGREGATES)
+
+    def test_percentile_of(self):
+        self.assertEqual(99.9, percentile_of('p99.9'))
+        self.assertEqual(50.0, percentile_of('p50'))
+        self.assertIsNone(percentile_of('p101'))
+        self.assertIsNone(percentile_of('median'))
+        self.assertEqual(50.0, histogram_percent('median'))
+        self.assertEqual(99.9, histogram_percent('p99.9'))
+        self.assertIsNone(histogram_percent('mean'))
+
+    def test_histogram_precision(self):
+        rng = random.Random(7)
+        values = [rng.lognormvariate(-5, 1) for _ in range(20000)]  # Latencies around 7 ms, in seconds
+        histogram = LogLinearHistogram(unit=1e-6)
+        for value in values:
+            histogram.record(value)
+        self.assertEqual(20000, histogram.count)
+        self.assertLess(len(histogram.counts), 2000)
+        ordered = sorted(values)
+        for percent in (50, 90, 99, 99.9):
+            exact = ordered[int(math.ceil(percent / 100.0 * len(ordered))) - 1]
+            self.assertAlmostEqual(exact, histogram.percentile(percent), delta=exact * 0.01 + 1e-6)
+        self.assertEqual(max(values), histogram.percentile(100))
+        self.assertEqual(min(values), histogram.percentile(0))
+
+        small = LogLinearHistogram()
+        for value in range(1, 101):
+            small.record(value)
+        self.assertEqual(50, small.percentile(50))  # Exact below 2 ** significant_bits
+        self.assertEqual(99, small.percentile(99))
+        self.assertEqual(0.0, LogLinearHistogram().percentile(99))
+        self.assertRaises(ValueError, small.record, -1)
+
+    def test_histogram_merge(self):
+        first, second, combined = LogLinearHistogram(unit=1e-6), LogLinearHistogram(unit=1e-6), \
+            LogLinearHistogram(unit=1e-6)
+        for value in range(1, 5001):
+            (first if value % 3 else second).record(value / 1000.0)
+            combined.record(value / 1000.0)
+        first.merge(second)
+        self.assertEqual(combined.counts, first.counts)
+        self.assertEqual(combined.percentiles(), first.percentiles())
+        self.assertEqual((0.001, 5.0), (first.min, first.max))
+        self.assertRaises(ValueError, first.merge, LogLinearHistogram(unit=1.0))
+
+
+if __name__ == '__main__':
+    unittest.main()
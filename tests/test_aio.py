@@ -0,0 +1,115 @@
+import asyncio
+import time
+import unittest
+
+import pycurl
+
+from http_server import LocalServer
+from resttest3.aio import AsyncCurlMulti, AsyncRunner
+from resttest3.pool import CurlPool
+from resttest3.testcase import TestCase, TestSet
+
+
+class AsyncRunnerTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = LocalServer().start()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.stop()
+
+    def setUp(self) -> None:
+        TestSet.reset()
+        self.server.request_log.clear()
+        self.finished = []
+
+    def tearDown(self) -> None:
+        TestSet.reset()
+
+    def record(self, group_name, testcase):
+        self.finished.append((group_name, testcase.name, testcase.is_passed))
+
+    def test_invalid_concurrency(self):
+        self.assertRaises(ValueError, AsyncRunner, 0)
+
+    def test_run_async_does_not_block_loop(self):
+        testcase = TestCase(self.server.url, None, None)
+        testcase.parse({'name': 'slow', 'url': '/delay/0.3', 'delay': 1})
+        ticks = []
+
+        async def ticker():
+            while True:
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.05)
+
+        async def main():
+            tick_task = asyncio.ensure_future(ticker())
+            await testcase.run_async()
+            tick_task.cancel()
+
+        start = time.monotonic()
+        asyncio.run(main())
+        self.assertGreaterEqual(time.monotonic() - start, 1.3)
+        self.assertTrue(testcase.is_passed)
+        self.assertGreater(len(ticks), 20)  # The loop kept running during the delay and the request
+
+    def test_groups_run_concurrently(self):
+        ts = TestSet()
+        ts.parse(self.server.url, [
+            {'test': [{'name': 'slow %s' % index}, {'group': 'group %s' % index}, {'url': '/delay/0.4'}]}
+            for index in range(20)
+        ])
+        pool = CurlPool()
+        start = time.monotonic()
+        asyncio.run(ts.run_async(self.record, pool=pool))
+        self.assertLess(time.monotonic() - start, 1.5)
+        self.assertEqual(20, len(self.finished))
+        self.assertTrue(all(passed for _, _, passed in self.finished))
+        self.assertEqual(20, pool.hits + pool.misses)
+        pool.close()
+
+    def test_group_order_and_extract_binds(self):
+        ts = TestSet()
+        ts.parse(self.server.url, [
+            {'test': [{'name': 'get person'}, {'group': 'chain'}, {'url': '/api/person/7/'},
+                      {'extract_binds': [{'login': {'jsonpath_mini': 'login'}}]}]},
+            {'test': [{'name': 'use login'}, {'group': 'chain'}, {'url': {'template': '/api/person/$login/'}}]},
+            {'test': [{'name': 'missing'}, {'group': 'other'}, {'url': '/status/404'}]},
+        ])
+        asyncio.run(AsyncRunner(concurrency=1).run(ts.test_group_list_dict, self.record))
+        self.assertEqual([('chain', 'get person', True), ('chain', 'use login', True), ('other', 'missing', False)],
+                         self.finished)
+        self.assertIn('/api/person/user7/', [path for _, path in self.server.request_log])
+
+    def test_curl_error(self):
+        testcase = TestCase('http://127.0.0.1:1', None, None)
+        testcase.parse({'name': 'refused', 'url': '/'})
+        asyncio.run(testcase.run_async())
+        self.assertFalse(testcase.is_passed)
+        self.assertIn('Curl Exception', str(testcase.failures[0]))
+
+    def test_cancel(self):
+        async def main():
+            multi = AsyncCurlMulti()
+            curl_handler = pycurl.Curl()
+            curl_handler.setopt(pycurl.URL, self.server.url + '/delay/2')
+            curl_handler.setopt(pycurl.WRITEFUNCTION, lambda data: None)
+            task = asyncio.ensure_future(multi.perform(curl_handler))
+            await asyncio.sleep(0.2)
+            self.assertEqual(1, multi.in_flight)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            self.assertEqual(0, multi.in_flight)
+            multi.close()
+            curl_handler.close()
+
+        start = time.monotonic()
+        asyncio.run(main())
+        self.assertLess(time.monotonic() - start, 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
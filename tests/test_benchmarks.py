@@ -0,0 +1,267 @@
+import csv
+import io
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from http_server import LocalServer
+from resttest3.benchmarks import Benchmark, BenchmarkResult, BenchmarkWriter, AGGREGATES, metrics_to_tuples, \
+    write_benchmark_csv, write_benchmark_json
+from resttest3.binding import Context
+from resttest3.testcase import TestSet, TestCaseConfig
+
+
+class BenchmarkTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = LocalServer().start()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.stop()
+
+    def setUp(self) -> None:
+        TestSet.test_group_list_dict.clear()
+
+    def tearDown(self) -> None:
+        TestSet.test_group_list_dict.clear()
+
+    def test_parse_benchmark(self):
+        benchmark = Benchmark('', None, None)
+        benchmark.parse([
+            {'name': 'Basic get'}, {'url': '/api/person/'}, {'warmup_runs': 7}, {'benchmark_runs': '101'},
+            {'output_file': 'miniapp-benchmark.csv'}, {'output_format': 'JSON'},
+            {'metrics': ['total_time', {'total_time': 'mean'}, {'total_time': 'median'}, 'size_download',
+                         {'speed_download': 'median'}]}
+        ])
+        self.assertEqual(7, benchmark.warmup_runs)
+        self.assertEqual(101, benchmark.benchmark_runs)
+        self.assertEqual('json', benchmark.output_format)
+        self.assertEqual('miniapp-benchmark.csv', benchmark.output_file)
+        self.assertEqual({'total_time', 'size_download', 'speed_download'}, benchmark.metrics)
+        self.assertEqual({'total_time', 'size_download'}, benchmark.raw_metrics)
+        self.assertEqual({'total_time': ['mean', 'median'], 'speed_download': ['median']},
+                         benchmark.aggregated_metrics)
+
+    def test_parse_benchmark_metric_dict(self):
+        benchmark = Benchmark('', None, None)
+        benchmark.parse({'url': '/api/person/1/', 'metrics': {'speed_upload': 'median', 'total_time': ['mean', 'sum']}})
+        self.assertEqual(set(), benchmark.raw_metrics)
+        self.assertEqual({'speed_upload': ['median'], 'total_time': ['mean', 'sum']}, benchmark.aggregated_metrics)
+
+    def test_parse_benchmark_errors(self):
+        benchmark = Benchmark('', None, None)
+        self.assertRaises(ValueError, benchmark.add_metric, 'not_a_metric')
+        self.assertRaises(ValueError, benchmark.add_metric, 'total_time', 'not_an_aggregate')
+        self.assertRaises(ValueError, benchmark.parse, {'url': '/', 'output_format': 'xml'})
+        self.assertRaises(TypeError, benchmark.parse, {'url': '/', 'metrics': 5})
+
+    def test_aggregates(self):
+        self.assertEqual({'mean', 'mean_arithmetic', 'mean_harmonic', 'median', 'std_dev', 'std_deviation', 'sum',
+                          'total'}, AGGREGATES)
+        benchmark = Benchmark('', None, None)
+        benchmark.add_metric('total_time', 'Median').add_metric('total_time', 'p99.9')
+        self.assertEqual({'total_time': ['median', 'p99.9']}, benchmark.aggregated_metrics)
+
+    def test_metrics_to_tuples(self):
+        rows = metrics_to_tuples({'total_time': [1.0, 2.0], 'size_download': [10.0, 20.0]})
+        self.assertEqual([('size_download', 'total_time'), (10.0, 1.0), (20.0, 2.0)], rows)
+        self.assertRaises(TypeError, metrics_to_tuples, [1, 2])
+
+    def test_write_benchmark(self):
+        result = BenchmarkResult(name='bench', group='group')
+        result.results = {'total_time': [1.0, 2.0]}
+        result.aggregates = [('total_time', 'mean', 1.5)]
+
+        out = io.StringIO()
+        write_benchmark_json(out, result)
+        self.assertEqual({'name': 'bench', 'group': 'group', 'metrics': ['total_time'], 'results': [[1.0], [2.0]],
+                          'failures': 0, 'requests': 0, 'elapsed': 0.0, 'achieved_rate': 0.0, 'target_rate': None,
+                          'aggregates': [['total_time', 'mean', 1.5]], 'histograms': {}},
+                         json.loads(out.getvalue()))
+
+        out = io.StringIO()
+        write_benchmark_csv(out, result)
+        rows = list(csv.reader(io.StringIO(out.getvalue())))
+        self.assertEqual(['Benchmark', 'bench'], rows[0])
+        self.assertEqual(['total_time'], rows[3])
+        self.assertEqual(['2.0'], rows[5])
+        self.assertEqual(['Failures', '0'], rows[6])
+        self.assertEqual(['total_time', 'mean', '1.5'], rows[-1])
+        self.assertRaises(TypeError, BenchmarkWriter, io.StringIO(), result, ['total_time'])  # Abstract
+
+    def test_run_benchmark_streaming(self):
+        for output_format in ('csv', 'json'):
+            with tempfile.TemporaryDirectory() as directory:
+                output_file = os.path.join(directory, 'benchmark.' + output_format)
+                benchmark = Benchmark(self.server.url, None, None)
+                benchmark.parse({
+                    'name': 'Streamed', 'url': '/api/person/', 'warmup_runs': 0, 'benchmark_runs': 5,
+                    'output_file': output_file, 'output_format': output_format,
+                    'metrics': ['size_download', {'total_time': ['mean', 'p99.9']}]
+                })
+                result = benchmark.run()
+                self.assertEqual({}, result.results)  # Raw values only went to the file
+                self.assertEqual(['mean', 'p99.9'], [aggregate for _, aggregate, _ in result.aggregates])
+                with open(output_file) as f:
+                    if output_format == 'json':
+                        output = json.load(f)
+                        self.assertEqual(['size_download'], output['metrics'])
+                        self.assertEqual(5, len(output['results']))
+                        self.assertEqual(0, output['failures'])
+                        self.assertEqual(2, len(output['aggregates']))
+                        self.assertEqual(5, output['histograms']['total_time']['count'])
+                        self.assertEqual(100, output['histograms']['size_download']['percentiles'][-1][0])
+                    else:
+                        rows = list(csv.reader(f))
+                        self.assertEqual(['size_download'], rows[3])
+                        self.assertEqual(5, len(rows[4:9]))
+                        self.assertEqual(['Failures', '0'], rows[9])
+                        self.assertEqual(['Requests', '5'], rows[10])
+                        self.assertEqual(['Percentiles', ''], rows[16])
+                        self.assertEqual(['size_download', '5'], rows[18][:2])
+
+    def test_run_benchmark(self):
+        benchmark = Benchmark(self.server.url, None, None)
+        benchmark.parse({
+            'name': 'Basic get', 'url': '/api/person/', 'warmup_runs': 2, 'benchmark_runs': 5,
+            'metrics': ['total_time', 'size_download', {'total_time': 'mean'}, {'size_download': 'total'}]
+        })
+        result = benchmark.run()
+        self.assertEqual(0, result.failures)
+        self.assertEqual(5, len(result.results['total_time']))
+        self.assertEqual(5, len(result.results['size_download']))
+        aggregates = {(m, a): v for m, a, v in result.aggregates}
+        self.assertGreater(aggregates[('total_time', 'mean')], 0)
+        self.assertEqual({'total_time', 'size_download'}, set(result.histograms))
+        self.assertEqual(5, result.histograms['total_time'].count)
+        self.assertEqual(result.results['size_download'][0], result.histograms['size_download'].percentile(99.9))
+        self.assertEqual(5 * result.results['size_download'][0], aggregates[('size_download', 'total')])
+
+    def test_run_benchmark_generator_binds(self):
+        config = TestCaseConfig()
+        config.parse([{'generators': [{'id': {'type': 'number_sequence', 'start': 10}}]}])
+        context = Context()
+        benchmark = Benchmark(self.server.url, None, None, context=context, config=config)
+        benchmark.parse({
+            'name': 'Create person', 'url': {'template': '/api/person/$id/'}, 'method': 'PUT',
+            'generator_binds': {'id': 'id'}, 'warmup_runs': 0, 'benchmark_runs': 3,
+            'body': {'template': '{"id": "$id"}'}, 'metrics': {'total_time': 'mean'}
+        })
+        self.server.request_log.clear()
+        result = benchmark.run()
+        self.assertEqual(0, result.failures)
+        self.assertEqual([('PUT', '/api/person/10/'), ('PUT', '/api/person/11/'), ('PUT', '/api/person/12/')],
+                         self.server.request_log)
+
+    def test_run_benchmark_failures(self):
+        benchmark = Benchmark('http://127.0.0.1:1', None, None)
+        benchmark.parse({'url': '/', 'warmup_runs': 0, 'benchmark_runs': 2, 'metrics': {'total_time': 'mean'}})
+        result = benchmark.run()
+        self.assertEqual(2, result.failures)
+        self.assertEqual([('total_time', 'mean', 0.0)], result.aggregates)
+
+    def test_parse_open_loop(self):
+        benchmark = Benchmark('', None, None)
+        benchmark.parse({'url': '/', 'rate': 50, 'duration': '2.5', 'concurrency': 4,
+                         'metrics': {'latency': 'p99'}})
+        self.assertTrue(benchmark.is_open_loop)
+        self.assertEqual(125, benchmark.open_loop_runs)
+        self.assertEqual(4, benchmark.concurrency)
+        self.assertEqual({'latency': ['p99']}, benchmark.aggregated_metrics)
+        self.assertRaises(ValueError, benchmark.parse, {'url': '/', 'rate': 0})
+
+        benchmark = Benchmark('', None, None)
+        benchmark.parse({'url': '/', 'rate': 10, 'benchmark_runs': 7})
+        self.assertEqual(7, benchmark.open_loop_runs)
+        self.assertFalse(Benchmark('', None, None).is_open_loop)
+
+    def test_run_open_loop(self):
+        benchmark = Benchmark(self.server.url, None, None)
+        benchmark.parse({
+            'name': 'Constant rate', 'url': '/delay/0.1', 'warmup_runs': 0, 'rate': 40, 'duration': 0.5,
+            'metrics': ['latency', {'latency': 'p50'}, 'total_time']
+        })
+        self.server.request_log.clear()
+        start = time.monotonic()
+        result = benchmark.run()
+        elapsed = time.monotonic() - start
+        self.assertEqual(0, result.failures)
+        self.assertEqual(20, result.requests)
+        self.assertEqual(20, len(self.server.request_log))
+        # Requests overlap instead of queueing behind each 100 ms response
+        self.assertLess(elapsed, 1.5)
+        self.assertEqual(40, result.target_rate)
+        self.assertGreater(result.achieved_rate, 20)
+        self.assertGreaterEqual(min(result.results['latency']), 0.1)
+        self.assertEqual(20, result.histograms['latency'].count)
+
+    def test_open_loop_counts_queueing(self):
+        # One request in flight at a time and 100 ms responses: requests due every 25 ms wait to be sent,
+        # the time they waited is part of their latency but not of total_time
+        benchmark = Benchmark(self.server.url, None, None)
+        benchmark.parse({'url': '/delay/0.1', 'warmup_runs': 0, 'rate': 40, 'benchmark_runs': 6, 'concurrency': 1,
+                         'metrics': ['latency', 'total_time']})
+        result = benchmark.run()
+        self.assertEqual(6, result.requests)
+        self.assertGreater(result.results['latency'][-1], 0.3)
+        self.assertLess(max(result.results['total_time']), 0.3)
+        self.assertLess(result.achieved_rate, 15)
+
+    def test_run_load_profile(self):
+        config = TestCaseConfig()
+        config.parse([{'generators': [{'id': {'type': 'number_sequence', 'start': 1}}]}])
+        with tempfile.TemporaryDirectory() as directory:
+            output_file = os.path.join(directory, 'profile.json')
+            benchmark = Benchmark(self.server.url, None, None, context=Context(), config=config)
+            benchmark.parse({
+                'name': 'Profile', 'url': {'template': '/api/person/$id/'}, 'generator_binds': {'id': 'id'},
+                'warmup_runs': 0, 'output_file': output_file, 'output_format': 'json',
+                'metrics': [{'latency': ['mean', 'p99']}],
+                'load_profile': [
+                    {'stage': {'name': 'ramp', 'ramp_from': 20, 'rate': 60, 'duration': 0.5}},
+                    {'stage': {'name': 'users', 'concurrency': 3, 'duration': 0.3}},
+                ]
+            })
+            self.server.request_log.clear()
+            result = benchmark.run()
+            with open(output_file) as f:
+                output = json.load(f)
+
+        self.assertEqual(['ramp', 'users'], [stage.name for stage in result.stages])
+        ramp, users = result.stages
+        self.assertEqual(20, ramp.requests)
+        self.assertEqual(40, ramp.target_rate)
+        self.assertIsNone(users.target_rate)
+        self.assertGreater(users.requests, 3)
+        self.assertEqual(ramp.requests + users.requests, result.requests)
+        self.assertEqual(0, result.failures)
+        self.assertEqual(result.requests, result.histograms['latency'].count)
+        # The whole run histograms are the stage histograms merged
+        self.assertEqual((ramp.requests, users.requests),
+                         (ramp.histograms['latency'].count, users.histograms['latency'].count))
+        self.assertEqual(max(ramp.histograms['latency'].max, users.histograms['latency'].max),
+                         result.histograms['latency'].max)
+        self.assertEqual(['mean', 'p99'], [aggregate for _, aggregate, _ in users.aggregates])
+
+        # Every request of every stage and virtual user got its own id from the shared generator
+        paths = [path for _, path in self.server.request_log]
+        self.assertEqual(result.requests, len(set(paths)))
+        self.assertEqual(['ramp', 'users'], [stage['name'] for stage in output['stages']])
+        self.assertEqual(20, output['stages'][0]['requests'])
+
+    def test_testset_parse_benchmark(self):
+        ts = TestSet()
+        ts.parse('', [{'benchmark': [{'name': 'Basic get'}, {'url': '/api/person/'}, {'group': 'bench'},
+                                     {'metrics': ['total_time']}]}])
+        group = ts.test_group_list_dict['bench']
+        self.assertEqual(0, len(group.testcase_list))
+        self.assertEqual(1, len(group.benchmark_list))
+        self.assertIsInstance(group.benchmark_list[0], Benchmark)
+
+
+if __name__ == '__main__':
+    unittest.main()
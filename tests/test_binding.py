@@ -1,6 +1,6 @@
 import unittest
 
-from resttest3.binding import Context
+from resttest3.binding import Context, ContextTemplate
 
 
 def count_gen():  # Generator that counts up from 1
@@ -66,6 +66,26 @@ class BindingTest(unittest.TestCase):
         self.assertEqual(1, context.get_value('foo'))
         self.assertEqual(2, context.mod_count)
 
+    def test_context_template(self):
+        """ Renders are reused until the context is modified """
+        context = Context()
+        context.bind_variable('id', 1)
+        template = ContextTemplate('/api/person/$id/')
+        rendered = template.render(context)
+        self.assertEqual('/api/person/1/', rendered)
+        self.assertIs(rendered, template.render(context))
+
+        context.bind_variable('id', 1)  # Same value, no modification
+        self.assertIs(rendered, template.render(context))
+        context.bind_variable('id', 2)
+        self.assertEqual('/api/person/2/', template.render(context))
+
+        other_context = Context()
+        other_context.bind_variables({'id': 3, 'name': 'x'})  # Same mod_count, different context
+        self.assertEqual(context.mod_count, other_context.mod_count)
+        self.assertEqual('/api/person/3/', template.render(other_context))
+        self.assertEqual('/api/person/$id/', str(template))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,11 +1,17 @@
 # -*- coding: utf-8 -*-
+import hashlib
 import json
 import os
+import pickle
 import string
+import tempfile
 import unittest
+from unittest import mock
 
+from http_server import LocalServer
 from resttest3.binding import Context
 from resttest3.contenthandling import ContentHandler
+from resttest3.testcase import TestCase
 
 
 class ContentHandlerTest(unittest.TestCase):
@@ -215,6 +221,73 @@ class ContentHandlerTest(unittest.TestCase):
             except Exception:
                 pass
 
+    def test_static_file_reader(self):
+        with tempfile.NamedTemporaryFile('wb', delete=False) as f:
+            f.write(b'0123456789')
+        self.addCleanup(os.remove, f.name)
+        handler = ContentHandler.parse_content({'file': f.name})
+        self.assertTrue(handler.is_static_file())
+        self.assertFalse(ContentHandler.parse_content({'template': {'file': f.name}}).is_static_file())
+        self.assertFalse(ContentHandler.parse_content('inline').is_static_file())
+
+        reader, other = handler.open_reader(), handler.open_reader()
+        self.assertEqual(10, len(reader))
+        self.assertEqual(b'0123', reader.read(4))
+        self.assertEqual(b'0123456789', other.read(100))  # Readers keep their own offset
+        self.assertEqual(b'456789', reader.read(100))
+        self.assertEqual(b'', reader.read(100))
+        self.assertEqual(0, reader.seek(2))
+        self.assertEqual(b'23', reader.read(2))
+        self.assertEqual(0, reader.seek(-1, os.SEEK_END))
+        self.assertEqual(b'9', reader.read(10))
+        self.assertEqual(1, reader.seek(11))
+
+        with open(f.name, 'wb') as changed:
+            changed.write(b'changed, longer')
+        self.assertEqual(b'changed, longer', handler.open_reader().read(100))
+        self.assertIsNone(pickle.loads(pickle.dumps(handler))._mapping)
+
+        with open(f.name, 'wb'):
+            pass
+        self.assertEqual(b'', handler.open_reader().read(100))
+
+
+class FileUploadTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = LocalServer().start()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.stop()
+
+    def test_file_not_read_into_memory(self):
+        content = os.urandom(3 * (1 << 20) + 7)
+        with tempfile.NamedTemporaryFile('wb', delete=False) as f:
+            f.write(content)
+        self.addCleanup(os.remove, f.name)
+        expected = {'size': len(content), 'sha256': hashlib.sha256(content).hexdigest()}
+
+        for method in ('PUT', 'POST', 'PATCH', 'DELETE'):
+            testcase = TestCase(self.server.url, None, None)
+            testcase.parse({'url': '/upload', 'method': method, 'body': {'file': f.name}})
+            with mock.patch.object(ContentHandler, 'get_content', side_effect=AssertionError("file read")):
+                testcase.run()
+                testcase.run()  # The handler still holds the file, not its content
+            self.assertTrue(testcase.is_passed, [str(failure) for failure in testcase.failures])
+            self.assertEqual(dict(expected, method=method), testcase.response.json)
+
+    def test_templated_file_body(self):
+        with tempfile.NamedTemporaryFile('w', delete=False) as f:
+            f.write('{"login": "$login"}')
+        self.addCleanup(os.remove, f.name)
+        testcase = TestCase(self.server.url, None, None)
+        testcase.parse({'url': '/echo', 'method': 'POST', 'body': {'template': {'file': f.name}}})
+        testcase.context.bind_variable('login', 'gaius')
+        testcase.run()
+        self.assertEqual({'login': 'gaius'}, testcase.response.json)
+
 
 if __name__ == '__main__':
     unittest.main()
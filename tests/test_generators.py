@@ -1,7 +1,10 @@
+import itertools
 import os
+import random
 import string
 import types
 import unittest
+from unittest import mock
 
 import pytest
 
@@ -291,6 +294,47 @@ class GeneratorTest(unittest.TestCase):
         self.generator_basic_test(gen)
         del config['type']
 
+    def test_seeded_generators(self):
+        """ A seed makes the random generators reproducible, secure ones use SystemRandom and cannot be seeded """
+        configs = [{'type': 'random_int'},
+                   {'type': 'random_text', 'min_length': 1, 'max_length': 12},
+                   {'type': 'random_text', 'character_set': 'hex_lower', 'length': 5},
+                   {'type': 'choice', 'values': ['a', 'b', 'c']}]
+        for config in configs:
+            seeded = [list(itertools.islice(generators.parse_generator(dict(config, seed=seed)), 3000))
+                      for seed in (42, 42, 'other')]
+            self.assertEqual(seeded[0], seeded[1], config)
+            self.assertNotEqual(seeded[0], seeded[2], config)
+            self.assertRaises(ValueError, generators.parse_generator, dict(config, seed=1, secure=True))
+            secure = generators.parse_generator(dict(config, secure='true'))
+            self.assertEqual(type(seeded[0][0]), type(next(secure)))
+
+        values = list(itertools.islice(generators.parse_generator(configs[0]), 5000))
+        self.assertTrue(all(0 <= value <= generators.INT32_MAX_VALUE for value in values))
+        self.assertGreater(max(values), generators.INT32_MAX_VALUE // 2)
+        lengths = {len(text) for text in itertools.islice(generators.parse_generator(configs[1]), 5000)}
+        self.assertEqual(set(range(1, 13)), lengths)
+        texts = list(itertools.islice(generators.parse_generator(configs[2]), 5000))
+        self.assertTrue(all(len(text) == 5 and set(text) <= set('0123456789abcdef') for text in texts))
+
+    def test_batched_generators(self):
+        """ Fast generators draw a batch of values at once, seeded batches give the same values one after the other """
+        choice = generators.parse_generator({'type': 'choice', 'values': list(range(100)), 'seed': 7})
+        rng = random.Random(7)
+        expected = rng.choices(list(range(100)), k=generators.BATCH_SIZE)
+        expected += rng.choices(list(range(100)), k=generators.BATCH_SIZE)
+        self.assertEqual(expected, list(itertools.islice(choice, 2 * generators.BATCH_SIZE)))
+
+        configs = [{'type': 'random_int'},
+                   {'type': 'random_text', 'length': 16},
+                   {'type': 'choice', 'values': list(range(100))}]
+        for config in configs:
+            with mock.patch.object(generators.random, 'SystemRandom', wraps=random.SystemRandom) as system_random:
+                next(generators.parse_generator(dict(config, secure=True)))
+                system_random.assert_called_once_with()
+                next(generators.parse_generator(dict(config, seed=1)))
+                system_random.assert_called_once_with()  # Not for a fast generator
+
 
 if __name__ == '__main__':
     unittest.main()
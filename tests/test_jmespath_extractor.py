@@ -17,6 +17,18 @@ class MTestJMESPathExtractor(unittest.TestCase):
         self.assertEqual(data, 23)
         self.assertRaises(ValueError, self.ext.extract_internal, 'test', None, 'abc')
 
+    def test_compiled_query(self):
+        ext = JMESPathExtractor.parse('people[?age > `20`].name')
+        plan = ext.compiled_query('people[?age > `20`].name')
+        self.assertIs(plan, ext.compiled_query(ext.query))
+        body = '{"people": [{"name": "a", "age": 3}, {"name": "b", "age": 30}]}'
+        self.assertEqual(['b'], ext.extract_internal(ext.query, body))
+        self.assertRaises(ValueError, JMESPathExtractor.parse, 'people[?')
+
+        # Templated queries are compiled once per rendered query
+        templated = JMESPathExtractor.parse({'template': 'people[$index].name'})
+        self.assertIs(templated.compiled_query('people[1].name'), templated.compiled_query('people[1].name'))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,85 @@
+import json
+import tempfile
+import unittest
+from unittest import mock
+
+from resttest3 import jsonstream, validators
+from resttest3.jsonstream import MISSING, find_path
+from resttest3.response import SpooledBody
+from resttest3.validators import MiniJsonExtractor
+
+DOCUMENT = {
+    "count": 3,
+    "next": None,
+    "tricky": "quote \" brace } bracket ] backslash \\",
+    "items": [
+        {"id": 17, "tags": ["a", "b"], "meta": {"empty": {}, "list": [[], [1, [2]]]}},
+        {"id": 18, "name": "café 😀", "ok": True},
+        {"id": 19, "price": -1.5e3, "nested": {"deep": [{"x": False}]}},
+    ],
+    "last": "end",
+}
+
+
+def split(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+class JsonStreamTest(unittest.TestCase):
+
+    def find(self, document, query, chunk_size=None):
+        data = json.dumps(document, indent=1).encode('utf-8')
+        steps = MiniJsonExtractor.compile_query(query)
+        return find_path(split(data, chunk_size) if chunk_size else [data], steps)
+
+    def test_same_as_jsonpath_mini(self):
+        queries = ['count', 'next', 'tricky', 'items', 'items.0.id', 'items.0.tags.1', 'items.0.meta.empty',
+                   'items.0.meta.list.1.1.0', 'items.1.name', 'items.1.ok', 'items.2.price',
+                   'items.2.nested.deep.0.x', 'items.-1.id', 'last', '']
+        for query in queries:
+            expected = MiniJsonExtractor.query_dictionary(query, DOCUMENT)
+            for chunk_size in (None, 1, 2, 7, 64):
+                self.assertEqual(expected, self.find(DOCUMENT, query, chunk_size), (query, chunk_size))
+
+    def test_large_items_walked(self):
+        # Skipped containers over the limit are walked item by item instead of decoded at once
+        with mock.patch.object(jsonstream, 'DECODE_LIMIT', 8):
+            self.test_same_as_jsonpath_mini()
+
+    def test_missing_path(self):
+        for query in ('missing', 'items.3', 'items.id', 'count.0', 'items.0.meta.empty.x', 'items.-4'):
+            self.assertIs(MISSING, self.find(DOCUMENT, query, 5), query)
+        self.assertIs(MISSING, self.find([], '0'))
+        self.assertEqual(2, self.find(2, ''))
+
+    def test_stops_once_resolved(self):
+        def chunks():
+            yield b'{"items": [{"id": 1}, {"id": 2, "big": ['
+            yield b'1, 2, 3'
+            raise AssertionError("Read past the requested value")
+
+        self.assertEqual(1, find_path(chunks(), ('items', 0, 'id')))
+        self.assertEqual({"id": 1}, find_path(chunks(), ('items', 0)))
+
+    def test_invalid_json(self):
+        for data in (b'', b'   ', b'{"a": 1', b'{"a" 1}', b'{"a": 1 "b": 2}', b'{"a": "unterminated'):
+            self.assertRaises(ValueError, find_path, [data], ('b',))
+
+    def test_extractor(self):
+        extractor = validators.parse_extractor('jsonpath_stream', 'items.1.id')
+        data = json.dumps(DOCUMENT).encode('utf-8')
+        self.assertEqual(18, extractor.extract(body=data))
+        self.assertEqual(18, extractor.extract(body=data.decode('utf-8')))
+
+        spool = tempfile.TemporaryFile()
+        spool.write(data)
+        self.assertEqual(18, extractor.extract(body=SpooledBody(spool)))
+        spool.close()
+
+        self.assertIsNone(validators.parse_extractor('jsonpath_stream', 'items.9').extract(body=data))
+        validator = validators.parse_validator('compare', {'jsonpath_stream': 'last', 'expected': 'end'})
+        self.assertTrue(validator.validate(body=data))
+
+
+if __name__ == '__main__':
+    unittest.main()
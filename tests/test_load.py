@@ -0,0 +1,118 @@
+import threading
+import unittest
+
+import pycurl
+
+from http_server import LocalServer
+from resttest3.load import ConcurrencyScheduler, LoadStage, MultiScheduler, OpenLoopScheduler, linear_ramp, \
+    parse_load_profile
+from resttest3.pool import CurlPool
+
+
+class OpenLoopSchedulerTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = LocalServer().start()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.stop()
+
+    def test_invalid_rate(self):
+        self.assertRaises(ValueError, OpenLoopScheduler.constant, 0, 10)
+        self.assertRaises(TypeError, MultiScheduler)  # Abstract
+
+    def test_schedule(self):
+        url = self.server.url + '/api/person/'
+        pool = CurlPool()
+        finished = []
+
+        def prepare(curl_handler):
+            curl_handler.setopt(pycurl.URL, url)
+            curl_handler.setopt(pycurl.WRITEFUNCTION, lambda data: None)
+
+        def finish(curl_handler, due_time, done_time, error):
+            finished.append((due_time, done_time, error, curl_handler.getinfo(pycurl.RESPONSE_CODE)))
+
+        scheduler = OpenLoopScheduler.constant(100, 10, concurrency=2, pool=pool, url=url)
+        scheduler.run(prepare, finish)
+        self.assertEqual(10, scheduler.sent)
+        self.assertEqual(10, len(finished))
+        self.assertTrue(all(error is None and code == 200 for _, _, error, code in finished))
+        due_list = sorted(due for due, _, _, _ in finished)
+        self.assertAlmostEqual(0.09, due_list[-1] - due_list[0], places=6)  # Due every 10 ms
+        self.assertTrue(all(done >= due for due, done, _, _ in finished))
+        self.assertGreater(scheduler.achieved_rate, 0)
+        self.assertEqual(0, pool.stats()['in_use'])
+        self.assertLessEqual(pool.stats()['idle'], 2)
+        pool.close()
+
+    def test_errors_are_reported(self):
+        errors = []
+
+        def prepare(curl_handler):
+            curl_handler.setopt(pycurl.URL, 'http://127.0.0.1:1/')
+
+        scheduler = OpenLoopScheduler.constant(50, 3)
+        scheduler.run(prepare, lambda curl_handler, due, done, error: errors.append(error))
+        self.assertEqual(3, len(errors))
+        self.assertTrue(all(isinstance(error, pycurl.error) for error in errors))
+
+    def test_linear_ramp(self):
+        offsets = list(linear_ramp(10, 30, 2))
+        self.assertEqual(40, len(offsets))  # Average rate 20/s over 2 s
+        self.assertEqual(0.0, offsets[0])
+        self.assertEqual(sorted(offsets), offsets)
+        self.assertLess(offsets[-1], 2.0)
+        first_second = len([offset for offset in offsets if offset < 1.0])
+        self.assertEqual(15, first_second)  # 10/s rising to 20/s
+        self.assertEqual([0.0, 0.1, 0.2], [round(x, 6) for x in linear_ramp(10, 10, 0.3)])
+
+    def test_parse_load_profile(self):
+        stage_list = parse_load_profile([
+            {'stage': {'name': 'warm', 'rate': 20, 'duration': 1}},
+            {'ramp_from': 20, 'rate': 60, 'duration': 2, 'hold': 1},
+            [{'concurrency': 8}, {'duration': 3}, {'ramp_from': 1}],
+        ])
+        self.assertEqual(['warm', 'stage 2', 'stage 3'], [stage.name for stage in stage_list])
+        self.assertEqual(20, stage_list[0].target_rate)
+        self.assertEqual(20, len(list(stage_list[0].schedule())))
+        self.assertEqual(3, stage_list[1].total_duration)
+        self.assertEqual(140, len(list(stage_list[1].schedule())))  # 80 while ramping, 60 while holding
+        self.assertAlmostEqual(140 / 3.0, stage_list[1].target_rate)
+        self.assertIsNone(stage_list[2].target_rate)
+        self.assertEqual(1, stage_list[2].concurrency_at(0))
+        self.assertEqual(5, stage_list[2].concurrency_at(1.6))
+        self.assertEqual(8, stage_list[2].concurrency_at(3))
+
+        self.assertRaises(ValueError, parse_load_profile, [])
+        self.assertRaises(ValueError, LoadStage, duration=1)
+        self.assertRaises(ValueError, LoadStage, duration=1, rate=1, concurrency=1)
+        self.assertRaises(ValueError, LoadStage, duration=0, rate=1)
+        self.assertRaises(ValueError, LoadStage.parse, {'rate': 1, 'duration': 1, 'users': 5})
+
+    def test_concurrency_scheduler(self):
+        url = self.server.url + '/delay/0.1'
+        in_flight = []
+        lock = threading.Lock()
+
+        def prepare(curl_handler):
+            curl_handler.setopt(pycurl.URL, url)
+            curl_handler.setopt(pycurl.WRITEFUNCTION, lambda data: None)
+
+        def finish(curl_handler, due_time, done_time, error):
+            with lock:
+                in_flight.append(error)
+
+        scheduler = ConcurrencyScheduler(lambda elapsed: 4, 0.35)
+        scheduler.run(prepare, finish)
+        # 4 users, each doing about one request per 100 ms for 350 ms
+        self.assertGreaterEqual(scheduler.sent, 12)
+        self.assertLessEqual(scheduler.sent, 20)
+        self.assertEqual(scheduler.sent, len(in_flight))
+        self.assertTrue(all(error is None for error in in_flight))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import time
+import unittest
+
+from http_server import LocalServer
+from resttest3.parallel import ParallelRunner
+from resttest3.testcase import TestSet
+
+
+class ParallelRunnerTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = LocalServer().start()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.stop()
+
+    def setUp(self) -> None:
+        TestSet.test_group_list_dict.clear()
+        self.server.request_log.clear()
+        self.finished = []
+
+    def tearDown(self) -> None:
+        TestSet.test_group_list_dict.clear()
+
+    def record(self, group_name, testcase):
+        self.finished.append((group_name, testcase.name, testcase.is_passed))
+
+    def test_invalid_concurrency(self):
+        self.assertRaises(ValueError, ParallelRunner, 0)
+
+    def test_groups_run_concurrently(self):
+        ts = TestSet()
+        ts.parse(self.server.url, [
+            {'test': [{'name': 'slow %s' % index}, {'group': 'group %s' % index}, {'url': '/delay/0.4'}]}
+            for index in range(4)
+        ])
+        start = time.monotonic()
+        ParallelRunner(4).run(ts.test_group_list_dict, self.record)
+        elapsed = time.monotonic() - start
+        self.assertEqual(4, len(self.finished))
+        self.assertTrue(all(passed for _, _, passed in self.finished))
+        self.assertLess(elapsed, 1.2)
+
+    def test_group_order_and_extract_binds(self):
+        ts = TestSet()
+        ts.parse(self.server.url, [
+            {'test': [{'name': 'get person'}, {'group': 'chain'}, {'url': '/api/person/7/'},
+                      {'extract_binds': [{'login': {'jsonpath_mini': 'login'}}]}]},
+            {'test': [{'name': 'slow'}, {'group': 'other'}, {'url': '/delay/0.1'}]},
+            {'test': [{'name': 'use login'}, {'group': 'chain'}, {'url': {'template': '/api/person/$login/'}}]},
+            {'test': [{'name': 'missing'}, {'group': 'other'}, {'url': '/status/404'}]},
+        ])
+        ParallelRunner(2).run(ts.test_group_list_dict, self.record)
+
+        chain = [(name, passed) for group, name, passed in self.finished if group == 'chain']
+        other = [(name, passed) for group, name, passed in self.finished if group == 'other']
+        self.assertEqual([('get person', True), ('use login', True)], chain)
+        self.assertEqual([('slow', True), ('missing', False)], other)
+        chain_requests = [path for _, path in self.server.request_log if path.startswith('/api/person/')]
+        self.assertEqual(['/api/person/7/', '/api/person/user7/'], chain_requests)
+
+    def test_curl_error(self):
+        ts = TestSet()
+        ts.parse('http://127.0.0.1:1', [{'test': [{'name': 'refused'}, {'url': '/'}]}])
+        ParallelRunner(2).run(ts.test_group_list_dict, self.record)
+        self.assertEqual([('NO GROUP', 'refused', False)], self.finished)
+        testcase = ts.test_group_list_dict['NO GROUP'].testcase_list[0]
+        self.assertTrue(str(testcase.failures[0]).startswith('Curl Exception'))
+
+
+if __name__ == '__main__':
+    unittest.main()
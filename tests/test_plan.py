@@ -0,0 +1,122 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import yaml
+
+from http_server import LocalServer
+from resttest3 import plan as plan_module
+from resttest3.plan import PlanCache
+from resttest3.testcase import TestSet
+from resttest3.utils import YamlLoader, read_testcase_file
+
+MAIN = [
+    {'config': [{'generators': [{'person': {'type': 'number_sequence', 'start': 3}}]}]},
+    {'include': ['people']},
+    {'test': [{'name': 'get person'}, {'group': 'chain'}, {'url': {'template': '/api/person/$id/'}},
+              {'generator_binds': {'id': 'person'}},
+              {'validators': [{'compare': {'jsonpath_mini': 'login', 'comparator': 'contains', 'expected': 'user'}},
+                              {'extract_test': {'jsonpath_mini': 'id', 'test': 'exists'}}]},
+              {'extract_binds': [{'login': {'jsonpath_mini': 'login'}}]}]},
+    {'test': [{'name': 'use login'}, {'group': 'chain'}, {'url': {'template': '/api/person/$login/'}}]},
+]
+PEOPLE = [{'test': [{'name': 'list'}, {'group': 'people'}, {'url': '/api/person/'}]}]
+
+
+class PlanCacheTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = LocalServer().start()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.stop()
+
+    def setUp(self) -> None:
+        TestSet.reset()
+        self.server.request_log.clear()
+        self.directory = tempfile.TemporaryDirectory()
+        self.test_file = Path(self.directory.name).joinpath('main.yaml')
+        self.include_file = Path(self.directory.name).joinpath('people.yaml')
+        self.write(self.test_file, MAIN)
+        self.write(self.include_file, PEOPLE)
+
+    def tearDown(self) -> None:
+        TestSet.reset()
+        self.directory.cleanup()
+
+    @staticmethod
+    def write(path, content):
+        with open(path, 'w') as f:
+            yaml.safe_dump(content, f)
+
+    def parse(self, plan_cache, base_url=None):
+        TestSet.reset()
+        testcase_set = TestSet()
+        testcase_set.parse_file(base_url or self.server.url, self.test_file, plan_cache=plan_cache)
+        return testcase_set
+
+    def test_c_loader(self):
+        self.assertIs(getattr(yaml, 'CSafeLoader', yaml.SafeLoader), YamlLoader)
+        self.assertEqual(MAIN, read_testcase_file(str(self.test_file)))
+
+    def test_plan_reused(self):
+        plan_cache = PlanCache()
+        self.parse(plan_cache)
+        self.assertEqual((0, 1), (plan_cache.hits, plan_cache.misses))
+        self.assertTrue(plan_cache.plan_path(self.test_file).is_file())
+        self.assertEqual('.main.yaml.plan', plan_cache.plan_path(self.test_file).name)
+
+        with mock.patch.object(TestSet, 'parse', side_effect=AssertionError("parsed again")):
+            testcase_set = self.parse(plan_cache)
+        self.assertEqual((1, 1), (plan_cache.hits, plan_cache.misses))
+        self.assertEqual([str(self.include_file.resolve())], testcase_set.parsed_files)
+        self.assertEqual(['people', 'chain'], list(TestSet.test_group_list_dict.keys()))
+
+        # The restored tests run: generators, comparators, tests and extract binds all work
+        for group in TestSet.test_group_list_dict.values():
+            for testcase in group.testcase_list:
+                testcase.run()
+                self.assertTrue(testcase.is_passed, testcase.failures)
+        paths = [path for _, path in self.server.request_log]
+        self.assertEqual(['/api/person/', '/api/person/3/', '/api/person/user3/'], paths)
+
+    def test_plan_invalidated(self):
+        plan_cache = PlanCache()
+        self.parse(plan_cache)
+
+        stat = os.stat(self.include_file)
+        os.utime(self.include_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+        self.parse(plan_cache)
+        self.assertEqual(1, plan_cache.hits)  # Touched, content unchanged
+
+        self.parse(plan_cache, base_url='http://localhost:1')
+        self.assertEqual(2, plan_cache.misses)
+
+        self.write(self.include_file, PEOPLE + [{'test': [{'name': 'more'}, {'group': 'people'}, {'url': '/'}]}])
+        self.parse(plan_cache)
+        self.assertEqual(3, plan_cache.misses)
+        self.assertEqual(2, len(TestSet.test_group_list_dict['people'].testcase_list))
+
+        os.remove(self.include_file)
+        self.assertIsNone(plan_cache.load(self.test_file, self.server.url))
+
+    def test_plan_not_stored(self):
+        plan_cache = PlanCache(directory=self.directory.name)
+        with mock.patch.object(plan_module.pickle, 'dumps', side_effect=TypeError("cannot pickle")):
+            self.parse(plan_cache)
+        self.assertFalse(plan_cache.plan_path(self.test_file).exists())
+        self.assertEqual(2, len(TestSet.test_group_list_dict))
+
+        with open(plan_cache.plan_path(self.test_file), 'wb') as f:
+            f.write(b'not a pickle')
+        self.parse(plan_cache)
+        self.assertEqual(2, plan_cache.misses)
+        self.assertIsNotNone(plan_cache.load(self.test_file, self.server.url))
+
+
+if __name__ == '__main__':
+    unittest.main()
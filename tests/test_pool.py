@@ -0,0 +1,95 @@
+import unittest
+from unittest import mock
+
+import pycurl
+
+from http_server import LocalServer
+from resttest3.parallel import ParallelRunner
+from resttest3.pool import CurlPool
+from resttest3.testcase import TestCase, TestSet
+
+
+class CurlPoolTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = LocalServer().start()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.stop()
+
+    def setUp(self) -> None:
+        TestSet.test_group_list_dict.clear()
+
+    def tearDown(self) -> None:
+        TestSet.test_group_list_dict.clear()
+
+    def test_host_key(self):
+        self.assertEqual('http://example.com', CurlPool.host_key('http://Example.com/api?q=1'))
+        self.assertEqual('https://example.com:8443', CurlPool.host_key(b'https://example.com:8443/'))
+
+    def test_acquire_release(self):
+        pool = CurlPool(max_idle_per_host=1)
+        first = pool.acquire('http://localhost/a')
+        second = pool.acquire('http://localhost/b')
+        self.assertIsNot(first, second)
+        self.assertEqual((0, 2), (pool.hits, pool.misses))
+        pool.release(first)
+        pool.release(second)  # Over the idle limit, gets closed
+        self.assertIs(first, pool.acquire('http://localhost/c'))
+        self.assertIsNot(first, pool.acquire('http://other-host/'))
+        self.assertEqual({'hits': 1, 'misses': 3, 'idle': 0, 'in_use': 2}, pool.stats())
+        self.assertEqual('Connection pool: 1 hits, 3 misses', str(pool))
+        pool.close()
+
+    def test_run_reuses_connection(self):
+        for share in (False, True):
+            pool = CurlPool(share=share)
+            self.assertEqual(share, pool.is_shared)
+            self.server.client_ports.clear()
+            for _ in range(3):
+                testcase = TestCase(self.server.url, None, None)
+                testcase.parse({'url': '/api/person/'})
+                testcase.run(pool=pool)
+                self.assertTrue(testcase.is_passed)
+            self.assertEqual((2, 1), (pool.hits, pool.misses))
+            self.assertEqual(1, len(self.server.client_ports))
+            pool.close()
+
+    def test_run_without_pool_closes_connection(self):
+        self.server.client_ports.clear()
+        for _ in range(2):
+            testcase = TestCase(self.server.url, None, None)
+            testcase.parse({'url': '/api/person/'})
+            testcase.run()
+            self.assertTrue(testcase.is_passed)
+        self.assertEqual(2, len(self.server.client_ports))
+
+    def test_run_releases_handle_on_error(self):
+        pool = CurlPool()
+        testcase = TestCase(self.server.url, None, None)
+        testcase.parse({'url': '/api/person/'})
+        with mock.patch.object(TestCase, 'process_response', side_effect=RuntimeError('broken validator')):
+            self.assertRaises(RuntimeError, testcase.run, pool=pool)
+        self.assertEqual({'hits': 0, 'misses': 1, 'idle': 1, 'in_use': 0}, pool.stats())
+        pool.close()
+
+    def test_parallel_with_pool(self):
+        pool = CurlPool(share=True)
+        ts = TestSet()
+        ts.parse(self.server.url, [
+            {'test': [{'name': 'test %s' % index}, {'group': 'group %s' % (index % 2)}, {'url': '/api/person/'}]}
+            for index in range(6)
+        ])
+        finished = []
+        ParallelRunner(2, pool=pool).run(ts.test_group_list_dict, lambda group, test: finished.append(test.is_passed))
+        self.assertEqual([True] * 6, finished)
+        self.assertEqual(6, pool.hits + pool.misses)
+        self.assertLessEqual(pool.misses, 2)
+        self.assertEqual(0, pool.stats()['in_use'])
+        pool.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,156 @@
+import os
+import pstats
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+import yaml
+
+from http_server import LocalServer
+from resttest3 import profiling
+from resttest3.benchmarks import Benchmark
+from resttest3.profiling import Profiler
+from resttest3.testcase import TestCase, TestSet
+from resttest3.utils import register_profile_hook
+from resttest3.validators import ComparatorValidator, ExtractTestValidator
+
+PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TESTS = [
+    {'test': [{'name': 'list'}, {'url': '/api/person/'},
+              {'validators': [{'compare': {'jsonpath_mini': '0.id', 'expected': 1}},
+                              {'compare': {'jsonpath_mini': '1.login', 'expected': 'jenkins'}}]}]},
+    {'test': [{'name': 'person'}, {'url': {'template': '/api/person/$id/'}}, {'variable_binds': {'id': 2}},
+              {'validators': [{'extract_test': {'jsonpath_mini': 'login', 'test': 'exists'}}]}]},
+    {'test': [{'name': 'slow'}, {'url': '/delay/0.05'}]},
+]
+
+
+class ProfilerTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = LocalServer().start()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.stop()
+
+    def setUp(self) -> None:
+        TestSet.reset()
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        TestSet.reset()
+        self.directory.cleanup()
+
+    def run_tests(self):
+        testcase_set = TestSet()
+        testcase_set.parse(self.server.url, TESTS)
+        testcase_list = testcase_set.test_group_list_dict['NO GROUP'].testcase_list
+        for testcase in testcase_list:
+            testcase.run()
+            self.assertTrue(testcase.is_passed, [str(failure) for failure in testcase.failures])
+        return testcase_list
+
+    def test_phases(self):
+        originals = (TestSet.__dict__['parse'], TestCase.__dict__['url'], TestCase.__dict__['performed'],
+                     ComparatorValidator.__dict__['validate'])
+        timings = []
+        with Profiler(hooks=[lambda *timing: timings.append(timing)]) as profiler:
+            self.run_tests()
+
+        self.assertEqual(1, profiler.phases['parse'].count)
+        self.assertEqual(3, profiler.phases['network'].count)
+        self.assertGreater(profiler.phases['network'].max, 0.05)
+        self.assertEqual(3, profiler.phases['validation'].count)
+        self.assertGreater(profiler.phases['templating'].count, 3)
+        self.assertEqual({'ComparatorValidator': 2, 'ExtractTestValidator': 1},
+                         {name: stats.count for name, stats in profiler.validators.items()})
+        self.assertGreater(profiler.elapsed, profiler.phases['network'].total)
+
+        self.assertEqual(sum(stats.count for stats in profiler.phases.values()) + 3, len(timings))
+        self.assertIn(('network', 'slow'), [(phase, detail) for phase, _, detail in timings])
+        self.assertIn('validator: ComparatorValidator', profiler.report())
+        self.assertEqual(['elapsed', 'phases', 'validators'], sorted(profiler.as_dict()))
+
+        # Uninstalled: the original methods are back and further runs are not measured
+        self.assertEqual(originals, (TestSet.__dict__['parse'], TestCase.__dict__['url'],
+                                     TestCase.__dict__['performed'], ComparatorValidator.__dict__['validate']))
+        self.assertFalse(getattr(ExtractTestValidator.__dict__['validate'], '__profiled__', False))
+        self.run_tests()
+        self.assertEqual(3, profiler.phases['network'].count)
+
+    def test_benchmark_network(self):
+        benchmark = Benchmark(self.server.url, None, None)
+        benchmark.parse({'name': 'closed loop', 'url': '/api/person/', 'warmup_runs': 2, 'benchmark_runs': 5})
+        open_loop = Benchmark(self.server.url, None, None)
+        open_loop.parse({'name': 'open loop', 'url': '/api/person/', 'warmup_runs': 0, 'rate': 50,
+                         'benchmark_runs': 4})
+        timings = []
+        with Profiler(hooks=[lambda *timing: timings.append(timing)]) as profiler:
+            self.assertEqual(0, benchmark.run().failures)
+            self.assertEqual(0, open_loop.run().failures)
+
+        self.assertEqual(7 + 4, profiler.phases['network'].count)
+        self.assertGreater(profiler.phases['network'].total, 0)
+        details = [detail for phase, _, detail in timings if phase == 'network']
+        self.assertEqual((7, 4), (details.count('closed loop'), details.count('open loop')))
+
+    def test_registered_hook(self):
+        timings = []
+        register_profile_hook('collect', lambda *timing: timings.append(timing))
+        try:
+            self.assertRaises(TypeError, profiling.register_profile_hook, 'broken', 'not callable')
+            with Profiler(hooks=[lambda *timing: 1 / 0]):  # A failing hook is logged, the run goes on
+                self.run_tests()
+        finally:
+            profiling.PROFILE_HOOKS.pop('collect')
+        self.assertIn('parse', [phase for phase, _, _ in timings])
+
+    def test_pstats_and_flamegraph(self):
+        pstats_file = os.path.join(self.directory.name, 'run.pstats')
+        flamegraph_file = os.path.join(self.directory.name, 'run.folded')
+        with Profiler(pstats_file=pstats_file, flamegraph_file=flamegraph_file):
+            self.run_tests()
+
+        functions = [function for _, _, function in pstats.Stats(pstats_file).stats]
+        self.assertIn('process_response', functions)
+        with open(flamegraph_file) as f:
+            lines = f.read().splitlines()
+        self.assertTrue(lines)
+        for line in lines:
+            _, count = line.rsplit(' ', 1)
+            self.assertGreater(int(count), 0)
+        self.assertTrue(any('resttest3.testcase:' in line for line in lines))
+
+    def test_cli(self):
+        test_file = Path(self.directory.name).joinpath('tests.yaml')
+        with open(test_file, 'w') as f:
+            yaml.safe_dump(TESTS, f)
+        pstats_file = os.path.join(self.directory.name, 'run.pstats')
+        stdout = subprocess.run(
+            [sys.executable, '-m', 'resttest3.runner', '--url', self.server.url, '--test', str(test_file),
+             '--profile-pstats', pstats_file], cwd=self.directory.name, env=dict(os.environ, PYTHONPATH=PACKAGE_ROOT),
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, check=True).stdout
+        self.assertIn('========== PROFILE ===========', stdout)
+        for phase in ('parse', 'templating', 'network', 'validation', 'validator: ExtractTestValidator'):
+            self.assertIn('\n%s ' % phase, stdout)
+        self.assertTrue(os.path.isfile(pstats_file))
+
+    def test_cli_error(self):
+        test_file = Path(self.directory.name).joinpath('tests.yaml')
+        test_file.write_text('- test: [not, a, mapping')
+        pstats_file = os.path.join(self.directory.name, 'run.pstats')
+        process = subprocess.run(
+            [sys.executable, '-m', 'resttest3.runner', '--url', self.server.url, '--test', str(test_file),
+             '--profile-pstats', pstats_file], cwd=self.directory.name, env=dict(os.environ, PYTHONPATH=PACKAGE_ROOT),
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+        self.assertNotEqual(0, process.returncode)
+        self.assertTrue(os.path.isfile(pstats_file))  # Written by the uninstall on the way out of the failed run
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,159 @@
+import hashlib
+import io
+import json
+import tempfile
+import unittest
+from unittest import mock
+
+from http_server import LocalServer
+from resttest3 import validators
+from resttest3.ext.extractor_jmespath import JMESPathExtractor
+from resttest3.ext.validator_jsonschema import JsonSchemaValidator
+from resttest3.response import Response, SpooledBody
+from resttest3.testcase import TestCase, TestCaseConfig
+
+
+class ResponseTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = LocalServer().start()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.stop()
+
+    def test_text_and_json(self):
+        response = Response(body='{"key": "指事字"}'.encode('utf-8'), headers=[('content-type', 'application/json')],
+                            status_code=200)
+        self.assertEqual('{"key": "指事字"}', response.text)
+        self.assertEqual({'key': '指事字'}, response.json)
+        self.assertIs(response.json, response.json)
+        self.assertEqual(len('{"key": "指事字"}'.encode('utf-8')), len(response))
+        self.assertEqual('', Response().text)
+
+    def test_json_parsed_once(self):
+        response = Response(body=b'{"a": {"b": [1, 2]}}')
+        with mock.patch('resttest3.response.json.loads', wraps=json.loads) as loads:
+            mini = validators.MiniJsonExtractor.parse('a.b.1')
+            self.assertEqual(2, mini.extract(body=response.text, response=response))
+            self.assertEqual([1, 2], JMESPathExtractor.parse('a.b').extract(body=response.text, response=response))
+            validator = validators.parse_validator('comparator', {'jsonpath_mini': 'a.b', 'comparator': 'count_eq',
+                                                                  'expected': 2})
+            self.assertTrue(validator.validate(body=response.text, response=response))
+            self.assertEqual(1, loads.call_count)
+
+    def test_invalid_json_cached(self):
+        response = Response(body=b'not json')
+        self.assertRaises(ValueError, lambda: response.json)
+        self.assertRaises(ValueError, lambda: response.json)
+        mini = validators.MiniJsonExtractor.parse('a')
+        self.assertRaises(ValueError, mini.extract, body=response.text, response=response)
+
+    def test_extractor_without_parsed_json(self):
+        response = Response(body=b'raw text', headers=[('x-id', '5')])
+        self.assertEqual('raw text', validators.RawBodyExtractor.parse(None).extract(body=response.text,
+                                                                                     response=response))
+        self.assertEqual('5', validators.HeaderExtractor.parse('X-Id').extract(headers=response.headers,
+                                                                               response=response))
+
+    def test_schema_validator_response(self):
+        validator = JsonSchemaValidator.parse({'schema': '{"type": "object", "required": ["a"]}'})
+        self.assertTrue(validator.validate(response=Response(body=b'{"a": 1}')))
+        self.assertFalse(validator.validate(response=Response(body=b'{"b": 1}')))
+        self.assertFalse(validator.validate(response=Response(body=b'[')))
+
+    def test_testcase_response(self):
+        testcase = TestCase(self.server.url, None, None)
+        testcase.parse({
+            'url': '/api/person/7/', 'method': 'PUT', 'body': '{"id": 7, "login": "gaius"}',
+            'validators': [{'compare': {'jsonpath_mini': 'id', 'expected': 7}},
+                           {'compare': {'header': 'content-type', 'expected': 'application/json'}},
+                           {'extract_test': {'jmespath': 'login', 'test': 'exists'}}],
+            'extract_binds': [{'login': {'jsonpath_mini': 'login'}}]
+        })
+        testcase.run()
+        self.assertTrue(testcase.is_passed, [str(f) for f in testcase.failures])
+        self.assertEqual(200, testcase.response.status_code)
+        self.assertEqual({'id': 7, 'login': 'gaius'}, testcase.response.json)
+        self.assertEqual('gaius', testcase.context.get_value('login'))
+        # The request body is kept for the next run
+        self.assertEqual('{"id": 7, "login": "gaius"}', testcase.body)
+
+    def test_spooled_body(self):
+        spool = tempfile.SpooledTemporaryFile(max_size=8)
+        spool.write(b'{"a": 1}')
+        body = SpooledBody(spool)
+        self.assertFalse(body.is_on_disk)
+        self.assertEqual(8, len(body))
+        self.assertEqual(bytes(memoryview(b'{"a": 1}')), bytes(body.mmap()))
+        spool.write(b' ')
+        self.assertTrue(body.is_on_disk)
+        self.assertEqual(b'{"a": 1} ', bytes(body.mmap()[:]))
+        self.assertEqual([b'{"a"', b': 1}', b' '], list(body.chunks(4)))
+        self.assertEqual(hashlib.md5(b'{"a": 1} ').hexdigest(), body.digest('md5'))
+        self.assertEqual('{"a": 1} ', str(body))
+        self.assertTrue(body == b'{"a": 1} ')
+        self.assertFalse(body == b'{"a": 2} ')
+
+        response = Response(body_stream=body)
+        self.assertTrue(response.is_streamed)
+        self.assertIs(body, response.content)
+        self.assertEqual({'a': 1}, response.json)
+        self.assertEqual(9, len(response))
+        response.close()
+        self.assertTrue(spool.closed)
+
+        self.assertEqual(0, len(SpooledBody(io.BytesIO())))
+        self.assertEqual(b'', bytes(SpooledBody(tempfile.TemporaryFile()).mmap()))
+
+    def test_body_hash_extractor(self):
+        self.assertRaises(ValueError, validators.parse_extractor, 'body_hash', 'no-such-hash')
+        extractor = validators.parse_extractor('body_hash', 'md5')
+        self.assertEqual(hashlib.md5(b'abc').hexdigest(), extractor.extract(body='abc'))
+        self.assertEqual(hashlib.sha256(b'').hexdigest(), validators.parse_extractor('body_hash', None).extract())
+
+    def test_streamed_test(self):
+        size = 3 * (1 << 20) + 5
+        testcase = TestCase(self.server.url, None, None)
+        testcase.parse({'url': '/bytes/%s' % size, 'stream': True, 'validators': [
+            {'compare': {'raw_body': '', 'comparator': 'count_eq', 'expected': size}},
+            {'compare': {'body_hash': 'sha256', 'expected': hashlib.sha256(b'x' * size).hexdigest()}},
+        ]})
+        with mock.patch.object(Response, 'text', new_callable=mock.PropertyMock) as text:
+            testcase.run()
+        text.assert_not_called()  # Validated on the spool, the body was never loaded as text
+        self.assertTrue(testcase.is_passed, [str(f) for f in testcase.failures])
+        self.assertTrue(testcase.response.is_streamed)
+        self.assertTrue(testcase.response.body_stream.is_on_disk)
+        self.assertEqual(size, len(testcase.response.body_stream.mmap()))
+
+        # Failing length check reports without loading the body either
+        testcase = TestCase(self.server.url, None, None)
+        testcase.parse({'url': '/bytes/10', 'stream': True, 'validators': [
+            {'compare': {'raw_body': '', 'comparator': 'count_eq', 'expected': 11}}]})
+        testcase.run()
+        self.assertFalse(testcase.is_passed)
+
+    def test_stream_threshold(self):
+        config = TestCaseConfig()
+        config.parse({'stream_threshold': 1024})
+        small = TestCase(self.server.url, None, None, config=config)
+        small.parse({'url': '/api/person/3/', 'extract_binds': [{'login': {'jsonpath_mini': 'login'}}]})
+        small.run()
+        self.assertTrue(small.is_passed)
+        self.assertTrue(small.response.is_streamed)
+        self.assertFalse(small.response.body_stream.is_on_disk)
+        self.assertEqual('user3', small.context.get_value('login'))
+
+        large = TestCase(self.server.url, None, None, config=config)
+        large.parse({'url': '/bytes/4096'})
+        large.run()
+        self.assertTrue(large.response.body_stream.is_on_disk)
+        self.assertEqual(4096, len(large.response))
+
+        self.assertIsInstance(TestCase(self.server.url, None, None).body_buffer(), io.BytesIO)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,199 @@
+import asyncio
+import os
+import random
+import tempfile
+import time
+import unittest
+from email.utils import formatdate
+from pathlib import Path
+
+import pycurl
+import yaml
+
+from http_server import LocalServer
+from resttest3.parallel import ParallelRunner
+from resttest3.reports.templite import Templite
+from resttest3.retry import RetryPolicy
+from resttest3.testcase import TestCase, TestCaseConfig, TestSet
+from resttest3.workers import WorkerRunner
+
+REPORT_TEMPLATE = Path(__file__).parent.parent.joinpath('resttest3', 'reports', 'template', 'report_template.html')
+
+
+class RetryPolicyTest(unittest.TestCase):
+
+    def test_should_retry(self):
+        policy = RetryPolicy(retries=2)
+        self.assertTrue(policy.should_retry(1, status_code=503))
+        self.assertTrue(policy.should_retry(2, status_code=502))
+        self.assertFalse(policy.should_retry(3, status_code=503))  # Out of retries
+        self.assertFalse(policy.should_retry(1, status_code=500))
+        self.assertTrue(policy.should_retry(1, error=pycurl.error(pycurl.E_COULDNT_CONNECT, 'refused')))
+        self.assertFalse(policy.should_retry(1, error=pycurl.error(pycurl.E_URL_MALFORMAT, 'bad url')))
+        self.assertFalse(RetryPolicy().should_retry(1, status_code=503))
+        self.assertTrue(RetryPolicy(retries=1, statuses=[429]).should_retry(1, status_code=429))
+        self.assertRaises(ValueError, RetryPolicy, retries=-1)
+        self.assertRaises(ValueError, RetryPolicy, jitter=2)
+
+    def test_delay(self):
+        policy = RetryPolicy(retries=10, backoff=0.5, max_backoff=3, jitter=0)
+        self.assertEqual([0.5, 1.0, 2.0, 3.0, 3.0], [policy.delay(attempt) for attempt in range(1, 6)])
+
+        policy = RetryPolicy(retries=10, backoff=1, jitter=0.5, rng=random.Random(7))
+        delays = [policy.delay(1) for _ in range(100)]
+        self.assertTrue(all(0.5 <= delay <= 1 for delay in delays))
+        self.assertGreater(len(set(delays)), 1)
+
+    def test_retry_after(self):
+        policy = RetryPolicy(retries=1, backoff=1, max_backoff=30, jitter=0)
+        self.assertEqual(0.0, policy.delay(1, '0'))
+        self.assertEqual(12.0, policy.delay(1, '12'))
+        self.assertEqual(30.0, policy.delay(1, '120'))  # Capped
+        self.assertEqual(1.0, policy.delay(1, 'soon'))  # Unusable, the backoff is used
+        seconds = policy.delay(1, formatdate(time.time() + 10, usegmt=True))
+        self.assertTrue(8 <= seconds <= 10, seconds)
+        self.assertEqual(0.0, RetryPolicy.parse_retry_after(formatdate(time.time() - 10, usegmt=True)))
+        self.assertIsNone(RetryPolicy.parse_retry_after(None))
+
+    def test_config(self):
+        config = TestCaseConfig()
+        config.parse({'retries': 3, 'retry_backoff': 0.2, 'retry_max_backoff': 1, 'retry_jitter': 0,
+                      'retry_statuses': [429, 503]})
+        policy = config.retry_policy()
+        self.assertEqual((3, 0.2, 1.0, 0.0), (policy.retries, policy.backoff, policy.max_backoff, policy.jitter))
+        self.assertEqual({429, 503}, policy.statuses)
+        self.assertRaises(TypeError, TestCaseConfig().parse, {'retry_statuses': 503})
+
+
+class RetryRunTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = LocalServer().start()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.stop()
+
+    def setUp(self) -> None:
+        TestSet.reset()
+        self.server.request_log.clear()
+        self.server.client_ports.clear()
+
+    def tearDown(self) -> None:
+        TestSet.reset()
+
+    def make_testcase(self, url, retries=3, **options):
+        config = TestCaseConfig()
+        config.parse(dict({'retries': retries, 'retry_backoff': 0.01, 'retry_jitter': 0}, **options))
+        testcase = TestCase(self.server.url, None, None, config=config)
+        testcase.parse({'url': url})
+        return testcase
+
+    def test_retried_until_success(self):
+        testcase = self.make_testcase('/flaky/run/2')
+        testcase.run()
+        self.assertTrue(testcase.is_passed, [str(failure) for failure in testcase.failures])
+        self.assertEqual([503, 503, 200], [attempt.status_code for attempt in testcase.attempts])
+        self.assertEqual([0.01, 0.02, None], [attempt.retry_delay for attempt in testcase.attempts])
+        self.assertTrue(all(attempt.elapsed > 0 for attempt in testcase.attempts))
+        self.assertEqual(1, len(self.server.client_ports))  # Every attempt on the same connection
+
+        self.assertEqual([503, 503, 200], [attempt.status_code for attempt in testcase.result.attempts])
+        self.assertEqual('#1 503 in', str(testcase.result.attempts[0])[:9])
+        html = Templite(REPORT_TEMPLATE.read_text()).render({
+            'total_testcase_count': 1, 'stat_time': None, 'elapsed': (0, 1), 'context_list': [testcase],
+            'benchmark_result_list': [], 'scenario_result_list': []})
+        self.assertIn('#2 503 in', html)
+        self.assertIn('retried after 0.020 s', html)
+        self.assertIn('#3 200 in', html)
+
+    def test_retries_exhausted(self):
+        testcase = self.make_testcase('/flaky/exhausted/5', retries=2)
+        testcase.run()
+        self.assertFalse(testcase.is_passed)
+        self.assertEqual(3, len(testcase.attempts))
+        self.assertEqual(503, testcase.response.status_code)
+        self.assertIn('Invalid HTTP response code', str(testcase.failures[0]))
+
+    def test_not_retried(self):
+        testcase = self.make_testcase('/flaky/default/1', retries=0)
+        testcase.run()
+        self.assertFalse(testcase.is_passed)
+        self.assertEqual([503], [attempt.status_code for attempt in testcase.attempts])
+
+        testcase = self.make_testcase('/flaky/other/1?status=500')  # Not a retryable status
+        testcase.run()
+        self.assertEqual([500], [attempt.status_code for attempt in testcase.attempts])
+
+        testcase = self.make_testcase('/flaky/expected/1')
+        testcase.expected_http_status_code_list = [503]  # An expected status passes, it is not retried
+        testcase.run()
+        self.assertTrue(testcase.is_passed)
+        self.assertEqual(1, len(testcase.attempts))
+
+    def test_retry_after(self):
+        testcase = self.make_testcase('/flaky/after/1?retry_after=0', retry_backoff=5)
+        start = time.monotonic()
+        testcase.run()
+        self.assertLess(time.monotonic() - start, 2)
+        self.assertTrue(testcase.is_passed)
+        self.assertEqual([0.0, None], [attempt.retry_delay for attempt in testcase.attempts])
+
+    def test_curl_error(self):
+        testcase = self.make_testcase('/drop/curl/1')
+        testcase.run()
+        self.assertTrue(testcase.is_passed, [str(failure) for failure in testcase.failures])
+        self.assertEqual(pycurl.E_GOT_NOTHING, testcase.attempts[0].error.args[0])
+        self.assertEqual(200, testcase.attempts[1].status_code)
+
+    def test_post_body_sent_again(self):
+        testcase = self.make_testcase('/flaky/post/1')
+        testcase.parse({'method': 'POST', 'body': '{"login": "gaius"}'})
+        testcase.run()
+        self.assertTrue(testcase.is_passed)
+        self.assertEqual([('POST', '/flaky/post/1')] * 2, self.server.request_log)
+
+    def test_run_async(self):
+        testcase = self.make_testcase('/flaky/async/2')
+        asyncio.run(testcase.run_async())
+        self.assertTrue(testcase.is_passed, [str(failure) for failure in testcase.failures])
+        self.assertEqual(3, len(testcase.attempts))
+
+    def test_parallel(self):
+        ts = TestSet()
+        ts.parse(self.server.url, [
+            {'config': [{'retries': 2}, {'retry_backoff': 0.01}]},
+            {'test': [{'name': 'flaky'}, {'group': 'a'}, {'url': '/flaky/parallel/2'}]},
+            {'test': [{'name': 'dropped'}, {'group': 'b'}, {'url': '/drop/dropped/1'}]},
+            {'test': [{'name': 'next'}, {'group': 'a'}, {'url': '/api/person/1/'}]},
+        ])
+        finished = []
+        ParallelRunner(2).run(ts.test_group_list_dict, lambda group, testcase: finished.append(
+            (testcase.name, testcase.is_passed, len(testcase.attempts))))
+        self.assertEqual([('dropped', True, 2), ('flaky', True, 3), ('next', True, 1)], sorted(finished))
+
+    def test_workers(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.yaml', delete=False) as f:
+            yaml.safe_dump([
+                {'config': [{'retries': 2}, {'retry_backoff': 0.01}, {'retry_jitter': 0}]},
+                {'test': [{'name': 'flaky'}, {'group': 'a'}, {'url': '/flaky/workers/1'}]},
+                {'test': [{'name': 'dropped'}, {'group': 'b'}, {'url': '/drop/workers-dropped/1'}]},
+            ], f)
+        try:
+            ts = TestSet()
+            ts.parse_file(self.server.url, f.name)
+            finished = {}
+            WorkerRunner(2).run(f.name, self.server.url, ts.test_group_list_dict,
+                                lambda group, summary: finished.update({summary.name: summary}))
+        finally:
+            os.remove(f.name)
+        self.assertEqual([503, 200], [attempt.status_code for attempt in finished['flaky'].attempts])
+        self.assertEqual(0.01, finished['flaky'].attempts[0].retry_delay)
+        dropped = finished['dropped'].attempts
+        self.assertEqual(pycurl.E_GOT_NOTHING, dropped[0].error.args[0])
+        self.assertTrue(all(attempt.elapsed > 0 for attempt in dropped))
+
+
+if __name__ == '__main__':
+    unittest.main()
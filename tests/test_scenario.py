@@ -0,0 +1,81 @@
+import unittest
+
+from http_server import LocalServer
+from resttest3.scenario import ScenarioRunner
+from resttest3.testcase import TestSet
+
+SCENARIO = [
+    {'config': [{'generators': [
+        {'name': {'type': 'random_text', 'length': 12}},
+        {'step': {'type': 'number_sequence', 'start': 1}},
+    ]}]},
+    {'test': [{'name': 'login'}, {'group': 'shop'}, {'url': {'template': '/api/person/$name/'}},
+              {'generator_binds': {'name': 'name'}},
+              {'extract_binds': [{'login': {'jsonpath_mini': 'login'}}]}]},
+    {'test': [{'name': 'browse'}, {'group': 'shop'}, {'url': {'template': '/delay/0.3?login=$login&step=$step'}},
+              {'generator_binds': {'step': 'step'}}]},
+    {'test': [{'name': 'checkout'}, {'group': 'shop'}, {'url': '/status/404'}]},
+]
+
+
+class ScenarioRunnerTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = LocalServer().start()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.stop()
+
+    def setUp(self) -> None:
+        TestSet.reset()
+        self.server.request_log.clear()
+        self.finished = []
+
+    def tearDown(self) -> None:
+        TestSet.reset()
+
+    def record(self, group_name, user, testcase):
+        self.finished.append((group_name, user, testcase.name))
+
+    def test_invalid_users(self):
+        self.assertRaises(ValueError, ScenarioRunner, 0)
+
+    def test_scenario(self):
+        ts = TestSet()
+        ts.parse(self.server.url, SCENARIO)
+        result = ScenarioRunner(5).run(ts.test_group_list_dict, self.record)['shop']
+
+        self.assertEqual(15, len(self.finished))
+        self.assertEqual(['login', 'browse', 'checkout'], [name for _, user, name in self.finished if user == 3])
+        self.assertLess(result.elapsed, 1.2)  # Five users wait on /delay/0.3 at the same time
+
+        # Every user extracted and used its own login, and its own generator started from the first value
+        paths = [path for _, path in self.server.request_log]
+        logins = ['user%s' % path.split('/')[3] for path in paths if path.startswith('/api/person/')]
+        self.assertEqual(5, len(set(logins)))
+        browse_paths = sorted(path for path in paths if path.startswith('/delay/'))
+        self.assertEqual(sorted('/delay/0.3?login=%s&step=1' % login for login in logins), browse_paths)
+
+        self.assertEqual(5, result.users)
+        self.assertEqual(0, result.passed_users)
+        self.assertEqual([1, 2, 3, 4, 5], result.failed_users)
+        self.assertFalse(result.is_passed)
+        self.assertEqual(['login', 'browse', 'checkout'], list(result.tests.keys()))
+        self.assertEqual((5, 0), (result.tests['browse'].passed, result.tests['browse'].failed))
+        self.assertEqual((0, 5), (result.tests['checkout'].passed, result.tests['checkout'].failed))
+        self.assertEqual(5, len(result.failures))
+        self.assertIn('404', str(result.failures[0][2]))
+        self.assertEqual(15, result.latency.count)
+        self.assertGreaterEqual(result.tests['browse'].mean, 0.3)
+        self.assertEqual(['name', 'passed', 'failed', 'mean', 'percentiles'], list(result.test_table[0].keys()))
+
+        # The parsed tests are left untouched
+        original = ts.test_group_list_dict['shop'].testcase_list[0]
+        self.assertIsNone(original.elapsed)
+        self.assertEqual({}, original.context.get_values())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from resttest3.binding import Context
+from resttest3.ext import validator_jsonschema
+from resttest3.ext.validator_jsonschema import JsonSchemaValidator, compile_schema
+
+SCHEMA = {"type": "object", "required": ["id"], "properties": {"id": {"type": "integer"}}}
+
+
+class JsonSchemaCacheTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        compile_schema.cache_clear()
+
+    def test_inline_schema_compiled_once(self):
+        validator = JsonSchemaValidator.parse({'schema': json.dumps(SCHEMA)})
+        safe_load = validator_jsonschema.yaml.safe_load
+        with mock.patch.object(validator_jsonschema.yaml, 'safe_load', wraps=safe_load) as load:
+            for _ in range(5):
+                self.assertTrue(validator.validate(body='{"id": 1}'))
+            self.assertFalse(validator.validate(body='{"id": "one"}'))
+        self.assertEqual(1, load.call_count)
+        self.assertIs(validator.get_schema_validator(), validator.get_schema_validator())
+
+    def test_file_schema_reloaded_on_change(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+            json.dump(SCHEMA, f)
+        try:
+            validator = JsonSchemaValidator.parse({'schema': {'file': f.name}})
+            self.assertFalse(validator.validate(body='{"name": "x"}'))
+            first = validator.get_schema_validator()
+
+            with open(f.name, 'w') as schema_file:
+                json.dump({"type": "object"}, schema_file)
+            stat = os.stat(f.name)
+            os.utime(f.name, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+
+            self.assertTrue(validator.validate(body='{"name": "x"}'))
+            self.assertIsNot(first, validator.get_schema_validator())
+        finally:
+            os.remove(f.name)
+
+    def test_templated_schema_per_variant(self):
+        schema_text = '{"type": "object", "properties": {"id": {"type": "$id_type"}}}'
+        validator = JsonSchemaValidator.parse({'schema': {'template': schema_text}})
+        context = Context()
+        context.bind_variable('id_type', 'integer')
+        self.assertTrue(validator.validate(body='{"id": 1}', context=context))
+        self.assertFalse(validator.validate(body='{"id": "1"}', context=context))
+        context.bind_variable('id_type', 'string')
+        self.assertTrue(validator.validate(body='{"id": "1"}', context=context))
+        context.bind_variable('id_type', 'integer')
+        self.assertTrue(validator.validate(body='{"id": 1}', context=context))
+        info = compile_schema.cache_info()
+        self.assertEqual(2, info.misses)
+        self.assertEqual(2, info.hits)
+
+
+if __name__ == '__main__':
+    unittest.main()
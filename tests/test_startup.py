@@ -0,0 +1,53 @@
+import os
+import subprocess
+import sys
+import unittest
+
+# Modules the CLI must not import before a test needs them
+LAZY_MODULES = ('jsonschema', 'jmespath', 'certifi', 'alive_progress', 'resttest3.ext', 'resttest3.reports', 'asyncio',
+                'resttest3.workers', 'resttest3.scenario', 'resttest3.plan', 'resttest3.benchmarks', 'cProfile')
+
+PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_python(*args):
+    return subprocess.run([sys.executable] + list(args), cwd=PACKAGE_ROOT, stdout=subprocess.PIPE,
+                          stderr=subprocess.PIPE, universal_newlines=True, check=True)
+
+
+def imported_modules(module):
+    """ Names of the modules `import module` adds to sys.modules, in a new interpreter
+    Modules the interpreter itself loaded at startup, site hooks included, are left out """
+    code = ';'.join([
+        'import sys',
+        'before = set(sys.modules)',
+        'import %s' % module,
+        'print("\\n".join(sorted(set(sys.modules) - before)))',
+    ])
+    return run_python('-c', code).stdout.split()
+
+
+class StartupTest(unittest.TestCase):
+
+    def test_runner_import(self):
+        modules = imported_modules('resttest3.runner')
+        self.assertIn('resttest3.runner', modules)
+        self.assertEqual([], [name for name in modules if name.startswith(LAZY_MODULES)])
+
+    def test_extensions_loaded_on_use(self):
+        code = ';'.join([
+            'import sys',
+            'from resttest3.validators import parse_validator, parse_extractor',
+            'print("jsonschema" in sys.modules, "jmespath" in sys.modules)',
+            'parse_validator("json_schema", {"schema": "{}"})',
+            'print("jsonschema" in sys.modules, "jmespath" in sys.modules)',
+            'parse_validator("compare", {"jmespath": "a", "expected": 1})',
+            'print("jsonschema" in sys.modules, "jmespath" in sys.modules)',
+            'parse_extractor("jmespath", "b")',
+        ])
+        stdout = run_python('-c', code).stdout
+        self.assertEqual(['False False', 'True False', 'True True'], stdout.split('\n')[:3])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,11 +1,15 @@
+import json
 import unittest
 from inspect import getframeinfo, currentframe
 from pathlib import Path
+from unittest import mock
 
 import pycurl
 import yaml
 
+from http_server import LocalServer
 from resttest3.binding import Context
+from resttest3.pool import CurlPool
 from resttest3.testcase import TestCaseConfig, TestSet, TestCase
 from resttest3.validators import MiniJsonExtractor
 
@@ -158,5 +162,80 @@ class TestTestCase(unittest.TestCase):
         self.assertEqual(x.url, "http://api.github.com/v1/search/?q=Abhilash+Joseph+C&")
 
 
+class PreparedRequestTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = LocalServer().start()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.stop()
+
+    def setUp(self) -> None:
+        self.server.request_log.clear()
+
+    def test_static_request_built_once(self):
+        testcase = TestCase(self.server.url, None, None)
+        testcase.parse({'url': '/echo', 'method': 'POST', 'body': '{"login": "gaius"}',
+                        'headers': {'content-type': 'application/json', 'x-run': 'static'}})
+        self.assertFalse(testcase.is_dynamic())
+        pool = CurlPool()
+        with mock.patch.object(TestCase, 'build_request', autospec=True,
+                               side_effect=TestCase.build_request) as build_request:
+            for _ in range(3):
+                testcase.run(pool=pool)
+                self.assertTrue(testcase.is_passed, [str(failure) for failure in testcase.failures])
+                self.assertEqual({'login': 'gaius'}, testcase.response.json)
+            testcase.run()  # Without a pool the connection is closed, from the same prepared request
+            self.assertEqual(1, build_request.call_count)
+            self.assertEqual(['Connection: close'], testcase.prepared_request().headers[-1:])
+            self.assertNotIn('Connection: close', testcase.prepared_request().keep_alive_headers)
+
+            testcase.body = '{"login": "adama"}'  # Setters drop the prepared request
+            testcase.run(pool=pool)
+            self.assertEqual({'login': 'adama'}, testcase.response.json)
+            self.assertEqual(2, build_request.call_count)
+        pool.close()
+        self.assertEqual(5, len(self.server.request_log))
+
+    def test_dynamic_request_built_each_run(self):
+        config = TestCaseConfig()
+        config.parse({'generators': [{'id': {'type': 'number_sequence', 'start': 1}}]})
+        testcase = TestCase(self.server.url, None, None, config=config)
+        testcase.parse({'url': {'template': '/api/person/$id/'}, 'generator_binds': {'id': 'id'}})
+        self.assertTrue(testcase.is_dynamic())
+        for _ in range(3):
+            testcase.run()
+        self.assertEqual(['/api/person/1/', '/api/person/2/', '/api/person/3/'],
+                         [path for _, path in self.server.request_log])
+        self.assertEqual({'id': '3', 'login': 'user3'}, json.loads(testcase.response.text))
+
+    def test_templated_headers_built_each_run(self):
+        for headers in ({'template': {'X-Id': '$id'}}, {'X-Id': {'template': '$id'}}):
+            testcase = TestCase(self.server.url, None, {'id': 1})
+            testcase.parse({'url': '/echo', 'headers': headers})
+            self.assertTrue(testcase.is_dynamic(), headers)
+            testcase.pre_update(testcase.context)
+            self.assertIn('X-Id:1', testcase.prepared_request().headers)
+            testcase.context.bind_variable('id', 2)
+            self.assertEqual({'X-Id': '2'}, testcase.headers)
+            self.assertIn('X-Id:2', testcase.prepared_request().headers)
+
+    def test_templated_body_built_each_run(self):
+        context = Context()
+        context.bind_variable('id', '1')
+        testcase = TestCase(self.server.url, None, None, context=context)
+        testcase.parse({'url': '/echo', 'method': 'POST', 'body': {'template': '{"id": "$id"}'}})
+        self.assertTrue(testcase.is_dynamic())
+        testcase.run()
+        self.assertEqual({'id': '1'}, testcase.response.json)
+        self.assertTrue(testcase.is_dynamic())  # Running does not replace the templated body by its rendering
+        context.bind_variable('id', '2')
+        self.assertEqual(b'{"id": "2"}', testcase.prepared_request().body)
+        testcase.run()
+        self.assertEqual({'id': '2'}, testcase.response.json)
+
+
 if __name__ == '__main__':
     unittest.main()
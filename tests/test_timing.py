@@ -0,0 +1,119 @@
+import pickle
+import unittest
+from pathlib import Path
+
+from http_server import LocalServer
+from resttest3.reports.templite import Templite
+from resttest3.testcase import TestCase, TestSet
+from resttest3.timing import CURL_TIMES, TOOL_PHASES, Timings
+from resttest3.workers import TestCaseSummary
+
+REPORT_TEMPLATE = Path(__file__).parent.parent.joinpath('resttest3', 'reports', 'template', 'report_template.html')
+
+
+class FakeCurl:
+
+    def __init__(self, **times):
+        self.times = times
+
+    def getinfo(self, info):
+        return self.times[{value: name for name, value in CURL_TIMES}[info]]
+
+
+class TimingsTest(unittest.TestCase):
+
+    def test_network_phases(self):
+        timings = Timings()
+        self.assertEqual({}, timings.network)
+        self.assertEqual(0.0, timings.total)
+        timings.read_curl(FakeCurl(namelookup=0.01, connect=0.03, appconnect=0.07, pretransfer=0.08,
+                                   starttransfer=0.28, total=0.3))
+        network = {name: round(seconds, 6) for name, seconds in timings.network.items()}
+        self.assertEqual({'dns': 0.01, 'tcp': 0.02, 'tls': 0.04, 'request': 0.01, 'wait': 0.2, 'transfer': 0.02},
+                         network)
+        self.assertEqual(0.3, timings.total)
+
+        # Reused plain HTTP connection: no name lookup, connect nor TLS handshake
+        timings.read_curl(FakeCurl(namelookup=0.0, connect=0.0, appconnect=0.0, pretransfer=0.001,
+                                   starttransfer=0.05, total=0.06))
+        self.assertEqual((0.0, 0.0, 0.0), (timings.network['dns'], timings.network['tcp'], timings.network['tls']))
+        self.assertAlmostEqual(0.049, timings.network['wait'])
+
+    def test_tool_phases(self):
+        timings = Timings()
+        self.assertEqual(TOOL_PHASES, tuple(timings.tool))
+        with timings.measure('validation'):
+            sum(range(10000))
+        with timings.measure('validation'):
+            pass
+        self.assertGreater(timings.tool['validation'], 0)
+        self.assertEqual(timings.tool['validation'], timings.overhead)
+        rows = timings.report_rows()
+        self.assertEqual(['total', 'overhead'] + list(TOOL_PHASES), [row['phase'] for row in rows])
+
+
+class TestCaseTimingsTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = LocalServer().start()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.stop()
+
+    def setUp(self) -> None:
+        TestSet.reset()
+
+    def tearDown(self) -> None:
+        TestSet.reset()
+
+    def test_run_timings(self):
+        testcase = TestCase(self.server.url, None, None)
+        testcase.parse({'url': '/api/person/1/', 'validators': [{'compare': {'jsonpath_mini': 'id', 'expected': '1'}}],
+                        'extract_binds': [{'login': {'jsonpath_mini': 'login'}}]})
+        self.assertIsNone(testcase.timings)
+        testcase.run()
+        self.assertTrue(testcase.is_passed)
+
+        timings = testcase.timings
+        self.assertEqual(testcase.elapsed, timings.total)
+        self.assertGreater(timings.total, 0)
+        self.assertTrue(all(seconds >= 0 for seconds in timings.network.values()))
+        self.assertAlmostEqual(timings.total, sum(timings.network.values()), places=3)
+        for phase in ('templating', 'response', 'validation', 'extraction'):
+            self.assertGreater(timings.tool[phase], 0, phase)
+
+        result = testcase.result
+        self.assertEqual(200, result.status_code)
+        self.assertEqual(testcase.elapsed, result.elapsed)
+        self.assertIs(timings, result.timings)
+        self.assertEqual([], result.failures)
+        summary = pickle.loads(pickle.dumps(TestCaseSummary.from_testcase(testcase)))
+        self.assertEqual((testcase.elapsed, timings.total), (summary.elapsed, summary.timings.total))
+
+    def test_failed_run_result(self):
+        testcase = TestCase('http://127.0.0.1:1', None, None)
+        testcase.parse({'url': '/'})
+        testcase.run()
+        self.assertFalse(testcase.is_passed)
+        self.assertIsNone(testcase.result.status_code)
+        self.assertEqual(1, len(testcase.result.failures))
+        self.assertGreater(testcase.timings.tool['templating'], 0)
+
+    def test_html_report(self):
+        testcase = TestCase(self.server.url, None, None)
+        testcase.parse({'url': '/api/person/', 'name': 'people'})
+        testcase.run()
+        not_run = TestCase(self.server.url, None, None)
+        not_run.parse({'url': '/api/person/', 'name': 'not run'})
+        html = Templite(REPORT_TEMPLATE.read_text()).render({
+            'total_testcase_count': 2, 'stat_time': None, 'elapsed': (0, 1), 'context_list': [testcase, not_run],
+            'benchmark_result_list': [], 'scenario_result_list': []})
+        self.assertIn('Timings (ms)', html)
+        for phase in ('total', 'dns', 'wait', 'overhead', 'templating', 'validation'):
+            self.assertEqual(1, html.count('%s: ' % phase), phase)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,11 @@
 # -*- coding: utf-8 -*-
+import importlib.util
+import json
+import pickle
 import unittest
 from inspect import currentframe, getframeinfo
 from pathlib import Path
+from unittest import mock
 
 from resttest3 import validators
 from resttest3.binding import Context
@@ -184,6 +188,22 @@ class ValidatorsTest(unittest.TestCase):
         val = validators.MiniJsonExtractor.query_dictionary(query, mydict)
         self.assertEqual('val', val)
 
+    def test_dict_query_compiled(self):
+        """ Queries are split into typed steps once """
+        self.assertEqual(('key', 1, 'val'), validators.MiniJsonExtractor.compile_query('.key.1.val.'))
+        self.assertEqual((), validators.MiniJsonExtractor.compile_query(''))
+
+        extractor = validators.MiniJsonExtractor.parse('key.val.1')
+        self.assertIs(extractor.compiled_query('key.val.1'), extractor.compiled_query(extractor.query))
+        self.assertEqual(2, extractor.extract(body='{"key": {"val": [1, 2, 3]}}'))
+
+        extractor = validators.MiniJsonExtractor.parse({'template': 'key.$name'})
+        context = Context()
+        context.bind_variable('name', 'val')
+        self.assertEqual([1, 2], extractor.extract(body='{"key": {"val": [1, 2]}}', context=context))
+        context.bind_variable('name', 'other')
+        self.assertEqual(3, extractor.extract(body='{"key": {"other": 3}}', context=context))
+
     def test_jsonpathmini_unicode(self):
         myjson = u'{"myVals": [0, 1.0, "😽"], "my😽":"value"}'
 
@@ -669,5 +689,66 @@ class ValidatorsTest(unittest.TestCase):
         self.assertRaises(ValueError, JsonSchemaValidator.parse, {'x': 20})
         self.assertEqual(comp_validator.get_readable_config(), "JSON schema validation")
 
+    def test_array_comparator_all(self):
+        items = [{'id': index, 'status': 'active'} for index in range(100)]
+        items[4]['status'] = items[17]['status'] = 'inactive'
+        body = json.dumps({'items': items})
+        config = {'jsonpath_mini': 'items', 'element': 'status', 'expected': 'active'}
+
+        validator = validators.parse_validator('all', config)
+        self.assertEqual('all', validator.mode)
+        failure = validator.validate(body=body)
+        self.assertIsInstance(failure, validators.Failure)
+        self.assertEqual("Comparison failed, evaluating eq(element, active) returned False for 2 of 100 elements "
+                         "at indices 4, 17", failure.message)
+        self.assertIn("[17]: 'inactive'", failure.details)
+        self.assertTrue(validators.parse_validator('any', config).validate(body=body))
+        self.assertTrue(validators.parse_validator('for_each', dict(config, comparator='ne', expected='gone'))
+                        .validate(body=body))
+
+        failure = validators.parse_validator('any', dict(config, expected='gone')).validate(body=body)
+        self.assertEqual("Comparison failed, evaluating eq(element, gone) returned False for all 100 elements",
+                         failure.message)
+
+        # Numbers, missing element values and comparators raising on None
+        validator = validators.parse_validator('all', {'jsonpath_mini': 'items', 'element': 'id', 'comparator': 'lt',
+                                                       'expected': 95})
+        self.assertIn("for 5 of 100 elements at indices 95, 96, 97, 98, 99", validator.validate(body=body).message)
+        items[0] = {'status': 'active'}
+        self.assertIn("for 6 of 100 elements at indices 0, 95,", validator.validate(body=json.dumps({'items': items}))
+                      .message)
+
+        validator = validators.parse_validator('all', {'jsonpath_mini': 'items', 'expected': 1})
+        failure = validator.validate(body=json.dumps({'items': [0] * 50}))
+        self.assertTrue(failure.message.endswith("at indices 0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, "
+                                                 "17, 18, 19 and 30 more"))
+        self.assertTrue(validator.validate(body='{"items": []}'))
+        self.assertFalse(validators.parse_validator('any', {'jsonpath_mini': 'items', 'expected': 1})
+                         .validate(body='{"items": []}'))
+        self.assertIn("expects an array, extracted dict", validator.validate(body='{"items": {}}').message)
+
+        self.assertRaises(ValueError, validators.ArrayComparatorValidator.parse, config, 'some')
+        restored = pickle.loads(pickle.dumps(validators.parse_validator('all', config)))
+        self.assertFalse(restored.validate(body=body))
+
+    @unittest.skipUnless(importlib.util.find_spec('numpy'), "NumPy is not installed")
+    def test_array_comparator_numpy(self):
+        import numpy
+        validator = validators.parse_validator('all', {'jsonpath_mini': 'values', 'comparator': 'ge', 'expected': 2})
+        body = json.dumps({'values': list(range(10000))})
+        with mock.patch.object(numpy, 'greater_equal', wraps=numpy.greater_equal) as greater_equal:
+            self.assertIn("for 2 of 10000 elements at indices 0, 1", validator.validate(body=body).message)
+            self.assertEqual(1, greater_equal.call_count)
+            # Booleans and strings are compared in python
+            self.assertFalse(validator.validate(body='{"values": ["a", true]}'))
+            self.assertEqual(1, greater_equal.call_count)
+
+    def test_array_comparator_without_numpy(self):
+        validator = validators.parse_validator('all', {'jsonpath_mini': 'values', 'comparator': 'ge', 'expected': 2})
+        with mock.patch.dict('sys.modules', numpy=None):  # Import fails
+            self.assertIn("for 1 of 3 elements at indices 1", validator.validate(body='{"values": [3, 1, 2.5]}')
+                          .message)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,84 @@
+import os
+import pickle
+import tempfile
+import unittest
+
+import yaml
+
+from http_server import LocalServer
+from resttest3.pool import CurlPool
+from resttest3.testcase import TestSet
+from resttest3.workers import WorkerRunner, TestCaseSummary, run_shard, shard_groups
+
+TEST_LIST = [
+    {'test': [{'name': 'get person'}, {'group': 'chain'}, {'url': '/api/person/7/'},
+              {'extract_binds': [{'login': {'jsonpath_mini': 'login'}}]}]},
+    {'test': [{'name': 'use login'}, {'group': 'chain'}, {'url': {'template': '/api/person/$login/'}}]},
+    {'test': [{'name': 'list'}, {'group': 'people'}, {'url': '/api/person/'}]},
+    {'test': [{'name': 'missing'}, {'group': 'missing'}, {'url': '/status/404'}]},
+]
+
+
+class WorkerRunnerTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = LocalServer().start()
+        with tempfile.NamedTemporaryFile('w', suffix='.yaml', delete=False) as f:
+            yaml.safe_dump(TEST_LIST, f)
+        cls.test_file = f.name
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.stop()
+        os.remove(cls.test_file)
+
+    def setUp(self) -> None:
+        TestSet.reset()
+        self.finished = []
+
+    def tearDown(self) -> None:
+        TestSet.reset()
+
+    def record(self, group_name, summary):
+        self.finished.append((group_name, summary.name, summary.is_passed))
+
+    def test_invalid_workers(self):
+        self.assertRaises(ValueError, WorkerRunner, 0)
+
+    def test_shard_groups(self):
+        ts = TestSet()
+        ts.parse(self.server.url, TEST_LIST)
+        shards = shard_groups(ts.test_group_list_dict, 2)
+        self.assertEqual([['chain'], ['people', 'missing']], shards)
+        self.assertEqual([['chain', 'people', 'missing']], shard_groups(ts.test_group_list_dict, 1))
+        self.assertEqual(3, len(shard_groups(ts.test_group_list_dict, 8)))
+
+    def test_run_shard(self):
+        result_dict, stats = run_shard(self.test_file, self.server.url, ['chain'])
+        self.assertEqual(['chain'], list(result_dict.keys()))
+        self.assertEqual([True, True], [summary.is_passed for summary in result_dict['chain']])
+        self.assertEqual(2, stats['hits'] + stats['misses'])
+
+        summary = pickle.loads(pickle.dumps(run_shard(self.test_file, self.server.url, ['missing'])[0]['missing'][0]))
+        self.assertIsInstance(summary, TestCaseSummary)
+        self.assertFalse(summary.is_passed)
+        self.assertEqual(1, len(summary.failures))
+        self.assertIn('404', str(summary.failures[0]))
+
+    def test_workers(self):
+        ts = TestSet()
+        ts.parse(self.server.url, TEST_LIST)
+        pool = CurlPool()
+        WorkerRunner(2).run(self.test_file, self.server.url, ts.test_group_list_dict, self.record, pool=pool)
+        self.assertEqual([
+            ('chain', 'get person', True),
+            ('chain', 'use login', True),
+            ('people', 'list', True),
+            ('missing', 'missing', False),
+        ], self.finished)
+        self.assertEqual(4, pool.hits + pool.misses)
+
+
+if __name__ == '__main__':
+    unittest.main()